@@ -0,0 +1,24 @@
+"""Microbenchmarks for pjst's request pipeline.
+
+    python -m benchmarks [-k PATTERN] [--sizes 1,100] [--save-baseline]
+
+Four groups of cases:
+
+- `pipeline/...` call `ResourceHandler`'s internals (`_handle_one`,
+  `_process_body`, `_postprocess_many`, error rendering) directly, with a
+  handler that keeps its objects in memory; `pipeline/codec/<name>/...` do
+  the same with each JSON codec that is installed (see `pjst.codec`).
+- `nodb/<adapter>/...` send requests for that same handler through each
+  adapter's test client, so that the numbers are pjst's and the framework's
+  overhead only.
+- `nodb/asgi/{pjst,fastapi}/...` and `nodb/wsgi/{pjst,flask}/...` call
+  `pjst.asgi.App`, `pjst.wsgi.App` and FastAPI and Flask apps with that
+  same handler as bare ASGI and WSGI apps, without an HTTP client.
+- `<adapter>/...` send requests to the example apps, backed by synthetic
+  SQLite databases of 1, 100, 10k and 100k articles (generated once into
+  `benchmarks/.data/`).
+
+Results are written to `benchmarks/results/latest.json` and compared with
+`benchmarks/results/baseline.json`, if there is one; the exit status is 1 if
+anything regressed by more than `--threshold`.
+"""
@@ -0,0 +1,85 @@
+import argparse
+import fnmatch
+import shutil
+import sys
+from pathlib import Path
+
+from . import adapters, datasets, harness, pipeline
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument(
+        "-k",
+        dest="patterns",
+        action="append",
+        help="only run the cases whose names match this glob (eg 'nodb/*')",
+    )
+    parser.add_argument(
+        "--sizes",
+        default=",".join(map(str, datasets.SIZES)),
+        help="dataset sizes, comma-separated (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=1.0,
+        help="seconds to spend timing each case (default: %(default)s)",
+    )
+    parser.add_argument("--output", type=Path, default=RESULTS_DIR / "latest.json")
+    parser.add_argument("--baseline", type=Path, default=RESULTS_DIR / "baseline.json")
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="make these results the baseline of later runs",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="slowdown or memory growth that counts as a regression "
+        "(default: %(default)s)",
+    )
+    parser.add_argument("--list", action="store_true", help="list the cases and exit")
+    args = parser.parse_args(argv)
+
+    sizes = tuple(int(size) for size in args.sizes.split(","))
+    cases = [
+        case
+        for module in (pipeline, adapters)
+        for case in module.cases(sizes)
+        if not args.patterns
+        or any(fnmatch.fnmatchcase(case.name, pattern) for pattern in args.patterns)
+    ]
+    if args.list:
+        for case in cases:
+            print(case.name)
+        return 0
+
+    results = []
+    for case in cases:
+        with case.setup() as operation:
+            result = harness.measure(case.name, operation, min_time=args.min_time)
+        print(harness.format_result(result), flush=True)
+        results.append(result)
+    harness.save(results, args.output)
+    print(f"\nSaved to {args.output}")
+
+    regressed = False
+    if args.baseline.exists() and not args.save_baseline:
+        print(f"\nCompared to {args.baseline}:")
+        for comparison in harness.compare(
+            results, harness.load(args.baseline), args.threshold
+        ):
+            print(harness.format_comparison(comparison))
+            regressed |= comparison.regressed
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Saved as the baseline, {args.baseline}")
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,399 @@
+"""Full requests through each adapter's view, with the frameworks' own
+in-process test clients, and through `pjst.asgi`/`pjst.fastapi` and
+`pjst.wsgi`/`pjst.flask` as bare ASGI and WSGI apps"""
+
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Callable, ContextManager, Iterator
+from urllib.parse import urlencode
+
+from sqlalchemy import create_engine
+
+from pjst.rendering import JSONAPI_CONTENT_TYPE
+
+from . import datasets, memory
+from .harness import Case, Operation
+
+# Sends a request and returns the status, once the whole body has been read
+Send = Callable[[str, str, bytes], int]
+# Path of the database to serve the example app from, `None` for the
+# in-memory handler
+Client = Callable[[Path | None], ContextManager[Send]]
+
+_EXAMPLES = Path(__file__).parent.parent / "src" / "examples"
+_HEADERS = {"Content-Type": JSONAPI_CONTENT_TYPE}
+
+
+def cases(sizes: tuple[int, ...]) -> Iterator[Case]:
+    # Both apps driven by the same bare ASGI client, so that the difference
+    # is the apps' alone
+    yield from _nodb("nodb/asgi/pjst", _asgi_pjst)
+    yield from _nodb("nodb/asgi/fastapi", _asgi_fastapi)
+    yield from _nodb("nodb/wsgi/pjst", _wsgi_pjst)
+    yield from _nodb("nodb/wsgi/flask", _wsgi_flask)
+    for adapter, client in (
+        ("flask", _flask),
+        ("fastapi", _fastapi),
+        ("django", _django),
+    ):
+        yield from _nodb(f"nodb/{adapter}", client)
+        for size in sizes:
+            obj_id = size // 2 + 1
+            yield _request(
+                f"{adapter}/get_one[{size}]",
+                client,
+                size,
+                "GET",
+                f"/articles/{obj_id}",
+            )
+            yield _request(
+                f"{adapter}/get_many[{size}]",
+                client,
+                size,
+                "GET",
+                _path({"page[size]": 100}),
+            )
+            yield _request(
+                f"{adapter}/get_many_sorted[{size}]",
+                client,
+                size,
+                "GET",
+                _path({"sort": "-created_at", "page[size]": 100}),
+            )
+            yield _request(
+                f"{adapter}/get_many_filtered[{size}]",
+                client,
+                size,
+                "GET",
+                _path({"filter[title][prefix]": "Article 0000", "page[size]": 100}),
+            )
+            # Linkage from the foreign key alone, against loading the same
+            # page of articles
+            yield _request(
+                f"{adapter}/get_relationship[{size}]",
+                client,
+                size,
+                "GET",
+                "/people/1/relationships/articles?page%5Bsize%5D=100",
+            )
+            yield _request(
+                f"{adapter}/get_related[{size}]",
+                client,
+                size,
+                "GET",
+                "/people/1/articles?page%5Bsize%5D=100",
+            )
+            yield _request(
+                f"{adapter}/edit_one[{size}]",
+                client,
+                size,
+                "PATCH",
+                f"/articles/{obj_id}",
+                _edit(obj_id),
+                writes=True,
+            )
+
+
+def _nodb(prefix: str, client: Client) -> Iterator[Case]:
+    yield _request(f"{prefix}/get_one", client, None, "GET", "/articles/1")
+    yield _request(
+        f"{prefix}/get_many", client, None, "GET", _path({"page[size]": 100})
+    )
+    yield _request(f"{prefix}/edit_one", client, None, "PATCH", "/articles/1", _edit(1))
+    yield _request(
+        f"{prefix}/not_found", client, None, "GET", "/articles/404404", status=404
+    )
+    yield _request(
+        f"{prefix}/invalid_body",
+        client,
+        None,
+        "PATCH",
+        "/articles/1",
+        json.dumps({"data": {"type": "articles", "id": "1", "attributes": 1}}),
+        status=400,
+    )
+
+
+def _request(
+    name: str,
+    client: Client,
+    size: int | None,
+    method: str,
+    path: str,
+    body: str = "",
+    status: int = 200,
+    writes: bool = False,
+) -> Case:
+    @contextlib.contextmanager
+    def setup() -> Iterator[Operation]:
+        with contextlib.ExitStack() as stack:
+            database = None
+            if size is not None:
+                database = (
+                    stack.enter_context(datasets.scratch_database(size))
+                    if writes
+                    else datasets.database(size)
+                )
+            send = stack.enter_context(client(database))
+            content = body.encode()
+            # A benchmark of the wrong response would be meaningless
+            if (actual := send(method, path, content)) != status:
+                raise RuntimeError(f"{name}: expected {status}, got {actual}")
+            yield lambda: send(method, path, content)
+
+    return Case(name=name, setup=setup)
+
+
+def _path(query: dict) -> str:
+    return f"/articles?{urlencode(query)}"
+
+
+def _edit(obj_id: int) -> str:
+    return json.dumps(
+        {
+            "data": {
+                "type": "articles",
+                "id": str(obj_id),
+                "attributes": {"title": "New title"},
+            }
+        }
+    )
+
+
+@contextlib.contextmanager
+def _flask(database: Path | None) -> Iterator[Send]:
+    from flask import Flask
+
+    from examples.flask_example import models
+    from examples.flask_example.app import create_app
+    from pjst.flask import register
+
+    with _engine(models, database):
+        if database is None:
+            app = Flask(__name__)
+            register(app, memory.ArticleResourceHandler)
+        else:
+            app = create_app()
+        client = app.test_client()
+
+        def send(method: str, path: str, body: bytes) -> int:
+            response = client.open(path, method=method, data=body, headers=_HEADERS)
+            response.get_data()
+            return response.status_code
+
+        yield send
+
+
+@contextlib.contextmanager
+def _fastapi(database: Path | None) -> Iterator[Send]:
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from examples.fastapi_example import app as example
+    from examples.fastapi_example import models
+    from pjst.fastapi import register
+
+    with _engine(models, database):
+        if database is None:
+            app = FastAPI()
+            register(app, memory.ArticleResourceHandler)
+        else:
+            app = example.app
+        # Entered once, rather than starting an event loop per request
+        with TestClient(app) as client:
+
+            def send(method: str, path: str, body: bytes) -> int:
+                return client.request(
+                    method, path, content=body, headers=_HEADERS
+                ).status_code
+
+            yield send
+
+
+@contextlib.contextmanager
+def _asgi_pjst(database: Path | None) -> Iterator[Send]:
+    from pjst.asgi import App
+
+    with _asgi(App([memory.ArticleResourceHandler])) as send:
+        yield send
+
+
+@contextlib.contextmanager
+def _asgi_fastapi(database: Path | None) -> Iterator[Send]:
+    from fastapi import FastAPI
+
+    from pjst.fastapi import register
+
+    app = FastAPI()
+    register(app, memory.ArticleResourceHandler)
+    with _asgi(app) as send:
+        yield send
+
+
+@contextlib.contextmanager
+def _asgi(app) -> Iterator[Send]:
+    """Call an ASGI app in process, on one event loop, with no HTTP client in
+    between"""
+
+    headers = [(b"content-type", JSONAPI_CONTENT_TYPE.encode())]
+
+    async def request(method: str, path: str, body: bytes) -> int:
+        path, _, query_string = path.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method,
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "root_path": "",
+            "query_string": query_string.encode(),
+            "headers": headers,
+            "client": ("127.0.0.1", 50000),
+            "server": ("testserver", 80),
+        }
+        messages = [{"type": "http.request", "body": body, "more_body": False}]
+        status = 0
+
+        async def receive() -> dict:
+            if messages:
+                return messages.pop()
+            return {"type": "http.disconnect"}
+
+        async def send(message: dict) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+
+        await app(scope, receive, send)
+        return status
+
+    with asyncio.Runner() as runner:
+        yield lambda method, path, body: runner.run(request(method, path, body))
+
+
+@contextlib.contextmanager
+def _wsgi_pjst(database: Path | None) -> Iterator[Send]:
+    from pjst.wsgi import App
+
+    yield _wsgi(App([memory.ArticleResourceHandler]))
+
+
+@contextlib.contextmanager
+def _wsgi_flask(database: Path | None) -> Iterator[Send]:
+    from flask import Flask
+
+    from pjst.flask import register
+
+    app = Flask(__name__)
+    register(app, memory.ArticleResourceHandler)
+    yield _wsgi(app)
+
+
+def _wsgi(app) -> Send:
+    """Call a WSGI app in process, with no HTTP client in between"""
+
+    def send(method: str, path: str, body: bytes) -> int:
+        path, _, query_string = path.partition("?")
+        environ = {
+            "REQUEST_METHOD": method,
+            "SCRIPT_NAME": "",
+            "PATH_INFO": path,
+            "QUERY_STRING": query_string,
+            "CONTENT_TYPE": JSONAPI_CONTENT_TYPE,
+            "CONTENT_LENGTH": str(len(body)),
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "HTTP_HOST": "testserver",
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": "http",
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": False,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        status = ""
+
+        def start_response(status_line: str, headers: list, exc_info=None) -> None:
+            nonlocal status
+            status = status_line
+
+        chunks = app(environ, start_response)
+        try:
+            for _ in chunks:
+                pass
+        finally:
+            if (close := getattr(chunks, "close", None)) is not None:
+                close()
+        return int(status.split(" ", 1)[0])
+
+    return send
+
+
+@contextlib.contextmanager
+def _django(database: Path | None) -> Iterator[Send]:
+    _setup_django()
+    import django.test
+    from django.db import connections
+
+    connection = connections["default"]
+    name = connection.settings_dict["NAME"]
+    connection.close()
+    if database is not None:
+        connection.settings_dict["NAME"] = str(database)
+    urlconf = "benchmarks.django_urls" if database is None else "articles_project.urls"
+    try:
+        with django.test.override_settings(ROOT_URLCONF=urlconf):
+            client = django.test.Client()
+
+            def send(method: str, path: str, body: bytes) -> int:
+                response = client.generic(
+                    method, path, body, content_type=JSONAPI_CONTENT_TYPE
+                )
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                return response.status_code
+
+            yield send
+    finally:
+        connection.close()
+        connection.settings_dict["NAME"] = name
+
+
+@functools.cache
+def _setup_django() -> None:
+    import django
+    from django.conf import settings
+
+    sys.path.append(str(_EXAMPLES / "django_example"))
+    os.environ.setdefault(
+        "DJANGO_SETTINGS_MODULE", "examples.django_example.articles_project.settings"
+    )
+    django.setup()
+    # DEBUG would keep every query in `connection.queries`
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ["testserver"]
+
+
+@contextlib.contextmanager
+def _engine(models, database: Path | None) -> Iterator[None]:
+    """Point an example's `models.engine` at `database` for a while"""
+
+    if database is None:
+        yield
+        return
+    engine, models.engine = models.engine, create_engine(f"sqlite:///{database}")
+    try:
+        yield
+    finally:
+        models.engine.dispose()
+        models.engine = engine
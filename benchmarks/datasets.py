@@ -0,0 +1,72 @@
+"""Synthetic SQLite databases for the example apps.
+
+The tables are the ones the examples share (see
+`examples.flask_example.models`), so one file serves all three adapters.
+"""
+
+import contextlib
+import datetime
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import create_engine, insert
+
+from examples.flask_example import models
+
+SIZES = (1, 100, 10_000, 100_000)
+DATA_DIR = Path(__file__).parent / ".data"
+AUTHORS = 10
+CONTENT = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4
+
+_EPOCH = datetime.datetime(2024, 1, 1)
+
+
+def database(size: int) -> Path:
+    """A database with `size` articles, generated on first use.
+
+    `created_at` is scattered over the IDs so that sorting by it isn't the
+    same as sorting by ID."""
+
+    path = DATA_DIR / f"articles-{size}.sqlite3"
+    if path.exists():
+        return path
+    DATA_DIR.mkdir(exist_ok=True)
+    partial = path.with_suffix(".partial")
+    partial.unlink(missing_ok=True)
+    engine = create_engine(f"sqlite:///{partial}")
+    models.Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(models.PersonModel),
+            [{"id": i, "name": f"Person {i}"} for i in range(1, AUTHORS + 1)],
+        )
+        connection.execute(
+            insert(models.ArticleModel),
+            [
+                {
+                    "id": i,
+                    "title": f"Article {i:06d}",
+                    "content": CONTENT,
+                    "author_id": i % AUTHORS + 1,
+                    "created_at": _EPOCH
+                    + datetime.timedelta(minutes=i * 7919 % (size + 1)),
+                    "updated_at": _EPOCH,
+                }
+                for i in range(1, size + 1)
+            ],
+        )
+    engine.dispose()
+    partial.rename(path)
+    return path
+
+
+@contextlib.contextmanager
+def scratch_database(size: int) -> Iterator[Path]:
+    """A copy of `database(size)` for cases that write"""
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "articles.sqlite3"
+        shutil.copyfile(database(size), path)
+        yield path
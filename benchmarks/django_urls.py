@@ -0,0 +1,7 @@
+"""URLconf of the in-memory handler, for `nodb/django/...`"""
+
+from pjst.django import register
+
+from .memory import ArticleResourceHandler
+
+urlpatterns = register(ArticleResourceHandler)
@@ -0,0 +1,186 @@
+"""Timing and allocation measurements, results files and baseline comparison"""
+
+import dataclasses
+import datetime
+import gc
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Iterable
+
+# What gets timed; one call is one request
+Operation = Callable[[], Any]
+
+
+@dataclasses.dataclass(frozen=True)
+class Case:
+    name: str
+    # Prepares the data and the client, yields the operation and cleans up
+    setup: Callable[[], ContextManager[Operation]]
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    name: str
+    rounds: int
+    ops_per_sec: float
+    mean_us: float
+    p50_us: float
+    p90_us: float
+    p99_us: float
+    # The most memory held at once during a call, on top of what was held
+    # before it (tracemalloc), median of a few calls
+    alloc_bytes: int
+
+
+@dataclasses.dataclass(frozen=True)
+class Comparison:
+    name: str
+    # current / baseline
+    speed: float
+    memory: float
+    regressed: bool
+
+
+def measure(
+    name: str,
+    operation: Operation,
+    min_time: float = 1.0,
+    min_rounds: int = 5,
+    max_rounds: int = 100_000,
+    warmup: int = 1,
+    alloc_rounds: int = 3,
+) -> Result:
+    """Call `operation` until `min_time` seconds and `min_rounds` calls have
+    passed (`max_rounds` at most), timing each call.
+
+    Allocations are measured in separate calls, since tracing them slows the
+    calls down considerably."""
+
+    for _ in range(warmup):
+        operation()
+    gc.collect()
+
+    timings: list[int] = []
+    deadline = time.perf_counter() + min_time
+    while len(timings) < min_rounds or (
+        len(timings) < max_rounds and time.perf_counter() < deadline
+    ):
+        start = time.perf_counter_ns()
+        operation()
+        timings.append(time.perf_counter_ns() - start)
+
+    allocations = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_rounds):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            operation()
+            _, peak = tracemalloc.get_traced_memory()
+            allocations.append(peak - before)
+    finally:
+        tracemalloc.stop()
+
+    percentiles = statistics.quantiles(timings, n=100, method="inclusive")
+    return Result(
+        name=name,
+        rounds=len(timings),
+        ops_per_sec=len(timings) / (sum(timings) / 1e9),
+        mean_us=statistics.fmean(timings) / 1e3,
+        p50_us=percentiles[49] / 1e3,
+        p90_us=percentiles[89] / 1e3,
+        p99_us=percentiles[98] / 1e3,
+        alloc_bytes=int(statistics.median(allocations)),
+    )
+
+
+def save(results: Iterable[Result], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": {
+                    result.name: dataclasses.asdict(result) for result in results
+                },
+            },
+            indent=2,
+        )
+        + "\n"
+    )
+
+
+def load(path: Path) -> dict[str, Result]:
+    return {
+        name: Result(**result)
+        for name, result in json.loads(path.read_text())["results"].items()
+    }
+
+
+def compare(
+    results: Iterable[Result],
+    baseline: dict[str, Result],
+    threshold: float,
+    min_alloc_change: int = 1024,
+) -> list[Comparison]:
+    """Cases that are slower by more than `threshold` (0.1 is 10%), or that
+    allocate that much more and at least `min_alloc_change` bytes more, have
+    regressed. Cases that aren't in `baseline` are skipped."""
+
+    comparisons = []
+    for result in results:
+        if (before := baseline.get(result.name)) is None:
+            continue
+        speed = result.ops_per_sec / before.ops_per_sec
+        memory = (result.alloc_bytes or 1) / (before.alloc_bytes or 1)
+        comparisons.append(
+            Comparison(
+                name=result.name,
+                speed=speed,
+                memory=memory,
+                regressed=speed < 1 - threshold
+                or (
+                    memory > 1 + threshold
+                    and result.alloc_bytes - before.alloc_bytes >= min_alloc_change
+                ),
+            )
+        )
+    return comparisons
+
+
+def format_result(result: Result) -> str:
+    return (
+        f"{result.name:<48} {result.ops_per_sec:>12,.1f} ops/s"
+        f"  p50 {_duration(result.p50_us):>9}  p90 {_duration(result.p90_us):>9}"
+        f"  p99 {_duration(result.p99_us):>9}  {_size(result.alloc_bytes):>10}"
+    )
+
+
+def format_comparison(comparison: Comparison) -> str:
+    return (
+        f"{comparison.name:<48} speed {comparison.speed:>6.2f}x"
+        f"  memory {comparison.memory:>6.2f}x"
+        f"{'  REGRESSED' if comparison.regressed else ''}"
+    )
+
+
+def _duration(us: float) -> str:
+    if us >= 1e6:
+        return f"{us / 1e6:.2f}s"
+    if us >= 1e3:
+        return f"{us / 1e3:.2f}ms"
+    return f"{us:.1f}us"
+
+
+def _size(size: int) -> str:
+    if size >= 1 << 20:
+        return f"{size / (1 << 20):.1f}MiB"
+    if size >= 1 << 10:
+        return f"{size / (1 << 10):.1f}KiB"
+    return f"{size}B"
@@ -0,0 +1,87 @@
+"""A handler that keeps its articles in a `dict`, so that nothing but pjst
+(and the framework around it) is measured"""
+
+import bisect
+import dataclasses
+import datetime
+from typing import Annotated
+
+import pydantic
+
+from pjst import ResourceHandler
+from pjst import exceptions as pjst_exceptions
+from pjst import types as pjst_types
+
+from .datasets import CONTENT
+
+
+@dataclasses.dataclass(frozen=True)
+class Article:
+    id: int
+    title: str
+    content: str
+    created_at: datetime.datetime
+
+
+def articles(count: int) -> list[Article]:
+    created_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    return [
+        Article(id=i, title=f"Article {i:06d}", content=CONTENT, created_at=created_at)
+        for i in range(1, count + 1)
+    ]
+
+
+ARTICLES = {article.id: article for article in articles(1000)}
+IDS = sorted(ARTICLES)
+
+
+class ArticleSchema(pjst_types.Resource):
+    class Attributes(pydantic.BaseModel):
+        model_config = pydantic.ConfigDict(extra="forbid")
+
+        title: str = ""
+        content: str = ""
+        created_at: datetime.datetime | None = None
+
+    type: str = "articles"
+    id: str = "1"
+    attributes: Attributes = pydantic.Field(default_factory=Attributes)
+
+
+class ArticleResourceHandler(ResourceHandler):
+    TYPE = "articles"
+
+    @classmethod
+    def get_one(cls, obj_id: str) -> pjst_types.Response:
+        try:
+            return pjst_types.Response(data=ARTICLES[int(obj_id)])
+        except (KeyError, ValueError):
+            raise pjst_exceptions.NotFound(f"Article with id '{obj_id}' not found")
+
+    @classmethod
+    def edit_one(cls, obj: ArticleSchema) -> pjst_types.Response:
+        article = cls.get_one(obj.id).data
+        article = ARTICLES[article.id] = dataclasses.replace(
+            article, **obj.attributes.model_dump(exclude_unset=True)
+        )
+        return pjst_types.Response(data=article)
+
+    @classmethod
+    def get_many(
+        cls, page: Annotated[pjst_types.Cursor, pjst_types.Page(max_size=100)]
+    ) -> pjst_types.Response:
+        start = 0 if page.after is None else bisect.bisect_right(IDS, int(page.after))
+        ids = IDS[start : start + page.size]
+        return pjst_types.Response(
+            data=[ARTICLES[id] for id in ids],
+            next_cursor=str(ids[-1]) if start + page.size < len(IDS) else None,
+        )
+
+    @classmethod
+    def serialize(cls, obj: Article) -> ArticleSchema:
+        return ArticleSchema(
+            id=str(obj.id),
+            attributes=ArticleSchema.Attributes(
+                title=obj.title, content=obj.content, created_at=obj.created_at
+            ),
+        )
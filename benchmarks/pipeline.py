@@ -0,0 +1,173 @@
+"""`ResourceHandler`'s request pipeline, without a framework around it"""
+
+import contextlib
+import json
+import types
+from typing import Iterator
+
+from pjst import codec as pjst_codec
+from pjst import exceptions as pjst_exceptions
+from pjst import types as pjst_types
+from pjst.plan import compile_plan
+from pjst.rendering import LinkTemplate, RenderContext, render_errors
+
+from . import memory
+from .datasets import CONTENT
+from .harness import Case, Operation
+
+_plan = compile_plan(memory.ArticleResourceHandler, types.SimpleNamespace)
+_object_link = LinkTemplate.from_url("/articles/pjst-obj-id").bind()
+_body = json.dumps(
+    {
+        "data": {
+            "type": "articles",
+            "id": "1",
+            "attributes": {"title": "New title", "content": "New content"},
+        }
+    }
+).encode()
+_invalid_body = json.dumps(
+    {
+        "data": {
+            "type": "articles",
+            "id": "1",
+            "attributes": {"title": 1, "content": 2, "age": 3},
+        }
+    }
+).encode()
+
+
+def cases(sizes: tuple[int, ...]) -> Iterator[Case]:
+    handler = memory.ArticleResourceHandler
+    context = RenderContext(self_link="/articles/1", object_link=_object_link)
+
+    def get_one() -> Operation:
+        request = types.SimpleNamespace(method="GET")
+
+        def operation():
+            handler._postprocess_one(
+                handler._handle_one(_plan, request, b"", "1"), context
+            )
+
+        return operation
+
+    def edit_one() -> Operation:
+        request = types.SimpleNamespace(method="PATCH")
+
+        def operation():
+            handler._postprocess_one(
+                handler._handle_one(_plan, request, _body, "1"), context
+            )
+
+        return operation
+
+    yield _case("pipeline/handle_one[GET]", get_one)
+    yield _case("pipeline/handle_one[PATCH]", edit_one)
+    yield _case(
+        "pipeline/process_body",
+        lambda: lambda: handler._process_body(_body, _plan.body_document),
+    )
+    yield _case("pipeline/process_body_invalid", lambda: _invalid)
+
+    for size in sizes:
+        yield _case(f"pipeline/postprocess_many[{size}]", _postprocess_many(size))
+
+    for size in (1, 100, 10_000):
+        yield _case(f"pipeline/render_errors[{size}]", _render_errors(size))
+
+    # The same document shapes with each codec that is installed
+    for codec_cls in (
+        pjst_codec.PydanticCodec,
+        pjst_codec.OrjsonCodec,
+        pjst_codec.MsgspecCodec,
+    ):
+        try:
+            codec = codec_cls()
+        except ImportError:
+            continue
+        prefix = f"pipeline/codec/{codec.name}"
+        yield _codec_case(
+            f"{prefix}/postprocess_many[100]", codec, _postprocess_many(100)
+        )
+        yield _codec_case(f"{prefix}/render_errors[100]", codec, _render_errors(100))
+        yield _codec_case(
+            f"{prefix}/process_body",
+            codec,
+            lambda: lambda: handler._process_body(_body, _plan.body_document),
+        )
+        yield _codec_case(f"{prefix}/loads[100]", codec, _loads(codec, 100))
+
+
+def _case(name, operation_factory) -> Case:
+    @contextlib.contextmanager
+    def setup() -> Iterator[Operation]:
+        yield operation_factory()
+
+    return Case(name=name, setup=setup)
+
+
+def _codec_case(name, codec: pjst_codec.PydanticCodec, operation_factory) -> Case:
+    @contextlib.contextmanager
+    def setup() -> Iterator[Operation]:
+        default, pjst_codec.CODEC = pjst_codec.CODEC, codec
+        try:
+            yield operation_factory()
+        finally:
+            pjst_codec.CODEC = default
+
+    return Case(name=name, setup=setup)
+
+
+def _invalid() -> None:
+    try:
+        memory.ArticleResourceHandler._process_body(_invalid_body, _plan.body_document)
+    except pjst_exceptions.PjstException as exc:
+        render_errors(exc)
+
+
+def _postprocess_many(size: int):
+    def factory() -> Operation:
+        response = pjst_types.Response(data=memory.articles(size))
+        context = RenderContext(self_link="/articles", object_link=_object_link)
+        return lambda: memory.ArticleResourceHandler._postprocess_many(
+            response, context
+        )
+
+    return factory
+
+
+def _render_errors(size: int):
+    def factory() -> Operation:
+        exc = pjst_exceptions.PjstExceptionMulti(
+            *(
+                pjst_exceptions.BadRequest(
+                    "Input should be a valid string",
+                    "string_type",
+                    {"pointer": f"/data/{i}/attributes/title"},
+                )
+                for i in range(size)
+            )
+        )
+        return lambda: render_errors(exc)
+
+    return factory
+
+
+def _loads(codec: pjst_codec.PydanticCodec, size: int):
+    """A `create_many` body of `size` articles"""
+
+    def factory() -> Operation:
+        body = json.dumps(
+            {
+                "data": [
+                    {
+                        "type": "articles",
+                        "attributes": {"title": f"Article {i}", "content": CONTENT},
+                    }
+                    for i in range(size)
+                ]
+            }
+        ).encode()
+        return lambda: codec.loads(body)
+
+    return factory
@@ -0,0 +1,199 @@
+"""Cold start: import times, and the time to register many resource types.
+
+    python -m benchmarks.startup [--types 200] [--repeat 5]
+
+Imports are timed in fresh interpreters. Registration is timed for `--types`
+generated handlers (each with its own schema, filters, sorting and
+pagination), registered one `register` call at a time and in one pass with a
+`Registry`. What the registry defers is reported separately: the first
+request's body validation and, for FastAPI, the first `app.openapi()` call.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable
+
+MODULES = ("pjst", "pjst.resource_handler", "pjst.flask", "pjst.fastapi", "pjst.django")
+
+_TEMPLATE = """
+class Schema{i}(pjst_types.Resource):
+    class Attributes(pydantic.BaseModel):
+        title: str = ""
+        created_at: datetime.datetime | None = None
+
+    type: str = "type{i}"
+    attributes: Attributes = pydantic.Field(default_factory=Attributes)
+
+
+class Handler{i}(ResourceHandler):
+    TYPE = "type{i}"
+
+    @classmethod
+    def get_one(cls, obj_id: str) -> pjst_types.Response:
+        return pjst_types.Response(data=Schema{i}(id=obj_id))
+
+    @classmethod
+    def edit_one(cls, obj: Schema{i}) -> pjst_types.Response:
+        return pjst_types.Response(data=obj)
+
+    @classmethod
+    def create_one(cls, obj: Schema{i}) -> pjst_types.Response:
+        return pjst_types.Response(data=obj)
+
+    @classmethod
+    def get_many(
+        cls,
+        title: Annotated[
+            pjst_types.Conditions[str] | None,
+            pjst_types.Filter(operators=("eq", "prefix")),
+        ] = None,
+        created_at: Annotated[
+            pjst_types.Conditions[datetime.datetime] | None,
+            pjst_types.Filter(operators=("gte", "lt")),
+        ] = None,
+        sort: Annotated[
+            list[pjst_types.SortField] | None,
+            pjst_types.Sort("title", "created_at"),
+        ] = None,
+        page: Annotated[pjst_types.Cursor, pjst_types.Page()] = None,
+    ) -> pjst_types.Response:
+        return pjst_types.Response(data=[])
+
+    @classmethod
+    def serialize(cls, obj) -> Schema{i}:
+        return obj
+"""
+
+
+def handlers(count: int) -> list:
+    """`count` new handler classes, defined the way an app's module would"""
+
+    namespace = {}
+    exec(
+        "import datetime\n"
+        "from typing import Annotated\n"
+        "import pydantic\n"
+        "from pjst import ResourceHandler\n"
+        "from pjst import types as pjst_types\n"
+        + "".join(_TEMPLATE.format(i=i) for i in range(count)),
+        namespace,
+    )
+    return [namespace[f"Handler{i}"] for i in range(count)]
+
+
+def import_time(module: str, repeat: int) -> float:
+    """Median seconds to import `module` in a fresh interpreter"""
+
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    return statistics.median(
+        float(
+            subprocess.run(
+                [sys.executable, "-c", code], check=True, capture_output=True, text=True
+            ).stdout
+        )
+        for _ in range(repeat)
+    )
+
+
+def _timed(func: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def _flask(count: int) -> dict[str, float]:
+    import flask
+
+    from pjst import Registry
+    from pjst.flask import register
+
+    app = flask.Flask(__name__)
+    classes = handlers(count)
+    one_by_one = _timed(lambda: [register(app, cls) for cls in classes])
+    app = flask.Flask(__name__)
+    registry = Registry(handlers(count))
+    result = {"register": one_by_one, "registry": _timed(lambda: registry.flask(app))}
+    client = app.test_client()
+    result["first request"] = _timed(
+        lambda: client.patch("/type0/1", json={"data": {"type": "type0", "id": "1"}})
+    )
+    return result
+
+
+def _fastapi(count: int) -> dict[str, float]:
+    import fastapi
+    from fastapi.testclient import TestClient
+
+    from pjst import Registry
+    from pjst.fastapi import register
+
+    app = fastapi.FastAPI()
+    classes = handlers(count)
+    one_by_one = _timed(lambda: [register(app, cls) for cls in classes])
+    app = fastapi.FastAPI()
+    registry = Registry(handlers(count))
+    result = {
+        "register": one_by_one,
+        "registry": _timed(lambda: registry.fastapi(app)),
+    }
+    with TestClient(app) as client:
+        result["first request"] = _timed(
+            lambda: client.patch(
+                "/type0/1", json={"data": {"type": "type0", "id": "1"}}
+            )
+        )
+    result["first openapi()"] = _timed(app.openapi)
+    return result
+
+
+def _django(count: int) -> dict[str, float]:
+    from pjst import Registry
+    from pjst.django import register
+
+    classes = handlers(count)
+    one_by_one = _timed(lambda: [register(cls) for cls in classes])
+    registry = Registry(handlers(count))
+    return {"register": one_by_one, "registry": _timed(registry.django)}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup")
+    parser.add_argument("--types", type=int, default=200)
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="interpreters to time each import in (default: %(default)s)",
+    )
+    args = parser.parse_args(argv)
+
+    print("Cold imports:")
+    for module in MODULES:
+        print(f"  {module:<28} {import_time(module, args.repeat) * 1000:>9.1f}ms")
+
+    # Not part of the registration times
+    handlers(1)
+    for adapter, measure in (
+        ("flask", _flask),
+        ("fastapi", _fastapi),
+        ("django", _django),
+    ):
+        print(f"\n{adapter}, {args.types} types:")
+        for name, seconds in measure(args.types).items():
+            per_type = (
+                ""
+                if name.startswith("first")
+                else (f"  {seconds / args.types * 1e6:>9.1f}us/type")
+            )
+            print(f"  {name:<28} {seconds * 1000:>9.1f}ms{per_type}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
-from .models import ArticleModel
+from .models import ArticleModel, PersonModel
 
 admin.site.register(ArticleModel)
+admin.site.register(PersonModel)
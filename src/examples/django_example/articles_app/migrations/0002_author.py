@@ -0,0 +1,46 @@
+# Generated by Django 6.1.2 on 2026-10-17 13:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("articles_app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PersonModel",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+            ],
+            options={
+                "verbose_name": "Person",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="articlemodel",
+            options={"verbose_name": "Article"},
+        ),
+        migrations.AddField(
+            model_name="articlemodel",
+            name="author",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="articles",
+                to="articles_app.personmodel",
+            ),
+        ),
+    ]
@@ -1,10 +1,29 @@
 from django.db import models
 
 
+class PersonModel(models.Model):
+    id: int
+    name = models.CharField(max_length=100)
+
+    class Meta:
+        verbose_name = "Person"
+
+    def __str__(self):  # pragma: no cover
+        return f"{self.__class__.__name__}(name={self.name!r})"
+
+
 class ArticleModel(models.Model):
     id: int
+    author_id: int | None
     title = models.CharField(max_length=100)
     content = models.TextField()
+    author = models.ForeignKey(
+        PersonModel,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="articles",
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
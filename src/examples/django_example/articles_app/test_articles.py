@@ -1,10 +1,29 @@
+import asyncio
+import datetime
 import json
+import threading
+import types
 from typing import Callable
 
 import django.test
 import pytest
+from asgiref.sync import async_to_sync
+from django.test.utils import override_script_prefix
 
-from .models import ArticleModel
+from pjst import Registry, ResourceHandler
+from pjst import django as pjst_django
+from pjst import rendering as pjst_rendering
+from pjst import types as pjst_types
+from pjst.cache import ResponseCache
+from pjst.django import register
+from pjst.timing import Measurement, Timing
+
+from .models import ArticleModel, PersonModel
+from .views import (
+    ArticleResourceHandler,
+    AsyncArticleResourceHandler,
+    PersonResourceHandler,
+)
 
 
 @pytest.fixture()
@@ -325,3 +344,838 @@ def test_get_many_with_filter(
         ],
         "links": {"self": "/articles"},
     }
+
+
+@pytest.mark.django_db
+def test_edit_one_missing_data(article: ArticleModel, client: django.test.Client):
+    response = client.patch(
+        f"/articles/{article.id}",
+        data=json.dumps({"meta": {}}),
+        content_type="application/vnd.api+json",
+    )
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "status": "400",
+                "code": "bad_request",
+                "title": "Bad request",
+                "detail": "Invalid data field",
+                "source": {"pointer": "/data"},
+            }
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_get_many_streamed(
+    get_articles: Callable[[int], list[ArticleModel]],
+    client: django.test.Client,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    articles = get_articles(2)
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert response.streaming
+    assert response.headers["Content-Type"] == "application/vnd.api+json"
+    assert json.loads(b"".join(response.streaming_content)) == {
+        "data": [
+            {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": article.title, "content": article.content},
+                "links": {"self": f"/articles/{article.id}"},
+            }
+            for article in articles
+        ],
+        "links": {"self": "/articles"},
+    }
+
+
+@pytest.mark.django_db
+def test_get_many_resolves_collection_link_once(
+    article: ArticleModel, client: django.test.Client, monkeypatch: pytest.MonkeyPatch
+):
+    assert client.get("/articles").status_code == 200
+    calls = []
+    reverse = pjst_django.reverse
+
+    def _reverse(*args, **kwargs):
+        calls.append(args)
+        return reverse(*args, **kwargs)
+
+    monkeypatch.setattr(pjst_django, "reverse", _reverse)
+    response = client.get("/articles")
+    assert response.json()["links"] == {"self": "/articles"}
+    assert calls == []
+
+
+@pytest.mark.django_db
+def test_get_many_paginated(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    response = client.get("/articles", {"page[size]": "2"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[0].id),
+        str(articles[1].id),
+    ]
+    assert response.json()["links"] == {
+        "self": "/articles",
+        "next": f"/articles?page[size]=2&page[after]={articles[1].id}",
+    }
+
+    response = client.get(response.json()["links"]["next"])
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [str(articles[2].id)]
+    assert response.json()["links"] == {
+        "self": "/articles",
+        "prev": f"/articles?page[size]=2&page[before]={articles[2].id}",
+    }
+
+    response = client.get(response.json()["links"]["prev"])
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[0].id),
+        str(articles[1].id),
+    ]
+
+
+@pytest.mark.django_db
+def test_get_many_invalid_page_size(client: django.test.Client):
+    response = client.get("/articles", {"page[size]": "1000"})
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "status": "400",
+                "code": "bad_request",
+                "title": "Bad request",
+                "detail": "Page size must be an integer between 1 and 100",
+                "source": {"parameter": "page[size]"},
+            }
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_get_many_sparse_fieldset(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(2)
+    response = client.get("/articles", {"fields[articles]": "title"})
+    assert response.status_code == 200
+    assert [item["attributes"] for item in response.json()["data"]] == [
+        {"title": article.title} for article in articles
+    ]
+
+
+@pytest.mark.django_db
+def test_get_one_sparse_fieldset(article: ArticleModel, client: django.test.Client):
+    response = client.get(f"/articles/{article.id}", {"fields[articles]": "content"})
+    assert response.status_code == 200
+    assert response.json()["data"]["attributes"] == {"content": "Test content 1"}
+
+
+@pytest.mark.django_db
+def test_get_many_unknown_field(client: django.test.Client):
+    response = client.get("/articles", {"fields[articles]": "title,age"})
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "status": "400",
+                "code": "bad_request",
+                "title": "Bad request",
+                "detail": "Unknown fields for type 'articles': age",
+                "source": {"parameter": "fields[articles]"},
+            }
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_get_many_include(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    author = PersonModel.objects.create(name="Author")
+    ArticleModel.objects.filter(id__in=[articles[0].id, articles[1].id]).update(
+        author=author
+    )
+    response = client.get("/articles", {"include": "author"})
+    assert response.status_code == 200
+    body = response.json()
+    assert [item.get("relationships") for item in body["data"]] == [
+        {"author": {"data": {"type": "people", "id": str(author.id)}}},
+        {"author": {"data": {"type": "people", "id": str(author.id)}}},
+        None,
+    ]
+    assert body["included"] == [
+        {
+            "type": "people",
+            "id": str(author.id),
+            "attributes": {"name": "Author"},
+            "links": {"self": f"/people/{author.id}"},
+        }
+    ]
+
+
+@pytest.mark.django_db
+def test_get_one_include(article: ArticleModel, client: django.test.Client):
+    response = client.get(f"/articles/{article.id}", {"include": "author"})
+    assert response.status_code == 200
+    assert response.json()["included"] == []
+
+
+@pytest.mark.django_db
+def test_get_many_unknown_include(client: django.test.Client):
+    response = client.get("/articles", {"include": "author.comments"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["detail"] == (
+        "Unknown relationship path 'author.comments'"
+    )
+    assert response.json()["errors"][0]["source"] == {"parameter": "include"}
+
+
+@pytest.mark.django_db
+def test_relationship(article: ArticleModel, client: django.test.Client):
+    response = client.get(f"/articles/{article.id}/relationships/author")
+    assert response.status_code == 200
+    assert response.json() == {
+        "data": None,
+        "links": {
+            "self": f"/articles/{article.id}/relationships/author",
+            "related": f"/articles/{article.id}/author",
+        },
+    }
+    author = PersonModel.objects.create(name="Author")
+    ArticleModel.objects.filter(id=article.id).update(author=author)
+    response = client.get(f"/articles/{article.id}/author")
+    assert response.status_code == 200
+    assert response.json()["data"] == {
+        "type": "people",
+        "id": str(author.id),
+        "attributes": {"name": "Author"},
+        "links": {"self": f"/people/{author.id}"},
+    }
+    response = client.get(f"/articles/{article.id}/relationships/comments")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_relationship_paginated(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    author = PersonModel.objects.create(name="Author")
+    ArticleModel.objects.update(author=author)
+    response = client.get(
+        f"/people/{author.id}/relationships/articles", {"page[size]": 2}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == [
+        {"type": "articles", "id": str(article.id)} for article in articles[:2]
+    ]
+    response = client.get(response.json()["links"]["next"])
+    assert response.json()["data"] == [{"type": "articles", "id": str(articles[2].id)}]
+    response = client.get(f"/people/{author.id}/articles", {"page[size]": 2})
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(article.id) for article in articles[:2]
+    ]
+
+
+@pytest.mark.django_db
+def test_get_many_serialize_many(
+    get_articles: Callable[[int], list[ArticleModel]],
+    client: django.test.Client,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    batches = []
+
+    def serialize_many(cls, objs):
+        batches.append(len(objs))
+        return [cls.serialize(obj) for obj in objs]
+
+    monkeypatch.setattr(
+        ArticleResourceHandler, "serialize_many", classmethod(serialize_many)
+    )
+    articles = get_articles(3)
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(article.id) for article in articles
+    ]
+    assert batches == [3]
+
+
+@pytest.mark.django_db
+def test_get_one_etag(article: ArticleModel, client: django.test.Client):
+    response = client.get(f"/articles/{article.id}")
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    response = client.get(f"/articles/{article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    article.title = "New title"
+    article.save()
+    response = client.get(f"/articles/{article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_get_many_etag(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    get_articles(2)
+    etag = client.get("/articles").headers["ETag"]
+    response = client.get("/articles", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+@pytest.mark.django_db
+def test_head(article: ArticleModel, client: django.test.Client):
+    response = client.head(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert "ETag" in response.headers
+
+
+@pytest.mark.django_db
+def test_cache(
+    get_articles: Callable[[int], list[ArticleModel]],
+    client: django.test.Client,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    cache = ResponseCache(ttl=60, max_entries=1)
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", cache)
+    article = get_articles(1)[0]
+    client.get(f"/articles/{article.id}")
+    ArticleModel.objects.filter(id=article.id).update(title="Changed")
+    response = client.get(f"/articles/{article.id}")
+    assert response.json()["data"]["attributes"]["title"] == "Test title 1"
+    client.get("/articles")
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (1, 2, 1)
+    response = client.get(f"/articles/{article.id}")
+    assert response.json()["data"]["attributes"]["title"] == "Changed"
+    assert client.delete(f"/articles/{article.id}").status_code == 204
+
+
+@pytest.mark.django_db
+def test_links_honor_script_prefix(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(2)
+    with override_script_prefix("/app/"):
+        response = client.get("/articles")
+    assert response.json()["links"] == {"self": "/app/articles"}
+    assert [item["links"] for item in response.json()["data"]] == [
+        {"self": f"/app/articles/{article.id}"} for article in articles
+    ]
+
+
+@pytest.mark.django_db
+def test_get_many_sorted(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    ArticleModel.objects.filter(id=articles[0].id).update(title="Test title 2")
+    response = client.get("/articles", {"sort": "-title,created_at", "page[size]": "2"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[2].id),
+        str(articles[0].id),
+    ]
+    assert response.json()["links"] == {"self": "/articles"}
+
+
+@pytest.mark.django_db
+def test_get_many_unknown_sort_field(client: django.test.Client):
+    response = client.get("/articles", {"sort": "age"})
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Unknown sort fields for type 'articles': age",
+                "source": {"parameter": "sort"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+@pytest.mark.django_db
+def test_get_many_filter_operators(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    for month, article in enumerate(articles, start=1):
+        ArticleModel.objects.filter(id=article.id).update(
+            created_at=datetime.datetime(2024, month, 1, tzinfo=datetime.UTC)
+        )
+    response = client.get(
+        "/articles",
+        {
+            "filter[created_at][lte]": "2024-02-01T00:00:00Z",
+            "filter[title][in]": "Test title 2,Test title 3",
+        },
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [str(articles[1].id)]
+
+    response = client.get("/articles", {"filter[title][prefix]": "Test title 3"})
+    assert [item["id"] for item in response.json()["data"]] == [str(articles[2].id)]
+
+
+@pytest.mark.django_db
+def test_get_many_invalid_filter(client: django.test.Client):
+    response = client.get("/articles", {"filter[created_at][gt]": "soon"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {
+        "parameter": "filter[created_at][gt]"
+    }
+    response = client.get("/articles", {"filter[created_at]": "2024-01-01"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["detail"] == (
+        "Unsupported filter 'filter[created_at]' for type 'articles'"
+    )
+
+
+def _operations(*operations: dict) -> tuple[str, str]:
+    return json.dumps({"atomic:operations": list(operations)}), (
+        'application/vnd.api+json; ext="https://jsonapi.org/ext/atomic"'
+    )
+
+
+@pytest.mark.django_db
+def test_operations(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    response = client.post(
+        "/operations",
+        *_operations(
+            {"op": "remove", "ref": {"type": "articles", "id": str(articles[0].id)}},
+            {"op": "remove", "ref": {"type": "articles", "id": str(articles[1].id)}},
+            {
+                "op": "update",
+                "data": {
+                    "type": "articles",
+                    "id": str(articles[2].id),
+                    "attributes": {"title": "New title"},
+                },
+            },
+        ),
+    )
+    assert response.status_code == 200
+    assert response.json()["atomic:results"] == [
+        {},
+        {},
+        {
+            "data": {
+                "type": "articles",
+                "id": str(articles[2].id),
+                "attributes": {"title": "New title", "content": "Test content 3"},
+                "links": {"self": f"/articles/{articles[2].id}"},
+            }
+        },
+    ]
+    assert list(ArticleModel.objects.values_list("title", flat=True)) == ["New title"]
+
+
+@pytest.mark.django_db
+def test_operations_roll_back(article: ArticleModel, client: django.test.Client):
+    response = client.post(
+        "/operations",
+        *_operations(
+            {
+                "op": "update",
+                "data": {
+                    "type": "articles",
+                    "id": str(article.id),
+                    "attributes": {"title": "New title"},
+                },
+            },
+            {"op": "remove", "ref": {"type": "articles", "id": "404"}},
+        ),
+    )
+    assert response.status_code == 404
+    article.refresh_from_db()
+    assert article.title == "Test title 1"
+
+    response = client.post("/operations", *_operations({"op": "add"}))
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {"pointer": "/atomic:operations/0"}
+
+
+@pytest.mark.django_db
+def test_create(client: django.test.Client):
+    response = client.post(
+        "/articles",
+        {
+            "data": {
+                "type": "articles",
+                "attributes": {"title": "New title", "content": "New content"},
+            }
+        },
+        "application/vnd.api+json",
+    )
+    assert response.status_code == 201
+    article_id = response.json()["data"]["id"]
+    assert response.headers["Location"] == f"/articles/{article_id}"
+    assert response.json()["links"] == {"self": f"/articles/{article_id}"}
+    assert ArticleModel.objects.get(id=article_id).title == "New title"
+
+
+@pytest.mark.django_db
+def test_create_conflict(article: ArticleModel, client: django.test.Client):
+    body = {"data": {"type": "articles", "id": str(article.id), "attributes": {}}}
+    response = client.post("/articles", body, "application/vnd.api+json")
+    assert response.status_code == 409
+    body["data"]["id"] = "abc"
+    response = client.post("/articles", body, "application/vnd.api+json")
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {"pointer": "/data/id"}
+
+
+@pytest.mark.django_db
+def test_create_many(client: django.test.Client):
+    response = client.post(
+        "/articles",
+        {
+            "data": [
+                {
+                    "type": "articles",
+                    "attributes": {"title": f"Title {i}", "content": "Content"},
+                }
+                for i in range(3)
+            ]
+        },
+        "application/vnd.api+json",
+    )
+    assert response.status_code == 201
+    assert "Location" not in response.headers
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(article.id) for article in ArticleModel.objects.order_by("id")
+    ]
+
+
+@pytest.mark.django_db
+def test_create_many_too_many_errors(
+    client: django.test.Client, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(pjst_rendering, "MAX_ERRORS", 2)
+    response = client.post(
+        "/articles",
+        {"data": [{"type": "articles", "attributes": {"title": i}} for i in range(5)]},
+        "application/vnd.api+json",
+    )
+    assert response.status_code == 400
+    errors = response.json()["errors"]
+    assert [error["source"]["pointer"] for error in errors[:2]] == [
+        "/0/attributes/title",
+        "/1/attributes/title",
+    ]
+    assert errors[2] == {
+        "status": "400",
+        "code": "too_many_errors",
+        "title": "Too many errors",
+        "detail": "3 more errors were not reported",
+    }
+
+
+@pytest.mark.django_db
+def test_operations_add(client: django.test.Client):
+    response = client.post(
+        "/operations",
+        *_operations(
+            {
+                "op": "add",
+                "data": {"type": "articles", "attributes": {"title": "Title"}},
+            }
+        ),
+    )
+    assert response.status_code == 200
+    result = response.json()["atomic:results"][0]["data"]
+    assert ArticleModel.objects.get(id=result["id"]).title == "Title"
+
+
+@pytest.mark.django_db
+def test_timing(
+    get_articles: Callable[[int], list[ArticleModel]],
+    client: django.test.Client,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    get_articles(2)
+    assert "Server-Timing" not in client.get("/articles").headers
+    measurements: list[Measurement] = []
+    monkeypatch.setattr(
+        ArticleResourceHandler,
+        "TIMING",
+        Timing(callback=measurements.append, server_timing=True),
+    )
+    urlconf = types.ModuleType("timed_urls")
+    urlconf.urlpatterns = register(ArticleResourceHandler)  # type: ignore[attr-defined]
+    with django.test.override_settings(ROOT_URLCONF=urlconf):
+        response = client.get("/articles", {"sort": "-title"})
+        assert response.status_code == 200
+        assert [
+            item.partition(";")[0]
+            for item in response.headers["Server-Timing"].split(", ")
+        ] == ["query", "handler", "serialize", "render", "total"]
+        (measurement,) = measurements
+        assert (measurement.type, measurement.method, measurement.status) == (
+            "articles",
+            "GET",
+            200,
+        )
+        assert measurement.response_bytes == len(response.content)
+
+        response = client.post(
+            "/articles",
+            {"data": {"type": "articles", "attributes": {"title": "New title"}}},
+            "application/vnd.api+json",
+        )
+        assert response.status_code == 201
+        assert set(measurements[-1].phases) == {
+            "body",
+            "handler",
+            "serialize",
+            "render",
+        }
+
+
+urlpatterns = [
+    *register(AsyncArticleResourceHandler),
+    *register(PersonResourceHandler),
+]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_one(article: ArticleModel, client: django.test.Client):
+    response = client.get(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.json() == {
+        "data": {
+            "type": "articles",
+            "id": str(article.id),
+            "attributes": {"title": "Test title 1", "content": "Test content 1"},
+            "links": {"self": f"/articles/{article.id}"},
+        },
+        "links": {"self": f"/articles/{article.id}"},
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_one_not_found(client: django.test.Client):
+    response = client.get("/articles/1")
+    assert response.status_code == 404
+    assert response.json()["errors"][0]["detail"] == "Article not found"
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_edit(article: ArticleModel, client: django.test.Client):
+    response = client.patch(
+        f"/articles/{article.id}",
+        data=json.dumps(
+            {
+                "data": {
+                    "type": "articles",
+                    "id": str(article.id),
+                    "attributes": {"title": "New title"},
+                }
+            }
+        ),
+        content_type="application/vnd.api+json",
+    )
+    assert response.status_code == 200, response.json()
+    assert response.json()["data"]["attributes"] == {
+        "title": "New title",
+        "content": "Test content 1",
+    }
+    article.refresh_from_db()
+    assert article.title == "New title"
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_delete(article: ArticleModel, client: django.test.Client):
+    response = client.delete(f"/articles/{article.id}")
+    assert response.status_code == 204
+    assert not ArticleModel.objects.filter(id=article.id).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_many(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(3)
+    response = client.get("/articles", {"page[size]": "2"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "data": [
+            {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": article.title, "content": article.content},
+                "links": {"self": f"/articles/{article.id}"},
+            }
+            for article in articles[:2]
+        ],
+        "links": {
+            "self": "/articles",
+            "next": f"/articles?page[size]=2&page[after]={articles[1].id}",
+        },
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_many_streamed(
+    get_articles: Callable[[int], list[ArticleModel]],
+    client: django.test.Client,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(AsyncArticleResourceHandler, "STREAM_MANY", True)
+    articles = get_articles(2)
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert response.streaming
+
+    async def _consume(streaming_content) -> bytes:
+        return b"".join([chunk async for chunk in streaming_content])
+
+    content = async_to_sync(_consume)(response.streaming_content)
+    assert [item["id"] for item in json.loads(content)["data"]] == [
+        str(article.id) for article in articles
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_many_include(
+    get_articles: Callable[[int], list[ArticleModel]], client: django.test.Client
+):
+    articles = get_articles(2)
+    author = PersonModel.objects.create(name="Author")
+    ArticleModel.objects.filter(id=articles[1].id).update(author=author)
+    response = client.get("/articles", {"include": "author"})
+    assert response.status_code == 200
+    assert response.json()["included"] == [
+        {
+            "type": "people",
+            "id": str(author.id),
+            "attributes": {"name": "Author"},
+            "links": {"self": f"/people/{author.id}"},
+        }
+    ]
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_relationship(article: ArticleModel, client: django.test.Client):
+    author = PersonModel.objects.create(name="Author")
+    ArticleModel.objects.filter(id=article.id).update(author=author)
+    response = client.get(f"/articles/{article.id}/relationships/author")
+    assert response.status_code == 200
+    assert response.json()["data"] == {"type": "people", "id": str(author.id)}
+    response = client.get(f"/articles/{article.id}/author")
+    assert response.json()["data"]["attributes"] == {"name": "Author"}
+    response = client.get("/articles/404404/author")
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_one_etag(article: ArticleModel, client: django.test.Client):
+    etag = client.get(f"/articles/{article.id}").headers["ETag"]
+    response = client.get(f"/articles/{article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_get_many_sort_not_supported(client: django.test.Client):
+    response = client.get("/articles", {"sort": "title"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {"parameter": "sort"}
+
+
+@pytest.mark.django_db
+@pytest.mark.urls(__name__)
+def test_async_operations(article: ArticleModel, client: django.test.Client):
+    response = client.post(
+        "/operations",
+        *_operations(
+            {"op": "remove", "ref": {"type": "articles", "id": str(article.id)}}
+        ),
+    )
+    assert response.status_code == 204
+    assert not ArticleModel.objects.exists()
+
+
+@pytest.mark.django_db
+def test_registry(article: ArticleModel, client: django.test.Client):
+    urlconf = types.ModuleType("registry_urls")
+    urlconf.urlpatterns = Registry(  # type: ignore[attr-defined]
+        [ArticleResourceHandler, PersonResourceHandler]
+    ).django()
+    assert [pattern.name for pattern in urlconf.urlpatterns] == [  # type: ignore[attr-defined]
+        "articles_object",
+        "articles_list",
+        "articles_relationship",
+        "articles_related",
+        "people_object",
+        "people_relationship",
+        "people_related",
+        "pjst_operations",
+    ]
+    with django.test.override_settings(ROOT_URLCONF=urlconf):
+        response = client.get(f"/articles/{article.id}")
+        assert response.status_code == 200
+        assert response.json()["data"]["links"] == {"self": f"/articles/{article.id}"}
+
+
+class BarrierResourceHandler(ResourceHandler):
+    """Its `get_one` returns once two requests are in it at the same time"""
+
+    TYPE = "barriers"
+    BARRIER = threading.Barrier(2, timeout=5)
+
+    @classmethod
+    def get_one(cls, obj_id: str) -> pjst_types.Response:
+        cls.BARRIER.wait()
+        return pjst_types.Response(data=pjst_types.Resource(type="barriers", id=obj_id))
+
+    @classmethod
+    async def delete_one(cls, obj_id: str) -> None:
+        return None
+
+    @classmethod
+    def serialize(cls, obj: pjst_types.Resource) -> pjst_types.Resource:
+        return obj
+
+
+def test_async_requests_overlap():
+    urlconf = types.ModuleType("barrier_urls")
+    urlconf.urlpatterns = register(BarrierResourceHandler, thread_sensitive=False)  # type: ignore[attr-defined]
+
+    async def _get_both():
+        client = django.test.AsyncClient()
+        return await asyncio.gather(
+            client.get("/barriers/1"), client.get("/barriers/2")
+        )
+
+    with django.test.override_settings(ROOT_URLCONF=urlconf):
+        responses = async_to_sync(_get_both)()
+    assert [response.status_code for response in responses] == [200, 200]
+    assert [response.json()["data"]["id"] for response in responses] == ["1", "2"]
@@ -1,7 +1,8 @@
 from pjst.django import register
 
-from .views import ArticleResourceHandler
+from .views import ArticleResourceHandler, PersonResourceHandler
 
 urlpatterns = [
     *register(ArticleResourceHandler),
+    *register(PersonResourceHandler),
 ]
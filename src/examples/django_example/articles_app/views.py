@@ -1,12 +1,47 @@
-from typing import Annotated
+import datetime
+from typing import Annotated, Any
 
 import pydantic
+from django.db import IntegrityError, transaction
 
 from pjst import ResourceHandler
 from pjst import exceptions as pjst_exceptions
 from pjst import types as pjst_types
 
-from .models import ArticleModel
+from .models import ArticleModel, PersonModel
+
+# `Conditions` attribute => Django lookup
+_LOOKUPS = {
+    "eq": "exact",
+    "in_": "in",
+    "lt": "lt",
+    "lte": "lte",
+    "gt": "gt",
+    "gte": "gte",
+    "prefix": "startswith",
+}
+
+
+def _lookups(field: str, conditions: pjst_types.Conditions) -> dict[str, Any]:
+    return {
+        f"{field}__{lookup}": value
+        for name, lookup in _LOOKUPS.items()
+        if (value := getattr(conditions, name)) is not None
+    }
+
+
+def _new_article(obj: "ArticleSchema") -> ArticleModel:
+    """An unsaved article; clients may choose its ID"""
+
+    article = ArticleModel(title=obj.attributes.title, content=obj.attributes.content)
+    if "id" in obj.model_fields_set:
+        try:
+            article.id = int(obj.id)
+        except ValueError:
+            raise pjst_exceptions.BadRequest(
+                "Article IDs are integers", source={"pointer": "/data/id"}
+            )
+    return article
 
 
 class ArticleSchema(pjst_types.Resource):
@@ -24,15 +59,123 @@ class ArticleSchema(pjst_types.Resource):
     )
 
 
+class PersonSchema(pjst_types.Resource):
+    class Attributes(pydantic.BaseModel):
+        name: str = pydantic.Field(default="", examples=["Name"])
+
+    type: str = pydantic.Field(default="people")
+    id: str = pydantic.Field(default="1", examples=["1"])
+    attributes: Attributes = pydantic.Field(default_factory=Attributes)
+
+
+class PersonResourceHandler(ResourceHandler):
+    TYPE = "people"
+
+    @classmethod
+    def get_one(cls, obj_id: str) -> pjst_types.Response:
+        try:
+            return pjst_types.Response(data=PersonModel.objects.get(id=obj_id))
+        except PersonModel.DoesNotExist:
+            raise pjst_exceptions.NotFound("Person not found")
+
+    @classmethod
+    def load_many(cls, ids: list[str]) -> list[PersonModel]:
+        return list(PersonModel.objects.filter(id__in=ids))
+
+    @classmethod
+    def get_relationship(
+        cls, obj_id: str, name: str, page: pjst_types.Cursor | None
+    ) -> pjst_types.Response:
+        # Only `articles`, the IDs of the person's articles by ID
+        if not PersonModel.objects.filter(id=obj_id).exists():
+            raise pjst_exceptions.NotFound("Person not found")
+        queryset = ArticleModel.objects.filter(author_id=obj_id)
+        try:
+            if page.before is not None:
+                queryset = queryset.filter(id__lt=int(page.before)).order_by("-id")
+            else:
+                if page.after is not None:
+                    queryset = queryset.filter(id__gt=int(page.after))
+                queryset = queryset.order_by("id")
+        except ValueError:
+            raise pjst_exceptions.BadRequest(
+                "Invalid page cursor", source={"parameter": "page"}
+            )
+        ids = [str(id) for id in queryset.values_list("id", flat=True)[: page.size + 1]]
+        has_more = len(ids) > page.size
+        ids = ids[: page.size]
+        if page.before is not None:
+            ids.reverse()
+        has_next, has_prev = (
+            (True, has_more)
+            if page.before is not None
+            else (has_more, bool(page.after))
+        )
+        return pjst_types.Response(
+            data=ids,
+            next_cursor=ids[-1] if ids and has_next else None,
+            prev_cursor=ids[0] if ids and has_prev else None,
+        )
+
+    @classmethod
+    def serialize(cls, obj: PersonModel) -> PersonSchema:
+        return PersonSchema(
+            id=str(obj.id), attributes=PersonSchema.Attributes(name=obj.name)
+        )
+
+
 class ArticleResourceHandler(ResourceHandler):
     TYPE = "articles"
+    RELATIONSHIPS = {"author": pjst_types.Relation(PersonResourceHandler)}
 
     @classmethod
     def get_one(cls, obj_id: str) -> pjst_types.Response:
         try:
-            return pjst_types.Response(data=ArticleModel.objects.get(id=obj_id))
+            article = ArticleModel.objects.get(id=obj_id)
         except ArticleModel.DoesNotExist:
             raise pjst_exceptions.NotFound("Article not found")
+        return pjst_types.Response(data=article, version=article.updated_at)
+
+    @classmethod
+    def load_many(cls, ids: list[str]) -> list[ArticleModel]:
+        return list(ArticleModel.objects.filter(id__in=ids))
+
+    @classmethod
+    def get_relationship(
+        cls, obj_id: str, name: str, page: pjst_types.Cursor | None
+    ) -> pjst_types.Response:
+        # Only `author`, straight from the foreign key
+        try:
+            author_id = ArticleModel.objects.values_list("author_id", flat=True).get(
+                id=obj_id
+            )
+        except ArticleModel.DoesNotExist:
+            raise pjst_exceptions.NotFound("Article not found")
+        return pjst_types.Response(
+            data=str(author_id) if author_id is not None else None
+        )
+
+    @classmethod
+    def create_one(cls, obj: ArticleSchema) -> pjst_types.Response:
+        article = _new_article(obj)
+        try:
+            with transaction.atomic():
+                article.save(force_insert=True)
+        except IntegrityError:
+            raise pjst_exceptions.Conflict(f"Article with id '{obj.id}' already exists")
+        return pjst_types.Response(data=article)
+
+    @classmethod
+    def create_many(cls, objs: list[ArticleSchema]) -> pjst_types.Response:
+        # One INSERT for all of them instead of one per article
+        try:
+            with transaction.atomic():
+                articles = ArticleModel.objects.bulk_create(
+                    [_new_article(obj) for obj in objs]
+                )
+        except IntegrityError:
+            raise pjst_exceptions.Conflict("Some of the articles already exist")
+        return pjst_types.Response(data=articles)
 
     @classmethod
     def edit_one(cls, obj: ArticleSchema) -> pjst_types.Response:
@@ -58,19 +201,179 @@ class ArticleResourceHandler(ResourceHandler):
         if count == 0:
             raise pjst_exceptions.NotFound(f"Article with id '{obj_id}' not found")
 
+    @classmethod
+    def delete_many(cls, obj_ids: list[str]) -> None:
+        # One statement for a whole run of `remove` operations, which run in a
+        # transaction
+        count, _ = ArticleModel.objects.filter(id__in=obj_ids).delete()
+        if count != len(set(obj_ids)):
+            raise pjst_exceptions.NotFound("Some of the articles were not found")
+
     @classmethod
     def get_many(
         cls,
-        title: Annotated[str | None, pjst_types.Filter()] = None,
+        page: Annotated[pjst_types.Cursor, pjst_types.Page(max_size=100)],
+        title: Annotated[
+            pjst_types.Conditions[str] | None,
+            pjst_types.Filter(operators=("eq", "in", "prefix")),
+        ] = None,
+        created_at: Annotated[
+            pjst_types.Conditions[datetime.datetime] | None,
+            pjst_types.Filter(operators=("gt", "gte", "lt", "lte")),
+        ] = None,
+        fields: Annotated[frozenset[str] | None, pjst_types.Fields()] = None,
+        sort: Annotated[
+            list[pjst_types.SortField] | None, pjst_types.Sort("title", "created_at")
+        ] = None,
     ) -> pjst_types.Response:
-        queryset = ArticleModel.objects.order_by("created_at")
+        if sort and (page.after is not None or page.before is not None):
+            # The cursors are article IDs, so they only work with the default
+            # order
+            raise pjst_exceptions.BadRequest(
+                "Page cursors can't be combined with 'sort'",
+                source={"parameter": "sort"},
+            )
+        queryset = ArticleModel.objects.all()
+        if fields is not None:
+            queryset = queryset.only("id", "author_id", *fields)
         if title is not None:
-            queryset = queryset.filter(title=title)
-        return pjst_types.Response(data=queryset)
+            queryset = queryset.filter(**_lookups("title", title))
+        if created_at is not None:
+            queryset = queryset.filter(**_lookups("created_at", created_at))
+        try:
+            if page.before is not None:
+                queryset = queryset.filter(id__lt=int(page.before)).order_by("-id")
+            else:
+                if page.after is not None:
+                    queryset = queryset.filter(id__gt=int(page.after))
+                queryset = queryset.order_by(
+                    *(
+                        f"-{item.field}" if item.descending else item.field
+                        for item in sort or ()
+                    ),
+                    "id",
+                )
+        except ValueError:
+            raise pjst_exceptions.BadRequest(
+                "Invalid page cursor", source={"parameter": "page"}
+            )
+        articles = list(queryset[: page.size + 1])
+        has_more = len(articles) > page.size
+        articles = articles[: page.size]
+        if page.before is not None:
+            articles.reverse()
+        has_next, has_prev = (
+            (True, has_more)
+            if page.before is not None
+            else (has_more, bool(page.after))
+        )
+        return pjst_types.Response(
+            data=articles,
+            next_cursor=(
+                str(articles[-1].id) if articles and has_next and not sort else None
+            ),
+            prev_cursor=str(articles[0].id) if articles and has_prev else None,
+        )
 
     @classmethod
     def serialize(cls, obj: ArticleModel) -> ArticleSchema:
-        return ArticleSchema(
+        # Don't touch the columns `get_many` left out for sparse fieldsets
+        deferred = obj.get_deferred_fields()
+        article = ArticleSchema(
             id=str(obj.id),
-            attributes=ArticleSchema.Attributes(title=obj.title, content=obj.content),
+            attributes=ArticleSchema.Attributes(
+                **{
+                    name: getattr(obj, name)
+                    for name in ("title", "content")
+                    if name not in deferred
+                }
+            ),
         )
+        if obj.author_id is not None:
+            article.relationships = {
+                "author": pjst_types.Relationship(
+                    data=pjst_types.ResourceIdentifier(
+                        type="people", id=str(obj.author_id)
+                    )
+                )
+            }
+        return article
+
+
+class AsyncArticleResourceHandler(ArticleResourceHandler):
+    """Same as `ArticleResourceHandler` but with Django's async ORM API, for
+    ASGI deployments. `register` produces async views for it."""
+
+    @classmethod
+    async def get_one(cls, obj_id: str) -> pjst_types.Response:
+        try:
+            return pjst_types.Response(data=await ArticleModel.objects.aget(id=obj_id))
+        except ArticleModel.DoesNotExist:
+            raise pjst_exceptions.NotFound("Article not found")
+
+    @classmethod
+    async def load_many(cls, ids: list[str]) -> list[ArticleModel]:
+        return [article async for article in ArticleModel.objects.filter(id__in=ids)]
+
+    @classmethod
+    async def get_relationship(
+        cls, obj_id: str, name: str, page: pjst_types.Cursor | None
+    ) -> pjst_types.Response:
+        try:
+            author_id = await ArticleModel.objects.values_list(
+                "author_id", flat=True
+            ).aget(id=obj_id)
+        except ArticleModel.DoesNotExist:
+            raise pjst_exceptions.NotFound("Article not found")
+        return pjst_types.Response(
+            data=str(author_id) if author_id is not None else None
+        )
+
+    @classmethod
+    async def edit_one(cls, obj: ArticleSchema) -> pjst_types.Response:
+        if not obj.attributes.model_fields_set:
+            raise pjst_exceptions.BadRequest(
+                "At least one attribute must be set",
+                source={"pointer": "/data/attributes"},
+            )
+        try:
+            article = await ArticleModel.objects.aget(id=obj.id)
+        except ArticleModel.DoesNotExist:
+            raise pjst_exceptions.NotFound(f"Article with id '{obj.id}' not found")
+        if "title" in obj.attributes.model_fields_set:
+            article.title = obj.attributes.title
+        if "content" in obj.attributes.model_fields_set:
+            article.content = obj.attributes.content
+        await article.asave()
+        return pjst_types.Response(data=article)
+
+    @classmethod
+    async def delete_one(cls, obj_id: str) -> None:
+        count, _ = await ArticleModel.objects.filter(id=obj_id).adelete()
+        if count == 0:
+            raise pjst_exceptions.NotFound(f"Article with id '{obj_id}' not found")
+
+    @classmethod
+    async def get_many(
+        cls,
+        page: Annotated[pjst_types.Cursor, pjst_types.Page(max_size=100)],
+        title: Annotated[str | None, pjst_types.Filter()] = None,
+    ) -> pjst_types.Response:
+        queryset = ArticleModel.objects.order_by("id")
+        if title is not None:
+            queryset = queryset.filter(title=title)
+        if page.after is not None:
+            queryset = queryset.filter(id__gt=page.after)
+        articles = [article async for article in queryset[: page.size + 1]]
+        has_more = len(articles) > page.size
+        articles = articles[: page.size]
+        return pjst_types.Response(
+            data=articles,
+            next_cursor=str(articles[-1].id) if has_more else None,
+        )
+
+
+# The handlers refer to each other
+PersonResourceHandler.RELATIONSHIPS = {
+    "articles": pjst_types.Relation(ArticleResourceHandler, many=True)
+}
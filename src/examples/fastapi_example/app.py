@@ -2,9 +2,10 @@ from fastapi import FastAPI
 
 from pjst.fastapi import register
 
-from .views import ArticleResourceHandler
+from .views import ArticleResourceHandler, PersonResourceHandler
 
 app = FastAPI()
 
 
 register(app, ArticleResourceHandler)
+register(app, PersonResourceHandler)
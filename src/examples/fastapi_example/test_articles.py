@@ -1,12 +1,26 @@
-from typing import Callable
+import asyncio
+import contextlib
+import datetime
+import threading
+from typing import Annotated, Callable, Iterable, Iterator
 
 import pytest
+from fastapi import FastAPI
 from fastapi.testclient import TestClient
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
+from pjst import Registry, ResourceHandler
+from pjst import rendering as pjst_rendering
+from pjst import types as pjst_types
+from pjst.asgi import App
+from pjst.cache import ResponseCache
+from pjst.fastapi import register
+from pjst.timing import Measurement, Timing
+
 from . import models
 from .app import app
+from .views import ArticleResourceHandler, ArticleSchema, PersonResourceHandler
 
 client = TestClient(app)
 
@@ -292,3 +306,1144 @@ def test_get_many_with_filter(
         ],
         "links": {"self": "/articles"},
     }
+
+
+def test_edit_missing_data(article: models.ArticleModel):
+    response = client.patch(f"/articles/{article.id}", json={"meta": {}})
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Invalid data field",
+                "source": {"pointer": "/data"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def test_get_many_streamed(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    articles = get_articles(2)
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.api+json"
+    assert response.json() == {
+        "data": [
+            {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": article.title, "content": article.content},
+                "links": {"self": f"/articles/{article.id}"},
+            }
+            for article in articles
+        ],
+        "links": {"self": "/articles"},
+    }
+
+
+def test_get_many_streamed_async_iterator(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    articles = get_articles(2)
+
+    async def _articles():
+        for article in articles:
+            yield article
+
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    monkeypatch.setattr(
+        ArticleResourceHandler,
+        "get_many",
+        classmethod(lambda cls, **kwargs: pjst_types.Response(data=_articles())),
+    )
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(article.id) for article in articles
+    ]
+
+
+def test_get_many_paginated(get_articles: Callable[[int], list[models.ArticleModel]]):
+    articles = get_articles(3)
+    response = client.get("/articles", params={"page[size]": "2"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[0].id),
+        str(articles[1].id),
+    ]
+    assert response.json()["links"] == {
+        "self": "/articles",
+        "next": f"/articles?page[size]=2&page[after]={articles[1].id}",
+    }
+
+    response = client.get(response.json()["links"]["next"])
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [str(articles[2].id)]
+    assert response.json()["links"] == {
+        "self": "/articles",
+        "prev": f"/articles?page[size]=2&page[before]={articles[2].id}",
+    }
+
+    response = client.get(response.json()["links"]["prev"])
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[0].id),
+        str(articles[1].id),
+    ]
+
+
+def test_get_many_invalid_page_size(db):
+    response = client.get("/articles", params={"page[size]": "1000"})
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Page size must be an integer between 1 and 100",
+                "source": {"parameter": "page[size]"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def test_get_many_sparse_fieldset(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+):
+    articles = get_articles(2)
+    response = client.get("/articles", params={"fields[articles]": "title"})
+    assert response.status_code == 200
+    assert [item["attributes"] for item in response.json()["data"]] == [
+        {"title": article.title} for article in articles
+    ]
+
+
+def test_get_one_sparse_fieldset(article: models.ArticleModel):
+    response = client.get(
+        f"/articles/{article.id}", params={"fields[articles]": "content"}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["attributes"] == {"content": "Test content 1"}
+
+
+def test_get_many_unknown_field(db):
+    response = client.get("/articles", params={"fields[articles]": "title,age"})
+    assert response.status_code == 400
+    assert response.json() == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Unknown fields for type 'articles': age",
+                "source": {"parameter": "fields[articles]"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+def test_get_many_streamed_async_iterator_serializes_off_loop(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    articles = get_articles(2)
+    on_loop = []
+
+    async def _articles():
+        for article in articles:
+            yield article
+
+    def _serialize_many(cls, objs):
+        on_loop.append(_loop_running())
+        return [cls.serialize(obj) for obj in objs]
+
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    monkeypatch.setattr(
+        ArticleResourceHandler,
+        "get_many",
+        classmethod(lambda cls, **kwargs: pjst_types.Response(data=_articles())),
+    )
+    monkeypatch.setattr(
+        ArticleResourceHandler, "serialize_many", classmethod(_serialize_many)
+    )
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert len(response.json()["data"]) == 2
+    # One batch, serialized in the thread pool rather than on the event loop
+    assert on_loop == [False]
+
+
+class AsyncArticleResourceHandler(ArticleResourceHandler):
+    @classmethod
+    async def get_one(cls, obj_id: str) -> pjst_types.Response:
+        return super().get_one(obj_id)
+
+    @classmethod
+    async def get_many(
+        cls,
+        page: Annotated[pjst_types.Cursor, pjst_types.Page(max_size=100)],
+    ) -> pjst_types.Response:
+        return super().get_many(page)
+
+    @classmethod
+    async def delete_one(cls, obj_id: str) -> None:
+        return super().delete_one(obj_id)
+
+    @classmethod
+    async def serialize(cls, obj: models.ArticleModel) -> ArticleSchema:
+        return super().serialize(obj)
+
+
+@pytest.fixture()
+def async_client() -> TestClient:
+    async_app = FastAPI()
+    register(async_app, AsyncArticleResourceHandler)
+    return TestClient(async_app)
+
+
+def test_async_handler_get_one(article: models.ArticleModel, async_client: TestClient):
+    response = async_client.get(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.json() == {
+        "data": {
+            "attributes": {"title": "Test title 1", "content": "Test content 1"},
+            "id": str(article.id),
+            "links": {"self": f"/articles/{article.id}"},
+            "type": "articles",
+        },
+        "links": {"self": f"/articles/{article.id}"},
+    }
+
+
+def test_async_handler_get_one_not_found(db, async_client: TestClient):
+    response = async_client.get("/articles/1")
+    assert response.status_code == 404
+
+
+def test_async_handler_get_many(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    async_client: TestClient,
+):
+    articles = get_articles(2)
+    response = async_client.get("/articles")
+    assert response.status_code == 200
+    assert response.json() == {
+        "data": [
+            {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": article.title, "content": article.content},
+                "links": {"self": f"/articles/{article.id}"},
+            }
+            for article in articles
+        ],
+        "links": {"self": "/articles"},
+    }
+
+
+class StreamedArticleResourceHandler(AsyncArticleResourceHandler):
+    STREAM_MANY = True
+    OBJS: Iterable[models.ArticleModel] = ()
+
+    @classmethod
+    async def get_many(cls) -> pjst_types.Response:
+        return pjst_types.Response(data=cls.OBJS)
+
+
+def test_async_handler_streamed_iterates_off_loop(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    articles = get_articles(3)
+    on_loop = []
+
+    def _articles():
+        for article in articles:
+            on_loop.append(_loop_running())
+            yield article
+
+    monkeypatch.setattr(StreamedArticleResourceHandler, "OBJS", _articles())
+    streamed_app = FastAPI()
+    register(streamed_app, StreamedArticleResourceHandler)
+    response = TestClient(streamed_app).get("/articles")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(article.id) for article in articles
+    ]
+    # The lazy iterable is pulled in the thread pool, not on the event loop
+    assert on_loop == [False, False, False]
+
+
+def _set_author(articles: list[models.ArticleModel], name: str) -> models.PersonModel:
+    with Session(models.engine) as session:
+        person = models.PersonModel(name=name)
+        session.add(person)
+        session.flush()
+        for article in articles:
+            session.get(models.ArticleModel, article.id).author_id = person.id
+        session.commit()
+        session.refresh(person)
+    return person
+
+
+def test_get_one_include(article: models.ArticleModel):
+    author = _set_author([article], "Author")
+    response = client.get(f"/articles/{article.id}?include=author")
+    assert response.status_code == 200
+    assert response.json()["data"]["relationships"] == {
+        "author": {"data": {"type": "people", "id": str(author.id)}}
+    }
+    assert response.json()["included"] == [
+        {
+            "type": "people",
+            "id": str(author.id),
+            "attributes": {"name": "Author"},
+            "links": {"self": f"/people/{author.id}"},
+        }
+    ]
+
+
+def test_async_handler_get_many_include(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    async_client: TestClient,
+):
+    articles = get_articles(2)
+    author = _set_author(articles, "Author")
+    response = async_client.get("/articles?include=author")
+    assert response.status_code == 200
+    # The people handler isn't registered with this app, so no self link
+    assert response.json()["included"] == [
+        {"type": "people", "id": str(author.id), "attributes": {"name": "Author"}}
+    ]
+
+
+def test_get_many_unknown_include(db):
+    response = client.get("/articles?include=author.comments")
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {"parameter": "include"}
+
+
+def test_relationship(get_articles: Callable[[int], list[models.ArticleModel]]):
+    articles = get_articles(2)
+    author = _set_author(articles[:1], "Author")
+    response = client.get(f"/articles/{articles[0].id}/relationships/author")
+    assert response.status_code == 200
+    assert response.json() == {
+        "data": {"type": "people", "id": str(author.id)},
+        "links": {
+            "self": f"/articles/{articles[0].id}/relationships/author",
+            "related": f"/articles/{articles[0].id}/author",
+        },
+    }
+    response = client.get(f"/articles/{articles[0].id}/author")
+    assert response.status_code == 200
+    assert response.json()["data"] == {
+        "type": "people",
+        "id": str(author.id),
+        "attributes": {"name": "Author"},
+        "links": {"self": f"/people/{author.id}"},
+    }
+    response = client.get(f"/articles/{articles[1].id}/relationships/author")
+    assert response.status_code == 200
+    assert response.json()["data"] is None
+
+
+def test_relationship_paginated(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+):
+    articles = get_articles(3)
+    author = _set_author(articles, "Author")
+    response = client.get(
+        f"/people/{author.id}/relationships/articles", params={"page[size]": 2}
+    )
+    assert response.status_code == 200
+    assert response.json()["data"] == [
+        {"type": "articles", "id": str(article.id)} for article in articles[:2]
+    ]
+    response = client.get(response.json()["links"]["next"])
+    assert response.json()["data"] == [{"type": "articles", "id": str(articles[2].id)}]
+    assert "next" not in response.json()["links"]
+    response = client.get(f"/people/{author.id}/articles?page[size]=2")
+    assert [item["attributes"]["title"] for item in response.json()["data"]] == [
+        article.title for article in articles[:2]
+    ]
+
+
+def test_relationship_not_found(article: models.ArticleModel):
+    response = client.get(f"/articles/{article.id}/relationships/comments")
+    assert response.status_code == 404
+    assert response.json()["errors"][0]["detail"] == (
+        "'articles' has no relationship 'comments'"
+    )
+    response = client.get("/articles/404404/author")
+    assert response.status_code == 404
+
+
+class BatchArticleResourceHandler(ArticleResourceHandler):
+    batches: list[int] = []
+
+    @classmethod
+    def get_one(cls, obj_id: str) -> pjst_types.Response:
+        return super().get_one(obj_id)
+
+    @classmethod
+    def get_many(
+        cls,
+        page: Annotated[pjst_types.Cursor, pjst_types.Page(max_size=100)],
+    ) -> pjst_types.Response:
+        return super().get_many(page)
+
+    @classmethod
+    async def serialize_many(
+        cls, objs: list[models.ArticleModel]
+    ) -> list[ArticleSchema]:
+        cls.batches.append(len(objs))
+        return [cls.serialize(obj) for obj in objs]
+
+
+def test_get_many_async_serialize_many(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+):
+    batch_app = FastAPI()
+    register(batch_app, BatchArticleResourceHandler)
+    articles = get_articles(3)
+    response = TestClient(batch_app).get("/articles")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(article.id) for article in articles
+    ]
+    assert BatchArticleResourceHandler.batches == [3]
+
+
+def test_get_one_etag(article: models.ArticleModel):
+    response = client.get(f"/articles/{article.id}")
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    response = client.get(f"/articles/{article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+
+def test_get_many_etag(get_articles: Callable[[int], list[models.ArticleModel]]):
+    get_articles(2)
+    response = client.get("/articles")
+    etag = response.headers["ETag"]
+    response = client.get("/articles", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    get_articles(1)
+    response = client.get("/articles", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_head(article: models.ArticleModel):
+    response = client.head(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert "ETag" in response.headers
+    response = client.head("/articles")
+    assert response.status_code == 200
+    assert response.content == b""
+
+
+def test_cache_create_without_content(
+    article: models.ArticleModel, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", ResponseCache(ttl=60))
+    create_one = ArticleResourceHandler.create_one
+
+    @classmethod
+    def _create_one(cls, obj: ArticleSchema) -> None:
+        create_one(obj)
+
+    monkeypatch.setattr(ArticleResourceHandler, "create_one", _create_one)
+    assert len(client.get("/articles").json()["data"]) == 1
+    response = client.post(
+        "/articles", json={"data": {"type": "articles", "attributes": {}}}
+    )
+    assert response.status_code == 204
+    assert len(client.get("/articles").json()["data"]) == 2
+
+
+def test_cache(article: models.ArticleModel, monkeypatch: pytest.MonkeyPatch):
+    cache = ResponseCache(ttl=60)
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", cache)
+    first = client.get(f"/articles/{article.id}")
+    second = client.get(f"/articles/{article.id}")
+    assert second.content == first.content
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+    response = client.patch(
+        f"/articles/{article.id}",
+        json={
+            "data": {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": "New title"},
+            }
+        },
+    )
+    assert response.status_code == 200
+    response = client.get(f"/articles/{article.id}")
+    assert response.json()["data"]["attributes"]["title"] == "New title"
+    assert cache.stats.misses == 2
+
+
+def test_links_honor_mount_path(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+):
+    articles = get_articles(2)
+    mounted = FastAPI()
+    mounted.mount("/app", app)
+    response = TestClient(mounted).get("/app/articles")
+    assert response.status_code == 200
+    assert [item["links"] for item in response.json()["data"]] == [
+        {"self": f"/app/articles/{article.id}"} for article in articles
+    ]
+
+
+def test_get_many_sorted(get_articles: Callable[[int], list[models.ArticleModel]]):
+    articles = get_articles(3)
+    response = client.get("/articles", params={"sort": "-title", "page[size]": "2"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[2].id),
+        str(articles[1].id),
+    ]
+    assert response.json()["links"] == {"self": "/articles"}
+
+
+def test_get_many_sort_with_cursor(db):
+    response = client.get("/articles", params={"sort": "title", "page[after]": "1"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {"parameter": "sort"}
+
+
+def test_async_handler_sort_not_supported(db, async_client: TestClient):
+    response = async_client.get("/articles", params={"sort": "title"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["detail"] == (
+        "Sorting is not supported for type 'articles'"
+    )
+
+
+def test_openapi_documents_sort():
+    parameters = client.get("/openapi.json").json()["paths"]["/articles"]["get"][
+        "parameters"
+    ]
+    (sort,) = [item for item in parameters if item["name"] == "sort"]
+    assert sort["description"].endswith("One of: created_at, title")
+
+
+def test_get_many_filter_operators(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+):
+    articles = get_articles(3)
+    with Session(models.engine) as session:
+        for month, article in enumerate(articles, start=1):
+            session.get(models.ArticleModel, article.id).created_at = datetime.datetime(
+                2024, month, 1
+            )
+        session.commit()
+    response = client.get(
+        "/articles",
+        params={
+            "filter[created_at][gt]": "2024-01-01T00:00:00",
+            "filter[title][in]": "Test title 2,Test title 3",
+            "filter[title][prefix]": "Test",
+        },
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json()["data"]] == [
+        str(articles[1].id),
+        str(articles[2].id),
+    ]
+
+
+def test_get_many_invalid_filter(db):
+    response = client.get("/articles", params={"filter[created_at][lte]": "x"})
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {
+        "parameter": "filter[created_at][lte]"
+    }
+
+
+def test_openapi_documents_filters():
+    parameters = client.get("/openapi.json").json()["paths"]["/articles"]["get"][
+        "parameters"
+    ]
+    assert {
+        item["name"] for item in parameters if item["name"].startswith("filter[")
+    } == {
+        "filter[title]",
+        "filter[title][in]",
+        "filter[title][prefix]",
+        "filter[created_at][gt]",
+        "filter[created_at][gte]",
+        "filter[created_at][lt]",
+        "filter[created_at][lte]",
+    }
+    by_name = {item["name"]: item for item in parameters}
+    # With the filters' types, and the `Filter(...)` keyword arguments
+    assert by_name["filter[created_at][gte]"]["schema"]["anyOf"][0] == {
+        "type": "string",
+        "format": "date-time",
+    }
+    assert (
+        by_name["filter[created_at][gte]"]["description"]
+        == "When the article was created"
+    )
+    # Comma-separated
+    assert by_name["filter[title][in]"]["schema"]["anyOf"][0] == {"type": "string"}
+    assert by_name["page[size]"]["schema"]["anyOf"][0] == {"type": "integer"}
+
+
+def test_operations(get_articles: Callable[[int], list[models.ArticleModel]]):
+    articles = get_articles(3)
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {
+                    "op": "remove",
+                    "ref": {"type": "articles", "id": str(articles[0].id)},
+                },
+                {
+                    "op": "remove",
+                    "ref": {"type": "articles", "id": str(articles[1].id)},
+                },
+                {
+                    "op": "update",
+                    "ref": {"type": "articles", "id": str(articles[2].id)},
+                    "data": {"type": "articles", "attributes": {"content": "New"}},
+                },
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["atomic:results"] == [
+        {},
+        {},
+        {
+            "data": {
+                "type": "articles",
+                "id": str(articles[2].id),
+                "attributes": {"title": "Test title 3", "content": "New"},
+                "links": {"self": f"/articles/{articles[2].id}"},
+            }
+        },
+    ]
+    assert client.get(f"/articles/{articles[0].id}").status_code == 404
+
+
+def test_operations_roll_back(article: models.ArticleModel):
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {"op": "remove", "ref": {"type": "articles", "id": str(article.id)}},
+                {"op": "remove", "ref": {"type": "people", "id": "1"}},
+            ]
+        },
+    )
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["detail"] == (
+        "Operation 'remove' is not supported for type 'people'"
+    )
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {"op": "remove", "ref": {"type": "articles", "id": str(article.id)}},
+                {"op": "remove", "ref": {"type": "articles", "id": "404"}},
+            ]
+        },
+    )
+    assert response.status_code == 404
+    assert client.get(f"/articles/{article.id}").status_code == 200
+
+
+def test_async_handler_operations(
+    article: models.ArticleModel, async_client: TestClient
+):
+    response = async_client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {"op": "remove", "ref": {"type": "articles", "id": str(article.id)}}
+            ]
+        },
+    )
+    assert response.status_code == 204
+    assert async_client.get(f"/articles/{article.id}").status_code == 404
+
+
+_THREADS: dict[str, list[int]] = {}
+
+
+@contextlib.contextmanager
+def _thread_bound_transaction() -> Iterator[None]:
+    # Stands for eg a scoped session, which only covers its own thread
+    _THREADS.setdefault("transaction", []).append(threading.get_ident())
+    yield
+
+
+class ThreadArticleResourceHandler(ArticleResourceHandler):
+    TRANSACTION = _thread_bound_transaction
+
+    @classmethod
+    def edit_one(cls, obj: ArticleSchema) -> pjst_types.Response:
+        _THREADS.setdefault("writes", []).append(threading.get_ident())
+        return super().edit_one(obj)
+
+
+class ThreadPersonResourceHandler(PersonResourceHandler):
+    TRANSACTION = _thread_bound_transaction
+
+    @classmethod
+    async def delete_one(cls, obj_id: str) -> None:
+        _THREADS.setdefault("writes", []).append(threading.get_ident())
+
+
+def _fastapi_app(resource_classes: list[type[ResourceHandler]]) -> FastAPI:
+    fastapi_app = FastAPI()
+    for resource_cls in resource_classes:
+        register(fastapi_app, resource_cls)
+    return fastapi_app
+
+
+@pytest.mark.parametrize("make_app", [_fastapi_app, App])
+def test_operations_mixed_handlers_one_thread(
+    article: models.ArticleModel, make_app: Callable
+):
+    _THREADS.clear()
+    client = TestClient(
+        make_app([ThreadArticleResourceHandler, ThreadPersonResourceHandler])
+    )
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {
+                    "op": "update",
+                    "data": {
+                        "type": "articles",
+                        "id": str(article.id),
+                        "attributes": {"title": "New title"},
+                    },
+                },
+                {"op": "remove", "ref": {"type": "people", "id": "1"}},
+            ]
+        },
+    )
+    assert response.status_code == 200
+    # Sync and async writes ran where the transaction was entered
+    assert len(_THREADS["transaction"]) == 1
+    assert _THREADS["writes"] == _THREADS["transaction"] * 2
+
+
+def test_create(db):
+    response = client.post(
+        "/articles",
+        json={
+            "data": {
+                "type": "articles",
+                "attributes": {"title": "New title", "content": "New content"},
+            }
+        },
+    )
+    assert response.status_code == 201
+    article_id = response.json()["data"]["id"]
+    assert response.headers["Location"].endswith(f"/articles/{article_id}")
+    assert response.json()["links"] == {"self": f"/articles/{article_id}"}
+    response = client.get(f"/articles/{article_id}")
+    assert response.json()["data"]["attributes"]["title"] == "New title"
+
+
+def test_create_conflict(article: models.ArticleModel):
+    response = client.post(
+        "/articles",
+        json={
+            "data": {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": "New title"},
+            }
+        },
+    )
+    assert response.status_code == 409
+    response = client.post(
+        "/articles", json={"data": {"type": "articles", "attributes": {"age": 3}}}
+    )
+    assert response.status_code == 400
+    assert response.json()["errors"][0]["source"] == {"pointer": "/attributes/age"}
+
+
+def test_create_many(db):
+    response = client.post(
+        "/articles",
+        json={
+            "data": [
+                {
+                    "type": "articles",
+                    "attributes": {"title": f"Title {i}", "content": "Content"},
+                }
+                for i in range(3)
+            ]
+        },
+    )
+    assert response.status_code == 201
+    assert "Location" not in response.headers
+    assert [item["attributes"]["title"] for item in response.json()["data"]] == [
+        "Title 0",
+        "Title 1",
+        "Title 2",
+    ]
+    response = client.get("/articles")
+    assert len(response.json()["data"]) == 3
+
+
+def test_create_many_too_many_errors(db, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(pjst_rendering, "MAX_ERRORS", 2)
+    response = client.post(
+        "/articles",
+        json={
+            "data": [{"type": "articles", "attributes": {"title": i}} for i in range(5)]
+        },
+    )
+    assert response.status_code == 400
+    errors = response.json()["errors"]
+    assert [error["source"]["pointer"] for error in errors[:2]] == [
+        "/0/attributes/title",
+        "/1/attributes/title",
+    ]
+    assert errors[2] == {
+        "status": "400",
+        "code": "too_many_errors",
+        "title": "Too many errors",
+        "detail": "3 more errors were not reported",
+    }
+
+
+def test_operations_add(db):
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {
+                    "op": "add",
+                    "data": {
+                        "type": "articles",
+                        "id": "7",
+                        "attributes": {"title": "Title", "content": "Content"},
+                    },
+                }
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["atomic:results"][0]["data"]["id"] == "7"
+    assert client.get("/articles/7").status_code == 200
+
+
+def test_timing(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    get_articles(2)
+    assert "Server-Timing" not in client.get("/articles").headers
+    measurements: list[Measurement] = []
+    monkeypatch.setattr(
+        AsyncArticleResourceHandler,
+        "TIMING",
+        Timing(callback=measurements.append, server_timing=True),
+    )
+    timed_app = FastAPI()
+    register(timed_app, AsyncArticleResourceHandler)
+    timed_client = TestClient(timed_app)
+
+    response = timed_client.get("/articles/1")
+    assert response.status_code == 200
+    assert [
+        item.partition(";")[0] for item in response.headers["Server-Timing"].split(", ")
+    ] == ["query", "handler", "serialize", "render", "total"]
+    (measurement,) = measurements
+    assert (measurement.type, measurement.method, measurement.status) == (
+        "articles",
+        "GET",
+        200,
+    )
+    assert measurement.response_bytes == len(response.content)
+
+    response = timed_client.get("/articles/404")
+    assert response.status_code == 404
+    assert measurements[-1].status == 404
+    assert "serialize" not in measurements[-1].phases
+
+
+def test_timing_streamed(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    get_articles(2)
+    measurements: list[Measurement] = []
+    monkeypatch.setattr(AsyncArticleResourceHandler, "STREAM_MANY", True)
+    monkeypatch.setattr(
+        AsyncArticleResourceHandler, "TIMING", Timing(callback=measurements.append)
+    )
+    timed_app = FastAPI()
+    register(timed_app, AsyncArticleResourceHandler)
+    response = TestClient(timed_app).get("/articles")
+    assert len(response.json()["data"]) == 2
+    (measurement,) = measurements
+    assert set(measurement.phases) == {"query", "handler", "serialize", "render"}
+    assert measurement.response_bytes == len(response.content)
+
+
+def test_registry(article: models.ArticleModel):
+    registry_app = FastAPI()
+    Registry([ArticleResourceHandler, PersonResourceHandler]).fastapi(registry_app)
+    registry_client = TestClient(registry_app)
+    response = registry_client.get(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.json()["data"]["links"] == {"self": f"/articles/{article.id}"}
+    # Documented on the first `openapi()` call, once each
+    paths = registry_client.get("/openapi.json").json()["paths"]
+    assert set(paths["/articles/{obj_id}"]) == {"get", "patch", "delete"}
+    assert "filter[title][prefix]" in {
+        item["name"] for item in paths["/articles"]["get"]["parameters"]
+    }
+    assert paths["/people/{obj_id}"]["get"]["responses"]["200"]["content"][
+        "application/json"
+    ]["schema"] == {"$ref": "#/components/schemas/peopleResponse"}
+
+
+@pytest.fixture()
+def asgi_client(db) -> TestClient:
+    return TestClient(App([ArticleResourceHandler, PersonResourceHandler]))
+
+
+def test_asgi_app(
+    get_articles: Callable[[int], list[models.ArticleModel]], asgi_client: TestClient
+):
+    articles = get_articles(2)
+    response = asgi_client.get(f"/articles/{articles[0].id}")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.api+json"
+    assert response.json() == client.get(f"/articles/{articles[0].id}").json()
+    response = asgi_client.get("/articles", params={"page[size]": 1})
+    assert response.status_code == 200
+    assert response.json() == client.get("/articles", params={"page[size]": 1}).json()
+    etag = response.headers["ETag"]
+    response = asgi_client.get(
+        "/articles", params={"page[size]": 1}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    response = asgi_client.patch(
+        f"/articles/{articles[0].id}",
+        json={
+            "data": {
+                "type": "articles",
+                "id": str(articles[0].id),
+                "attributes": {"title": "New title"},
+            }
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["data"]["attributes"]["title"] == "New title"
+    response = asgi_client.delete(f"/articles/{articles[1].id}")
+    assert response.status_code == 204
+    response = asgi_client.post(
+        "/articles",
+        json={"data": {"type": "articles", "attributes": {"title": "Created"}}},
+    )
+    assert response.status_code == 201
+    assert response.headers["Location"] == response.json()["data"]["links"]["self"]
+
+
+def test_asgi_app_relationships(
+    get_articles: Callable[[int], list[models.ArticleModel]], asgi_client: TestClient
+):
+    articles = get_articles(3)
+    author = _set_author(articles, "Author")
+    for url in (
+        f"/articles/{articles[0].id}/relationships/author",
+        f"/articles/{articles[0].id}/author",
+        f"/people/{author.id}/relationships/articles?page[size]=2",
+        f"/people/{author.id}/articles?page[size]=2",
+        f"/articles/{articles[0].id}/comments",
+    ):
+        response = asgi_client.get(url)
+        expected = client.get(url)
+        assert response.status_code == expected.status_code
+        assert response.json() == expected.json()
+    response = asgi_client.patch(f"/articles/{articles[0].id}/author")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "GET, HEAD"
+    assert asgi_client.get(f"/articles/{articles[0].id}/a/b").status_code == 404
+
+
+def test_asgi_app_head_streamed(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    asgi_client: TestClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    serialized = []
+    serialize = ArticleResourceHandler.serialize
+
+    @classmethod
+    def _serialize(cls, obj: models.ArticleModel) -> ArticleSchema:
+        serialized.append(obj.id)
+        return serialize(obj)
+
+    monkeypatch.setattr(ArticleResourceHandler, "serialize", _serialize)
+    # Streams past the early HEAD answer of `_skip_render`, like a streamed
+    # response that reaches the app
+    monkeypatch.setattr(
+        ArticleResourceHandler, "_skip_render", staticmethod(lambda *args: None)
+    )
+    get_articles(2)
+    response = asgi_client.head("/articles")
+    assert response.status_code == 200
+    assert response.content == b""
+    assert serialized == []
+    assert len(asgi_client.get("/articles").json()["data"]) == 2
+
+
+def test_asgi_app_errors(article: models.ArticleModel, asgi_client: TestClient):
+    response = asgi_client.get("/articles/404404")
+    assert response.status_code == 404
+    assert response.json() == client.get("/articles/404404").json()
+    body = {"data": {"type": "articles", "id": str(article.id), "attributes": 1}}
+    response = asgi_client.patch(f"/articles/{article.id}", json=body)
+    assert response.status_code == 400
+    assert response.json() == client.patch(f"/articles/{article.id}", json=body).json()
+    response = asgi_client.get("/unknown/1")
+    assert response.status_code == 404
+    response = asgi_client.post(f"/articles/{article.id}")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "DELETE, GET, HEAD, PATCH"
+    response = asgi_client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {"op": "remove", "ref": {"type": "articles", "id": str(article.id)}}
+            ]
+        },
+    )
+    assert response.status_code == 204
+    assert asgi_client.get(f"/articles/{article.id}").status_code == 404
+
+
+def test_asgi_app_max_body_size(article: models.ArticleModel):
+    limited_client = TestClient(
+        App([ArticleResourceHandler, PersonResourceHandler], max_body_size=64)
+    )
+    attributes = {"title": "x" * 64}
+    response = limited_client.post(
+        "/articles", json={"data": {"type": "articles", "attributes": attributes}}
+    )
+    assert response.status_code == 413
+    assert response.json()["errors"][0]["status"] == "413"
+    response = limited_client.patch(
+        f"/articles/{article.id}",
+        json={
+            "data": {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": attributes,
+            }
+        },
+    )
+    assert response.status_code == 413
+    # Only the bodies of POST and PATCH are read
+    response = limited_client.request(
+        "GET", f"/articles/{article.id}", content=b"x" * 128
+    )
+    assert response.status_code == 200
+    response = limited_client.request("POST", "/unknown", content=b"x" * 128)
+    assert response.status_code == 404
+
+
+def test_asgi_app_closes_streamed_chunks(
+    article: models.ArticleModel, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    streams = []
+    closed_on_loop = []
+
+    def _chunks() -> Iterator[bytes]:
+        try:
+            yield b'{"data":['
+            yield b"]}"
+        finally:
+            closed_on_loop.append(_loop_running())
+
+    @classmethod
+    def _postprocess_many_stream(cls, *args) -> Iterator[bytes]:
+        streams.append(_chunks())
+        return streams[-1]
+
+    monkeypatch.setattr(
+        ArticleResourceHandler, "_postprocess_many_stream", _postprocess_many_stream
+    )
+
+    async def _receive() -> dict:
+        return {"type": "http.disconnect"}
+
+    async def _send(message: dict) -> None:
+        if message.get("more_body"):
+            raise OSError("The client went away")
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/articles",
+        "query_string": b"",
+        "headers": [],
+    }
+    with pytest.raises(OSError):
+        asyncio.run(
+            App([ArticleResourceHandler, PersonResourceHandler])(scope, _receive, _send)
+        )
+    # Closed in a worker thread, while `streams` still refers to it
+    assert closed_on_loop == [False]
+
+
+class RequestByNameResourceHandler(ResourceHandler):
+    TYPE = "requests"
+
+    @classmethod
+    def get_many(cls, request) -> pjst_types.Response:
+        return pjst_types.Response(
+            data=[pjst_types.Resource(id=request.query_params["id"])]
+        )
+
+    @classmethod
+    def serialize(cls, obj: pjst_types.Resource) -> pjst_types.Resource:
+        return obj
+
+
+def test_get_many_request_by_name():
+    requests_app = FastAPI()
+    register(requests_app, RequestByNameResourceHandler)
+    response = TestClient(requests_app).get("/requests?id=1")
+    assert response.status_code == 200
+    assert response.json()["data"] == [{"type": "requests", "id": "1"}]
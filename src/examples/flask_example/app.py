@@ -2,10 +2,11 @@ from flask import Flask
 
 from pjst.flask import register
 
-from .views import ArticleResourceHandler
+from .views import ArticleResourceHandler, PersonResourceHandler
 
 
 def create_app():
     app = Flask(__name__)
     register(app, ArticleResourceHandler)
+    register(app, PersonResourceHandler)
     return app
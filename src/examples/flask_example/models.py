@@ -1,20 +1,33 @@
+import contextlib
 import datetime
 import os
+from contextvars import ContextVar
+from typing import Iterator
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+from sqlalchemy import ForeignKey, create_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
 
 
 class Base(DeclarativeBase):
     pass
 
 
+class PersonModel(Base):
+    __tablename__ = "articles_app_personmodel"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column()
+
+
 class ArticleModel(Base):
     __tablename__ = "articles_app_articlemodel"
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     title: Mapped[str] = mapped_column()
     content: Mapped[str] = mapped_column()
+    author_id: Mapped[int | None] = mapped_column(
+        ForeignKey("articles_app_personmodel.id"), default=None
+    )
     created_at: Mapped[datetime.datetime] = mapped_column(
         default=lambda: datetime.datetime.now(datetime.timezone.utc)
     )
@@ -29,3 +42,24 @@ engine = create_engine(
     if os.environ.get("TESTING", False)
     else "sqlite:///src/examples/db.sqlite3"
 )
+
+_current_session: ContextVar[Session | None] = ContextVar(
+    "current_session", default=None
+)
+
+
+@contextlib.contextmanager
+def transaction() -> Iterator[Session]:
+    """A session that is committed on exit. Nested calls (eg `edit_one` during
+    an `/operations` request) join the outermost one, so that all their changes
+    are committed or rolled back together."""
+
+    if (session := _current_session.get()) is not None:
+        yield session
+        return
+    with Session(engine, expire_on_commit=False) as session, session.begin():
+        token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
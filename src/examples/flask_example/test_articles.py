@@ -1,13 +1,27 @@
+import asyncio
+import datetime
 from typing import Callable
 
+import flask
 import pytest
 from flask import Flask
 from flask.testing import FlaskClient
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
+from werkzeug.test import Client
+
+from pjst import Registry
+from pjst import exceptions as pjst_exceptions
+from pjst import rendering as pjst_rendering
+from pjst import types as pjst_types
+from pjst.cache import ResponseCache, SQLiteBackend
+from pjst.flask import register, register_many
+from pjst.timing import Measurement, Timing
+from pjst.wsgi import App
 
 from . import models
 from .app import create_app
+from .views import ArticleResourceHandler, ArticleSchema, PersonResourceHandler
 
 
 @pytest.fixture()
@@ -332,3 +346,1083 @@ def test_get_many_with_filter(
         ],
         "links": {"self": "/articles"},
     }
+
+
+def test_edit_missing_data(article: models.ArticleModel, client: FlaskClient):
+    response = client.patch(f"/articles/{article.id}", json={"meta": {}})
+    assert response.status_code == 400
+    assert response.json == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Invalid data field",
+                "source": {"pointer": "/data"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def test_get_many_streamed(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    articles = get_articles(2)
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.headers["Content-Type"] == "application/vnd.api+json"
+    assert response.json == {
+        "data": [
+            {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": article.title, "content": article.content},
+                "links": {"self": f"/articles/{article.id}"},
+            }
+            for article in articles
+        ],
+        "links": {"self": "/articles"},
+    }
+
+
+def test_get_many_paginated(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(3)
+    response = client.get("/articles", query_string={"page[size]": "2"})
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json["data"]] == [
+        str(articles[0].id),
+        str(articles[1].id),
+    ]
+    assert response.json["links"] == {
+        "self": "/articles",
+        "next": f"/articles?page[size]=2&page[after]={articles[1].id}",
+    }
+
+    response = client.get(response.json["links"]["next"])
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json["data"]] == [str(articles[2].id)]
+    assert response.json["links"] == {
+        "self": "/articles",
+        "prev": f"/articles?page[size]=2&page[before]={articles[2].id}",
+    }
+
+    response = client.get(response.json["links"]["prev"])
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json["data"]] == [
+        str(articles[0].id),
+        str(articles[1].id),
+    ]
+
+
+def test_get_many_invalid_page_size(client: FlaskClient):
+    response = client.get("/articles", query_string={"page[size]": "1000"})
+    assert response.status_code == 400
+    assert response.json == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Page size must be an integer between 1 and 100",
+                "source": {"parameter": "page[size]"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def test_get_many_sparse_fieldset(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(2)
+    response = client.get("/articles", query_string={"fields[articles]": "title"})
+    assert response.status_code == 200
+    assert [item["attributes"] for item in response.json["data"]] == [
+        {"title": article.title} for article in articles
+    ]
+
+
+def test_get_one_sparse_fieldset(article: models.ArticleModel, client: FlaskClient):
+    response = client.get(
+        f"/articles/{article.id}", query_string={"fields[articles]": "content"}
+    )
+    assert response.status_code == 200
+    assert response.json["data"]["attributes"] == {"content": "Test content 1"}
+
+
+def test_get_many_unknown_field(client: FlaskClient):
+    response = client.get("/articles", query_string={"fields[articles]": "title,age"})
+    assert response.status_code == 400
+    assert response.json == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Unknown fields for type 'articles': age",
+                "source": {"parameter": "fields[articles]"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def _set_author(articles: list[models.ArticleModel], name: str) -> models.PersonModel:
+    with Session(models.engine) as session:
+        person = models.PersonModel(name=name)
+        session.add(person)
+        session.flush()
+        for article in articles:
+            session.get(models.ArticleModel, article.id).author_id = person.id
+        session.commit()
+        session.refresh(person)
+    return person
+
+
+def test_get_many_include(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(3)
+    author = _set_author(articles[:2], "Author")
+    response = client.get("/articles?include=author")
+    assert response.status_code == 200
+    assert [item.get("relationships") for item in response.json["data"]] == [
+        {"author": {"data": {"type": "people", "id": str(author.id)}}},
+        {"author": {"data": {"type": "people", "id": str(author.id)}}},
+        None,
+    ]
+    assert response.json["included"] == [
+        {
+            "type": "people",
+            "id": str(author.id),
+            "attributes": {"name": "Author"},
+            "links": {"self": f"/people/{author.id}"},
+        }
+    ]
+
+
+def test_get_many_streamed_include(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    articles = get_articles(2)
+    author = _set_author(articles[1:], "Author")
+    response = client.get("/articles?include=author&fields[people]=")
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.json["included"] == [
+        {
+            "type": "people",
+            "id": str(author.id),
+            "attributes": {},
+            "links": {"self": f"/people/{author.id}"},
+        }
+    ]
+
+
+def test_get_many_unknown_include(client: FlaskClient):
+    response = client.get("/articles?include=comments")
+    assert response.status_code == 400
+    assert response.json["errors"][0]["detail"] == (
+        "Unknown relationship path 'comments'"
+    )
+
+
+def test_relationship(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(2)
+    author = _set_author(articles[:1], "Author")
+    response = client.get(f"/articles/{articles[0].id}/relationships/author")
+    assert response.status_code == 200
+    assert response.json == {
+        "data": {"type": "people", "id": str(author.id)},
+        "links": {
+            "self": f"/articles/{articles[0].id}/relationships/author",
+            "related": f"/articles/{articles[0].id}/author",
+        },
+    }
+    response = client.get(f"/articles/{articles[0].id}/author")
+    assert response.status_code == 200
+    assert response.json["data"] == {
+        "type": "people",
+        "id": str(author.id),
+        "attributes": {"name": "Author"},
+        "links": {"self": f"/people/{author.id}"},
+    }
+    response = client.get(f"/articles/{articles[1].id}/relationships/author")
+    assert response.status_code == 200
+    assert response.json["data"] is None
+
+
+def test_relationship_paginated(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(3)
+    author = _set_author(articles, "Author")
+    response = client.get(
+        f"/people/{author.id}/relationships/articles", query_string={"page[size]": 2}
+    )
+    assert response.status_code == 200
+    assert response.json["data"] == [
+        {"type": "articles", "id": str(article.id)} for article in articles[:2]
+    ]
+    response = client.get(response.json["links"]["next"])
+    assert response.json["data"] == [{"type": "articles", "id": str(articles[2].id)}]
+    assert "next" not in response.json["links"]
+    response = client.get(f"/people/{author.id}/articles?page[size]=2")
+    assert [item["attributes"]["title"] for item in response.json["data"]] == [
+        article.title for article in articles[:2]
+    ]
+
+
+def test_relationship_not_found(article: models.ArticleModel, client: FlaskClient):
+    response = client.get(f"/articles/{article.id}/relationships/comments")
+    assert response.status_code == 404
+    assert response.json["errors"][0]["detail"] == (
+        "'articles' has no relationship 'comments'"
+    )
+    response = client.get("/articles/404404/author")
+    assert response.status_code == 404
+
+
+def test_get_many_serialize_many(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    batches = []
+
+    def serialize_many(cls, objs):
+        batches.append(len(objs))
+        return [cls.serialize(obj) for obj in objs]
+
+    monkeypatch.setattr(
+        ArticleResourceHandler, "serialize_many", classmethod(serialize_many)
+    )
+    articles = get_articles(3)
+    response = client.get("/articles")
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json["data"]] == [
+        str(article.id) for article in articles
+    ]
+    assert batches == [3]
+
+
+def test_get_one_etag(article: models.ArticleModel, client: FlaskClient):
+    response = client.get(f"/articles/{article.id}")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert etag.startswith('W/"')
+    response = client.get(f"/articles/{article.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    # The representation changes with the query
+    response = client.get(
+        f"/articles/{article.id}?fields[articles]=title",
+        headers={"If-None-Match": etag},
+    )
+    assert response.status_code == 200
+
+
+def test_get_many_etag(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    get_articles(2)
+    response = client.get("/articles")
+    etag = response.headers["ETag"]
+    assert not etag.startswith("W/")
+    response = client.get("/articles", headers={"If-None-Match": f'"x", {etag}'})
+    assert response.status_code == 304
+    get_articles(1)
+    response = client.get("/articles", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert len(response.json["data"]) == 3
+
+
+def test_head(article: models.ArticleModel, client: FlaskClient):
+    response = client.head(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.data == b""
+    assert (
+        response.headers["ETag"]
+        == client.get(f"/articles/{article.id}").headers["ETag"]
+    )
+    response = client.head("/articles")
+    assert response.status_code == 200
+    assert response.data == b""
+
+
+def _rename(article_id: int, title: str) -> None:
+    with Session(models.engine) as session:
+        session.get(models.ArticleModel, article_id).title = title
+        session.commit()
+
+
+def test_cache(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    cache = ResponseCache(ttl=60)
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", cache)
+    article, other = get_articles(2)
+    assert client.get(f"/articles/{article.id}").status_code == 200
+    assert client.get("/articles").status_code == 200
+    _rename(article.id, "Changed behind the cache's back")
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Test title 1"
+    assert client.get("/articles").json["data"][0]["attributes"]["title"] == (
+        "Test title 1"
+    )
+    assert (cache.stats.hits, cache.stats.misses) == (2, 2)
+    # 304s are answered from the cache too
+    response = client.get(
+        f"/articles/{article.id}", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+
+    client.patch(
+        f"/articles/{other.id}",
+        json={
+            "data": {
+                "type": "articles",
+                "id": str(other.id),
+                "attributes": {"title": "New title"},
+            }
+        },
+    )
+    # The article's own entries survive, the collection's don't
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Test title 1"
+    assert client.get("/articles").json["data"][0]["attributes"]["title"] == (
+        "Changed behind the cache's back"
+    )
+
+
+def test_cache_create_without_content(
+    article: models.ArticleModel,
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", ResponseCache(ttl=60))
+    create_one = ArticleResourceHandler.create_one
+
+    @classmethod
+    def _create_one(cls, obj: ArticleSchema) -> None:
+        create_one(obj)
+
+    monkeypatch.setattr(ArticleResourceHandler, "create_one", _create_one)
+    assert len(client.get("/articles").json["data"]) == 1
+    response = client.post(
+        "/articles", json={"data": {"type": "articles", "attributes": {}}}
+    )
+    assert response.status_code == 204
+    assert len(client.get("/articles").json["data"]) == 2
+
+
+def test_cache_vary(
+    article: models.ArticleModel,
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    cache = ResponseCache(
+        ttl=60, vary=lambda request: request.headers.get("X-User", "")
+    )
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", cache)
+    get_one = ArticleResourceHandler.get_one
+
+    @classmethod
+    def _get_one(cls, obj_id: str) -> pjst_types.Response:
+        if flask.request.headers.get("X-User") != "owner":
+            raise pjst_exceptions.NotFound("Article not found")
+        return get_one(obj_id)
+
+    monkeypatch.setattr(ArticleResourceHandler, "get_one", _get_one)
+    owner, other = {"X-User": "owner"}, {"X-User": "other"}
+    assert client.get(f"/articles/{article.id}", headers=owner).status_code == 200
+    # The owner's cached document isn't served to someone else
+    assert client.get(f"/articles/{article.id}", headers=other).status_code == 404
+    assert client.get(f"/articles/{article.id}", headers=owner).status_code == 200
+    assert (cache.stats.hits, cache.stats.misses) == (1, 2)
+
+    # Invalidation drops the entries of every `vary`
+    response = client.patch(
+        f"/articles/{article.id}",
+        json={
+            "data": {
+                "type": "articles",
+                "id": str(article.id),
+                "attributes": {"title": "New title"},
+            }
+        },
+    )
+    assert response.status_code == 200
+    response = client.get(f"/articles/{article.id}", headers=owner)
+    assert response.json["data"]["attributes"]["title"] == "New title"
+    assert (cache.stats.hits, cache.stats.misses) == (1, 3)
+
+
+def test_cache_skips_store_after_invalidation(
+    article: models.ArticleModel,
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    cache = ResponseCache(ttl=60)
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", cache)
+    get_one = ArticleResourceHandler.get_one
+
+    @classmethod
+    def _get_one(cls, obj_id: str) -> pjst_types.Response:
+        response = get_one(obj_id)
+        # A PATCH commits and invalidates while this GET is still rendering
+        _rename(article.id, "Changed")
+        cls._invalidate(obj_id)
+        return response
+
+    monkeypatch.setattr(ArticleResourceHandler, "get_one", _get_one)
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Test title 1"
+    monkeypatch.setattr(ArticleResourceHandler, "get_one", get_one)
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Changed"
+    assert cache.stats.hits == 0
+
+
+def test_cache_sqlite_backend(
+    article: models.ArticleModel,
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+    tmp_path,
+):
+    path = str(tmp_path / "cache.sqlite3")
+    backend = SQLiteBackend(path, max_entries=1)
+    monkeypatch.setattr(
+        ArticleResourceHandler, "CACHE", ResponseCache(60, backend=backend)
+    )
+    assert client.get(f"/articles/{article.id}").status_code == 200
+    backend.close()
+    _rename(article.id, "Changed")
+
+    # Another worker using the same file
+    other_backend = SQLiteBackend(path, max_entries=1)
+    other_worker = ResponseCache(ttl=60, backend=other_backend)
+    monkeypatch.setattr(ArticleResourceHandler, "CACHE", other_worker)
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Test title 1"
+    assert other_worker.stats.hits == 1
+
+    assert client.get("/articles").status_code == 200
+    assert other_worker.stats.evictions == 1
+    client.delete(f"/articles/{article.id}")
+    assert client.get(f"/articles/{article.id}").status_code == 404
+    other_backend.close()
+
+
+def test_links_honor_script_root(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(2)
+    response = client.get("/articles", base_url="http://localhost/app/")
+    assert [item["links"] for item in response.json["data"]] == [
+        {"self": f"/app/articles/{article.id}"} for article in articles
+    ]
+
+
+def test_get_many_sorted(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(3)
+    _rename(articles[0].id, "Test title 2")
+    response = client.get(
+        "/articles", query_string={"sort": "-title,created_at", "page[size]": "2"}
+    )
+    assert response.status_code == 200
+    assert [item["id"] for item in response.json["data"]] == [
+        str(articles[2].id),
+        str(articles[0].id),
+    ]
+    assert response.json["links"] == {"self": "/articles"}
+
+
+def test_get_many_unknown_sort_field(client: FlaskClient):
+    response = client.get("/articles", query_string={"sort": "-content,age"})
+    assert response.status_code == 400
+    assert response.json == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Unknown sort fields for type 'articles': content, age",
+                "source": {"parameter": "sort"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+
+def test_get_many_filter_operators(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(3)
+    with Session(models.engine) as session:
+        for month, article in enumerate(articles, start=1):
+            session.get(models.ArticleModel, article.id).created_at = datetime.datetime(
+                2024, month, 1
+            )
+        session.commit()
+
+    def ids(query_string: dict[str, str]) -> list[str]:
+        response = client.get("/articles", query_string=query_string)
+        assert response.status_code == 200
+        return [item["id"] for item in response.json["data"]]
+
+    assert ids(
+        {
+            "filter[created_at][gte]": "2024-02-01T00:00:00",
+            "filter[created_at][lt]": "2024-03-01T00:00:00",
+        }
+    ) == [str(articles[1].id)]
+    assert ids({"filter[title][in]": "Test title 1,Test title 3"}) == [
+        str(articles[0].id),
+        str(articles[2].id),
+    ]
+    assert ids({"filter[title][prefix]": "Test title"}) == [
+        str(article.id) for article in articles
+    ]
+    assert ids({"filter[title][eq]": "Test title 2"}) == [str(articles[1].id)]
+
+
+def test_get_many_invalid_filter(client: FlaskClient):
+    response = client.get("/articles", query_string={"filter[created_at][gte]": "x"})
+    assert response.status_code == 400
+    assert response.json == {
+        "errors": [
+            {
+                "code": "bad_request",
+                "detail": "Invalid value for 'filter[created_at][gte]'",
+                "source": {"parameter": "filter[created_at][gte]"},
+                "status": "400",
+                "title": "Bad request",
+            }
+        ],
+    }
+
+    response = client.get("/articles", query_string={"filter[title][gt]": "x"})
+    assert response.status_code == 400
+    assert response.json["errors"][0]["detail"] == (
+        "Unsupported filter 'filter[title][gt]' for type 'articles'"
+    )
+
+
+def _update(article_id: int, title: str) -> dict:
+    return {
+        "op": "update",
+        "data": {
+            "type": "articles",
+            "id": str(article_id),
+            "attributes": {"title": title},
+        },
+    }
+
+
+def _remove(article_id: int | str) -> dict:
+    return {"op": "remove", "ref": {"type": "articles", "id": str(article_id)}}
+
+
+def test_operations(
+    get_articles: Callable[[int], list[models.ArticleModel]], client: FlaskClient
+):
+    articles = get_articles(3)
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                _update(articles[0].id, "New title"),
+                _remove(articles[1].id),
+                _remove(articles[2].id),
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == (
+        'application/vnd.api+json; ext="https://jsonapi.org/ext/atomic"'
+    )
+    assert response.json == {
+        "atomic:results": [
+            {
+                "data": {
+                    "type": "articles",
+                    "id": str(articles[0].id),
+                    "attributes": {"title": "New title", "content": "Test content 1"},
+                    "links": {"self": f"/articles/{articles[0].id}"},
+                }
+            },
+            {},
+            {},
+        ]
+    }
+    with Session(models.engine) as session:
+        assert list(session.scalars(select(models.ArticleModel.title))) == ["New title"]
+
+
+def test_operations_validated_up_front(
+    article: models.ArticleModel, client: FlaskClient
+):
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                _update(article.id, "New title"),
+                {"op": "remove", "ref": {"type": "comments", "id": "1"}},
+                {
+                    "op": "update",
+                    "data": {
+                        "type": "articles",
+                        "id": str(article.id),
+                        "attributes": {"age": 3},
+                    },
+                },
+                {"op": "remove", "ref": {"type": "articles"}},
+            ]
+        },
+    )
+    assert response.status_code == 400
+    assert [error["source"] for error in response.json["errors"]] == [
+        {"pointer": "/atomic:operations/1"},
+        {"pointer": "/atomic:operations/3"},
+        {"pointer": "/atomic:operations/2/data/attributes/age"},
+    ]
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Test title 1"
+
+
+def test_operations_roll_back(article: models.ArticleModel, client: FlaskClient):
+    response = client.post(
+        "/operations",
+        json={"atomic:operations": [_update(article.id, "New title"), _remove(404)]},
+    )
+    assert response.status_code == 404
+    response = client.get(f"/articles/{article.id}")
+    assert response.json["data"]["attributes"]["title"] == "Test title 1"
+
+
+def test_create(client: FlaskClient):
+    response = client.post(
+        "/articles",
+        json={
+            "data": {
+                "type": "articles",
+                "attributes": {"title": "New title", "content": "New content"},
+            }
+        },
+    )
+    assert response.status_code == 201
+    article_id = response.json["data"]["id"]
+    assert response.headers["Location"].endswith(f"/articles/{article_id}")
+    assert response.json["data"]["attributes"] == {
+        "title": "New title",
+        "content": "New content",
+    }
+    assert response.json["links"] == {"self": f"/articles/{article_id}"}
+    response = client.get(f"/articles/{article_id}")
+    assert response.json["data"]["attributes"]["title"] == "New title"
+
+
+def test_create_client_id(article: models.ArticleModel, client: FlaskClient):
+    body = {
+        "data": {
+            "type": "articles",
+            "id": "42",
+            "attributes": {"title": "New title", "content": "New content"},
+        }
+    }
+    response = client.post("/articles", json=body)
+    assert response.status_code == 201
+    assert response.json["data"]["id"] == "42"
+    body["data"]["id"] = str(article.id)
+    response = client.post("/articles", json=body)
+    assert response.status_code == 409
+
+
+def test_create_many(article: models.ArticleModel, client: FlaskClient):
+    response = client.post(
+        "/articles",
+        json={
+            "data": [
+                {
+                    "type": "articles",
+                    "attributes": {"title": f"Title {i}", "content": "Content"},
+                }
+                for i in range(3)
+            ]
+        },
+    )
+    assert response.status_code == 201
+    assert "Location" not in response.headers
+    assert [item["attributes"]["title"] for item in response.json["data"]] == [
+        "Title 0",
+        "Title 1",
+        "Title 2",
+    ]
+    with Session(models.engine) as session:
+        assert session.scalar(select(func.count(models.ArticleModel.id))) == 4
+
+
+def test_create_validation_error(client: FlaskClient):
+    response = client.post(
+        "/articles",
+        json={"data": {"type": "articles", "attributes": {"age": 3}}},
+    )
+    assert response.status_code == 400
+    assert response.json["errors"][0]["source"] == {"pointer": "/attributes/age"}
+    response = client.post(
+        "/articles", json={"data": {"type": "articles", "id": "abc"}}
+    )
+    assert response.status_code == 400
+    assert response.json["errors"][0]["source"] == {"pointer": "/data/id"}
+
+
+def test_create_type_conflict(client: FlaskClient):
+    response = client.post(
+        "/articles", json={"data": {"type": "people", "attributes": {}}}
+    )
+    assert response.status_code == 409
+    assert response.json["errors"] == [
+        {
+            "status": "409",
+            "code": "conflict",
+            "title": "Conflict",
+            "detail": "Type in body (people) does not match type 'articles'",
+            "source": {"pointer": "/data/type"},
+        }
+    ]
+    response = client.post(
+        "/articles",
+        json={
+            "data": [
+                {"type": "articles", "attributes": {}},
+                {"type": "people", "attributes": {}},
+            ]
+        },
+    )
+    assert response.status_code == 409
+    assert response.json["errors"][0]["source"] == {"pointer": "/data/1/type"}
+    with Session(models.engine) as session:
+        assert session.scalar(select(func.count(models.ArticleModel.id))) == 0
+
+
+def test_create_many_too_many_errors(
+    client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(pjst_rendering, "MAX_ERRORS", 2)
+    response = client.post(
+        "/articles",
+        json={
+            "data": [{"type": "articles", "attributes": {"title": i}} for i in range(5)]
+        },
+    )
+    assert response.status_code == 400
+    errors = response.json["errors"]
+    assert [error["source"]["pointer"] for error in errors[:2]] == [
+        "/0/attributes/title",
+        "/1/attributes/title",
+    ]
+    assert errors[2] == {
+        "status": "400",
+        "code": "too_many_errors",
+        "title": "Too many errors",
+        "detail": "3 more errors were not reported",
+    }
+
+
+def test_operations_add(client: FlaskClient):
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {
+                    "op": "add",
+                    "data": {
+                        "type": "articles",
+                        "attributes": {"title": f"Title {i}", "content": "Content"},
+                    },
+                }
+                for i in range(2)
+            ]
+        },
+    )
+    assert response.status_code == 200
+    results = response.json["atomic:results"]
+    assert [result["data"]["attributes"]["title"] for result in results] == [
+        "Title 0",
+        "Title 1",
+    ]
+    response = client.get(f"/articles/{results[1]['data']['id']}")
+    assert response.status_code == 200
+
+
+class LoopArticleResourceHandler(ArticleResourceHandler):
+    loops: list[asyncio.AbstractEventLoop] = []
+
+    @classmethod
+    async def edit_one(cls, obj: ArticleSchema) -> pjst_types.Response:
+        cls.loops.append(asyncio.get_running_loop())
+        return super().edit_one(obj)
+
+
+def test_operations_one_event_loop(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+):
+    loop_app = Flask(__name__)
+    register(loop_app, LoopArticleResourceHandler)
+    articles = get_articles(2)
+    response = loop_app.test_client().post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                _update(article.id, f"New title {article.id}") for article in articles
+            ]
+        },
+    )
+    assert response.status_code == 200
+    assert len(LoopArticleResourceHandler.loops) == 2
+    assert len(set(LoopArticleResourceHandler.loops)) == 1
+
+
+def test_operations_batch_result_mismatch(
+    client: FlaskClient, monkeypatch: pytest.MonkeyPatch
+):
+    monkeypatch.setattr(
+        ArticleResourceHandler, "create_many", classmethod(lambda cls, objs: None)
+    )
+    response = client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {"op": "add", "data": {"type": "articles", "attributes": {}}}
+                for _ in range(2)
+            ]
+        },
+    )
+    assert response.status_code == 500
+    assert response.json["errors"][0]["detail"] == (
+        "ArticleResourceHandler.create_many did not return one result for each "
+        "of the 2 objects"
+    )
+
+
+def test_timing(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    get_articles(2)
+    assert "Server-Timing" not in client.get("/articles").headers
+    measurements: list[Measurement] = []
+    monkeypatch.setattr(
+        ArticleResourceHandler,
+        "TIMING",
+        Timing(callback=measurements.append, server_timing=True),
+    )
+    client = create_app().test_client()
+
+    response = client.get("/articles", query_string={"filter[title]": "Test title 1"})
+    assert response.status_code == 200
+    assert [
+        item.partition(";")[0] for item in response.headers["Server-Timing"].split(", ")
+    ] == ["query", "handler", "serialize", "render", "total"]
+    (measurement,) = measurements
+    assert (measurement.type, measurement.method, measurement.status) == (
+        "articles",
+        "GET",
+        200,
+    )
+    assert measurement.response_bytes == len(response.data)
+    assert sum(measurement.phases.values()) <= measurement.total
+
+    response = client.patch(
+        "/articles/1", json={"data": {"type": "articles", "id": "1", "attributes": 1}}
+    )
+    assert response.status_code == 400
+    assert set(measurements[-1].phases) == {"query", "body", "render"}
+    assert measurements[-1].status == 400
+
+
+def test_timing_streamed(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    get_articles(2)
+    measurements: list[Measurement] = []
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    monkeypatch.setattr(
+        ArticleResourceHandler, "TIMING", Timing(callback=measurements.append)
+    )
+    response = create_app().test_client().get("/articles")
+    assert "Server-Timing" not in response.headers
+    assert len(response.json["data"]) == 2
+    (measurement,) = measurements
+    assert set(measurement.phases) == {"query", "handler", "serialize", "render"}
+    assert measurement.response_bytes == len(response.data)
+
+
+def test_registry(article: models.ArticleModel):
+    registry_app = Flask(__name__)
+    Registry([ArticleResourceHandler, PersonResourceHandler]).flask(registry_app)
+    client = registry_app.test_client()
+    response = client.get(f"/articles/{article.id}")
+    assert response.status_code == 200
+    assert response.json["data"]["links"] == {"self": f"/articles/{article.id}"}
+    # The body models are built on the first request that needs them
+    response = client.patch(
+        f"/articles/{article.id}",
+        json={"data": {"type": "articles", "id": str(article.id), "attributes": 1}},
+    )
+    assert response.status_code == 400
+    response = client.post(
+        "/operations",
+        json={"atomic:operations": [{"op": "remove", "ref": {"type": "people"}}]},
+    )
+    assert response.status_code == 400
+
+
+class CopiedArticleResourceHandler(ArticleResourceHandler):
+    pass
+
+
+def test_duplicate_type():
+    with pytest.raises(ValueError, match="have the same TYPE 'articles'"):
+        register_many(
+            Flask(__name__), [ArticleResourceHandler, CopiedArticleResourceHandler]
+        )
+    with pytest.raises(ValueError, match="have the same TYPE 'articles'"):
+        App([ArticleResourceHandler, CopiedArticleResourceHandler])
+
+
+def test_relation_takes_class():
+    with pytest.raises(TypeError):
+        pjst_types.Relation("people")  # type: ignore[arg-type]
+
+
+@pytest.fixture()
+def wsgi_client(app: Flask) -> Client:
+    return Client(App([ArticleResourceHandler, PersonResourceHandler]))
+
+
+def test_wsgi_app(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    wsgi_client: Client,
+):
+    articles = get_articles(2)
+    response = wsgi_client.get(f"/articles/{articles[0].id}")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.api+json"
+    assert response.json == client.get(f"/articles/{articles[0].id}").json
+    query = {"page[size]": 1, "sort": "-title"}
+    response = wsgi_client.get("/articles", query_string=query)
+    assert response.status_code == 200
+    assert response.json == client.get("/articles", query_string=query).json
+    response = wsgi_client.get(
+        "/articles",
+        query_string=query,
+        headers={"If-None-Match": response.headers["ETag"]},
+    )
+    assert response.status_code == 304
+    response = wsgi_client.head(f"/articles/{articles[0].id}")
+    assert response.status_code == 200
+    assert response.data == b""
+    body = {
+        "data": {
+            "type": "articles",
+            "id": str(articles[0].id),
+            "attributes": {"title": "New title"},
+        }
+    }
+    response = wsgi_client.patch(f"/articles/{articles[0].id}", json=body)
+    assert response.status_code == 200
+    assert response.json == client.patch(f"/articles/{articles[0].id}", json=body).json
+    response = wsgi_client.delete(f"/articles/{articles[1].id}")
+    assert response.status_code == 204
+    response = wsgi_client.post(
+        "/articles",
+        json={"data": {"type": "articles", "attributes": {"title": "Created"}}},
+    )
+    assert response.status_code == 201
+    assert response.headers["Location"] == response.json["data"]["links"]["self"]
+
+
+def test_wsgi_app_errors(
+    article: models.ArticleModel, client: FlaskClient, wsgi_client: Client
+):
+    response = wsgi_client.get("/articles/404404")
+    assert response.status_code == 404
+    assert response.json == client.get("/articles/404404").json
+    body = {"data": {"type": "articles", "id": str(article.id), "attributes": 1}}
+    response = wsgi_client.patch(f"/articles/{article.id}", json=body)
+    assert response.status_code == 400
+    assert response.json == client.patch(f"/articles/{article.id}", json=body).json
+    response = wsgi_client.get("/unknown/1")
+    assert response.status_code == 404
+    assert response.headers["Content-Type"] == "application/vnd.api+json"
+    response = wsgi_client.post(f"/articles/{article.id}")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "DELETE, GET, HEAD, PATCH"
+    response = wsgi_client.post(
+        "/operations",
+        json={
+            "atomic:operations": [
+                {"op": "remove", "ref": {"type": "articles", "id": str(article.id)}}
+            ]
+        },
+    )
+    assert response.status_code == 204
+    assert wsgi_client.get(f"/articles/{article.id}").status_code == 404
+
+
+def test_wsgi_app_relationships(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    wsgi_client: Client,
+):
+    articles = get_articles(3)
+    author = _set_author(articles, "Author")
+    for url in (
+        f"/articles/{articles[0].id}/relationships/author",
+        f"/articles/{articles[0].id}/author",
+        f"/people/{author.id}/relationships/articles?page[size]=2",
+        f"/people/{author.id}/articles?page[size]=2",
+        f"/articles/{articles[0].id}/comments",
+    ):
+        response = wsgi_client.get(url)
+        expected = client.get(url)
+        assert response.status_code == expected.status_code
+        assert response.json == expected.json
+    response = wsgi_client.patch(f"/articles/{articles[0].id}/author")
+    assert response.status_code == 405
+    assert response.headers["Allow"] == "GET, HEAD"
+    assert wsgi_client.get(f"/articles/{articles[0].id}/a/b").status_code == 404
+
+
+def test_wsgi_app_streamed(
+    get_articles: Callable[[int], list[models.ArticleModel]],
+    client: FlaskClient,
+    wsgi_client: Client,
+    monkeypatch: pytest.MonkeyPatch,
+):
+    monkeypatch.setattr(ArticleResourceHandler, "STREAM_MANY", True)
+    monkeypatch.setattr(ArticleResourceHandler, "TIMING", Timing(server_timing=True))
+    get_articles(3)
+    response = wsgi_client.get("/articles", query_string={"page[size]": 2})
+    assert response.status_code == 200
+    assert "Content-Length" not in response.headers
+    assert "handler;dur=" in response.headers["Server-Timing"]
+    assert response.json == client.get("/articles?page[size]=2").json
@@ -1,9 +1,11 @@
-from typing import Annotated
+import datetime
+import operator
+from typing import Annotated, Any
 
 import pydantic
-from sqlalchemy import select
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, insert, inspect, select
+from sqlalchemy.exc import IntegrityError, NoResultFound
+from sqlalchemy.orm import Session, load_only
 
 from pjst import exceptions as pjst_exceptions
 from pjst import types as pjst_types
@@ -11,6 +13,44 @@ from pjst.resource_handler import ResourceHandler
 
 from . import models
 
+_COMPARISONS = {
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+
+def _predicates(column: Any, conditions: pjst_types.Conditions) -> list[Any]:
+    predicates = []
+    if conditions.eq is not None:
+        predicates.append(column == conditions.eq)
+    if conditions.in_ is not None:
+        predicates.append(column.in_(conditions.in_))
+    if conditions.prefix is not None:
+        predicates.append(column.startswith(conditions.prefix, autoescape=True))
+    for name, compare in _COMPARISONS.items():
+        if (value := getattr(conditions, name)) is not None:
+            predicates.append(compare(column, value))
+    return predicates
+
+
+def _new_article(obj: "ArticleSchema") -> dict[str, Any]:
+    """Column values for a new article; clients may choose its ID"""
+
+    values: dict[str, Any] = {
+        "title": obj.attributes.title,
+        "content": obj.attributes.content,
+    }
+    if "id" in obj.model_fields_set:
+        try:
+            values["id"] = int(obj.id)
+        except ValueError:
+            raise pjst_exceptions.BadRequest(
+                "Article IDs are integers", source={"pointer": "/data/id"}
+            )
+    return values
+
 
 class ArticleSchema(pjst_types.Resource):
     class Attributes(pydantic.BaseModel):
@@ -27,8 +67,85 @@ class ArticleSchema(pjst_types.Resource):
     )
 
 
+class PersonSchema(pjst_types.Resource):
+    class Attributes(pydantic.BaseModel):
+        name: str = pydantic.Field(default="", examples=["Name"])
+
+    type: str = pydantic.Field(default="people")
+    id: str = pydantic.Field(default="1", examples=["1"])
+    attributes: Attributes = pydantic.Field(default_factory=Attributes)
+
+
+class PersonResourceHandler(ResourceHandler):
+    TYPE = "people"
+
+    @classmethod
+    def get_one(cls, obj_id: str) -> pjst_types.Response:
+        with Session(models.engine) as session:
+            person = session.get(models.PersonModel, obj_id)
+        if person is None:
+            raise pjst_exceptions.NotFound("Person not found")
+        return pjst_types.Response(data=person)
+
+    @classmethod
+    def load_many(cls, ids: list[str]) -> list[models.PersonModel]:
+        with Session(models.engine) as session:
+            return list(
+                session.scalars(
+                    select(models.PersonModel).where(models.PersonModel.id.in_(ids))
+                )
+            )
+
+    @classmethod
+    def get_relationship(
+        cls, obj_id: str, name: str, page: pjst_types.Cursor | None
+    ) -> pjst_types.Response:
+        # Only `articles`, the IDs of the person's articles by ID
+        query = select(models.ArticleModel.id).where(
+            models.ArticleModel.author_id == obj_id
+        )
+        try:
+            if page.before is not None:
+                query = query.where(models.ArticleModel.id < int(page.before))
+                query = query.order_by(models.ArticleModel.id.desc())
+            else:
+                if page.after is not None:
+                    query = query.where(models.ArticleModel.id > int(page.after))
+                query = query.order_by(models.ArticleModel.id)
+        except ValueError:
+            raise pjst_exceptions.BadRequest(
+                "Invalid page cursor", source={"parameter": "page"}
+            )
+        with Session(models.engine) as session:
+            if session.get(models.PersonModel, obj_id) is None:
+                raise pjst_exceptions.NotFound("Person not found")
+            ids = [str(id) for id in session.scalars(query.limit(page.size + 1))]
+        has_more = len(ids) > page.size
+        ids = ids[: page.size]
+        if page.before is not None:
+            ids.reverse()
+        has_next, has_prev = (
+            (True, has_more)
+            if page.before is not None
+            else (has_more, bool(page.after))
+        )
+        return pjst_types.Response(
+            data=ids,
+            next_cursor=ids[-1] if ids and has_next else None,
+            prev_cursor=ids[0] if ids and has_prev else None,
+        )
+
+    @classmethod
+    def serialize(cls, obj: models.PersonModel) -> PersonSchema:
+        return PersonSchema(
+            id=str(obj.id), attributes=PersonSchema.Attributes(name=obj.name)
+        )
+
+
 class ArticleResourceHandler(ResourceHandler):
     TYPE = "articles"
+    RELATIONSHIPS = {"author": pjst_types.Relation(PersonResourceHandler)}
+    TRANSACTION = models.transaction
 
     @classmethod
     def get_one(cls, obj_id: str) -> pjst_types.Response:
@@ -37,10 +154,67 @@ class ArticleResourceHandler(ResourceHandler):
                 article = session.scalars(
                     select(models.ArticleModel).where(models.ArticleModel.id == obj_id)
                 ).one()
-            return pjst_types.Response(data=article)
+            return pjst_types.Response(data=article, version=article.updated_at)
         except NoResultFound:
             raise pjst_exceptions.NotFound("Article not found")
 
+    @classmethod
+    def load_many(cls, ids: list[str]) -> list[models.ArticleModel]:
+        with Session(models.engine) as session:
+            return list(
+                session.scalars(
+                    select(models.ArticleModel).where(models.ArticleModel.id.in_(ids))
+                )
+            )
+
+    @classmethod
+    def get_relationship(
+        cls, obj_id: str, name: str, page: pjst_types.Cursor | None
+    ) -> pjst_types.Response:
+        # Only `author`, straight from the foreign key
+        with Session(models.engine) as session:
+            author_id = session.scalars(
+                select(models.ArticleModel.author_id).where(
+                    models.ArticleModel.id == obj_id
+                )
+            ).one_or_none()
+            if author_id is None and session.get(models.ArticleModel, obj_id) is None:
+                raise pjst_exceptions.NotFound("Article not found")
+        return pjst_types.Response(
+            data=str(author_id) if author_id is not None else None
+        )
+
+    @classmethod
+    def create_one(cls, obj: ArticleSchema) -> pjst_types.Response:
+        with models.transaction() as session:
+            article = models.ArticleModel(**_new_article(obj))
+            session.add(article)
+            try:
+                session.flush()
+            except IntegrityError:
+                raise pjst_exceptions.Conflict(
+                    f"Article with id '{obj.id}' already exists"
+                )
+            session.refresh(article)
+        return pjst_types.Response(data=article)
+
+    @classmethod
+    def create_many(cls, objs: list[ArticleSchema]) -> pjst_types.Response:
+        # One INSERT for all of them instead of one per article
+        with models.transaction() as session:
+            try:
+                articles = list(
+                    session.scalars(
+                        insert(models.ArticleModel).returning(
+                            models.ArticleModel, sort_by_parameter_order=True
+                        ),
+                        [_new_article(obj) for obj in objs],
+                    )
+                )
+            except IntegrityError:
+                raise pjst_exceptions.Conflict("Some of the articles already exist")
+        return pjst_types.Response(data=articles)
+
     @classmethod
     def edit_one(cls, obj: ArticleSchema) -> pjst_types.Response:
         if not obj.attributes.model_fields_set:
@@ -48,7 +222,7 @@ class ArticleResourceHandler(ResourceHandler):
                 "At least one attribute must be set",
                 source={"pointer": "/data/attributes"},
             )
-        with Session(models.engine) as session:
+        with models.transaction() as session:
             try:
                 article = session.scalars(
                     select(models.ArticleModel).where(models.ArticleModel.id == obj.id)
@@ -59,13 +233,13 @@ class ArticleResourceHandler(ResourceHandler):
                 article.title = obj.attributes.title
             if "content" in obj.attributes.model_fields_set:
                 article.content = obj.attributes.content
-            session.commit()
+            session.flush()
             session.refresh(article)
         return pjst_types.Response(data=article)
 
     @classmethod
     def delete_one(cls, obj_id: str) -> None:
-        with Session(models.engine) as session:
+        with models.transaction() as session:
             try:
                 article = session.scalars(
                     select(models.ArticleModel).where(models.ArticleModel.id == obj_id)
@@ -73,26 +247,121 @@ class ArticleResourceHandler(ResourceHandler):
             except NoResultFound:
                 raise pjst_exceptions.NotFound(f"Article with id '{obj_id}' not found")
             session.delete(article)
-            session.commit()
+
+    @classmethod
+    def delete_many(cls, obj_ids: list[str]) -> None:
+        # One statement for a whole run of `remove` operations
+        with models.transaction() as session:
+            result = session.execute(
+                delete(models.ArticleModel).where(models.ArticleModel.id.in_(obj_ids))
+            )
+            if result.rowcount != len(set(obj_ids)):
+                raise pjst_exceptions.NotFound("Some of the articles were not found")
 
     @classmethod
     def get_many(
         cls,
-        title: Annotated[str | None, pjst_types.Filter()] = None,
+        page: Annotated[pjst_types.Cursor, pjst_types.Page(max_size=100)],
+        title: Annotated[
+            pjst_types.Conditions[str] | None,
+            pjst_types.Filter(operators=("eq", "in", "prefix")),
+        ] = None,
+        created_at: Annotated[
+            pjst_types.Conditions[datetime.datetime] | None,
+            pjst_types.Filter(operators=("gt", "gte", "lt", "lte")),
+        ] = None,
+        fields: Annotated[frozenset[str] | None, pjst_types.Fields()] = None,
+        sort: Annotated[
+            list[pjst_types.SortField] | None, pjst_types.Sort("title", "created_at")
+        ] = None,
     ) -> pjst_types.Response:
+        if sort and (page.after is not None or page.before is not None):
+            # The cursors are article IDs, so they only work with the default
+            # order
+            raise pjst_exceptions.BadRequest(
+                "Page cursors can't be combined with 'sort'",
+                source={"parameter": "sort"},
+            )
+        query = select(models.ArticleModel)
+        if fields is not None:
+            query = query.options(
+                load_only(
+                    models.ArticleModel.id,
+                    models.ArticleModel.author_id,
+                    *(getattr(models.ArticleModel, field) for field in fields),
+                )
+            )
+        if title is not None:
+            query = query.where(*_predicates(models.ArticleModel.title, title))
+        if created_at is not None:
+            query = query.where(
+                *_predicates(models.ArticleModel.created_at, created_at)
+            )
+        try:
+            if page.before is not None:
+                query = query.where(models.ArticleModel.id < int(page.before))
+                query = query.order_by(models.ArticleModel.id.desc())
+            else:
+                if page.after is not None:
+                    query = query.where(models.ArticleModel.id > int(page.after))
+                query = query.order_by(
+                    *(
+                        getattr(models.ArticleModel, item.field).desc()
+                        if item.descending
+                        else getattr(models.ArticleModel, item.field)
+                        for item in sort or ()
+                    ),
+                    models.ArticleModel.id,
+                )
+        except ValueError:
+            raise pjst_exceptions.BadRequest(
+                "Invalid page cursor", source={"parameter": "page"}
+            )
         with Session(models.engine) as session:
-            try:
-                query = select(models.ArticleModel)
-                if title is not None:
-                    query = query.where(models.ArticleModel.title == title)
-                articles = session.scalars(query).all()
-            except NoResultFound:
-                raise pjst_exceptions.NotFound("No articles found")
-        return pjst_types.Response(data=articles)
+            articles = list(session.scalars(query.limit(page.size + 1)))
+        has_more = len(articles) > page.size
+        articles = articles[: page.size]
+        if page.before is not None:
+            articles.reverse()
+        has_next, has_prev = (
+            (True, has_more)
+            if page.before is not None
+            else (has_more, bool(page.after))
+        )
+        return pjst_types.Response(
+            data=articles,
+            next_cursor=(
+                str(articles[-1].id) if articles and has_next and not sort else None
+            ),
+            prev_cursor=str(articles[0].id) if articles and has_prev else None,
+        )
 
     @classmethod
     def serialize(cls, obj: models.ArticleModel) -> ArticleSchema:
-        return ArticleSchema(
+        # Don't touch the columns `get_many` left out for sparse fieldsets
+        unloaded = inspect(obj).unloaded
+        article = ArticleSchema(
             id=str(obj.id),
-            attributes=ArticleSchema.Attributes(title=obj.title, content=obj.content),
+            attributes=ArticleSchema.Attributes(
+                **{
+                    name: getattr(obj, name)
+                    for name in ("title", "content")
+                    if name not in unloaded
+                }
+            ),
         )
+        if obj.author_id is not None:
+            article.relationships = {
+                "author": pjst_types.Relationship(
+                    data=pjst_types.ResourceIdentifier(
+                        type="people", id=str(obj.author_id)
+                    )
+                )
+            }
+        return article
+
+
+# The handlers refer to each other
+PersonResourceHandler.RELATIONSHIPS = {
+    "articles": pjst_types.Relation(ArticleResourceHandler, many=True)
+}
@@ -1,3 +1,21 @@
-from .resource_handler import ResourceHandler
+from typing import TYPE_CHECKING
 
-__all__ = ["ResourceHandler"]
+if TYPE_CHECKING:
+    from .registry import Registry
+    from .resource_handler import ResourceHandler
+
+__all__ = ["Registry", "ResourceHandler"]
+
+
+def __getattr__(name: str):
+    # Imported on first access, so that importing a submodule (eg
+    # `pjst.registry`) doesn't import pydantic and every other one
+    if name == "ResourceHandler":
+        from .resource_handler import ResourceHandler
+
+        return ResourceHandler
+    if name == "Registry":
+        from .registry import Registry
+
+        return Registry
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
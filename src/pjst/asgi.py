@@ -0,0 +1,433 @@
+"""A framework-free ASGI application for pjst handlers.
+
+    app = App([ArticleResourceHandler, PersonResourceHandler])
+
+    $ uvicorn articles.asgi:app
+
+Serves `/{TYPE}` (GET, HEAD, POST), `/{TYPE}/{id}` (GET, HEAD, PATCH, DELETE),
+`/{TYPE}/{id}/relationships/{name}` and `/{TYPE}/{id}/{name}` (GET, HEAD) and
+`/operations`, with the same semantics as the other adapters. Routes are
+matched with one dict lookup on `TYPE`; query strings and bodies are parsed
+straight from the ASGI scope and messages and responses are sent as the bytes
+`ResourceHandler` renders. Bodies are only read for POST and PATCH, once the
+route is known, and bodies over `max_body_size` bytes get a 413 error.
+
+Sync handler methods run in worker threads (`run_sync`, `asyncio.to_thread`
+by default). Parameters annotated with `pjst.asgi.Request` receive the
+request. Handlers may return an ASGI application of their own (eg a Starlette
+`Response`) instead of a `pjst.types.Response`.
+"""
+
+import asyncio
+import dataclasses
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+)
+from urllib.parse import parse_qsl
+
+from . import exceptions as pjst_exceptions
+from . import operations as pjst_operations
+from . import routing as pjst_routing
+from . import timing as pjst_timing
+from . import types as pjst_types
+from .plan import HandlerPlan, compile_plan
+from .rendering import LINK_PLACEHOLDER, LinkTemplates, RenderContext
+from .resource_handler import ResourceHandler, RunSync
+
+Scope = Mapping[str, Any]
+Receive = Callable[[], Awaitable[Mapping[str, Any]]]
+Send = Callable[[Mapping[str, Any]], Awaitable[None]]
+
+# The default `max_body_size`, in bytes
+MAX_BODY_SIZE = 10 * 1024 * 1024
+
+
+@dataclasses.dataclass(frozen=True)
+class Request:
+    scope: Scope
+    method: str
+    # Without the `root_path` the app is mounted at
+    path: str
+    query_params: Mapping[str, str]
+    # By lowercase name
+    headers: Mapping[str, str]
+    # Only read for POST and PATCH
+    body: bytes = b""
+
+    @property
+    def root_path(self) -> str:
+        return self.scope.get("root_path", "")
+
+
+async def _read_body(receive: Receive, max_size: int | None) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message["type"] != "http.request":
+            break
+        chunk = message.get("body", b"")
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            raise pjst_exceptions.ContentTooLarge(
+                f"Request bodies are limited to {max_size} bytes"
+            )
+        chunks.append(chunk)
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+
+async def _lifespan(receive: Receive, send: Send) -> None:
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+class App:
+    def __init__(
+        self,
+        resource_classes: Iterable[type[ResourceHandler]],
+        run_sync: RunSync = asyncio.to_thread,
+        max_body_size: int | None = MAX_BODY_SIZE,
+    ) -> None:
+        self._run_sync = run_sync
+        self._max_body_size = max_body_size
+        self._handlers: dict[str, tuple[type[ResourceHandler], HandlerPlan]] = {}
+        for resource_cls in resource_classes:
+            pjst_operations.add_handler(
+                self._handlers, compile_plan(resource_cls, Request)
+            )
+        # IDs are inserted as they are, like Starlette does
+        self._links = LinkTemplates(self._resolve)
+
+    def _resolve(self, type: str) -> str | None:
+        if (handler := self._handlers.get(type)) is None:
+            return None
+        if not handler[1].object_http_methods:
+            return None
+        return f"/{type}/{LINK_PLACEHOLDER}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await _lifespan(receive, send)
+            return
+        if scope["type"] != "http":  # pragma: no cover
+            raise ValueError(f"Unsupported ASGI scope type '{scope['type']}'")
+
+        root_path = scope.get("root_path", "")
+        path = scope["path"]
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path) :]
+        request = Request(
+            scope=scope,
+            method=scope["method"],
+            path=path,
+            query_params=dict(
+                parse_qsl(
+                    scope["query_string"].decode("latin-1"), keep_blank_values=True
+                )
+            ),
+            headers={
+                name.decode("latin-1").lower(): value.decode("latin-1")
+                for name, value in scope["headers"]
+            },
+        )
+        response = await self._dispatch(request, receive)
+        if not isinstance(response, pjst_routing.Response):
+            await response(scope, receive, send)
+            return
+
+        headers = [
+            (name.lower().encode("latin-1"), value.encode("latin-1"))
+            for name, value in response.headers
+        ]
+        if response.content_type is not None:
+            headers.append((b"content-type", response.content_type.encode()))
+        if isinstance(response.body, bytes):
+            headers.append((b"content-length", str(len(response.body)).encode()))
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": response.status,
+                    "headers": headers,
+                }
+            )
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": b"" if request.method == "HEAD" else response.body,
+                }
+            )
+            return
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status,
+                "headers": headers,
+            }
+        )
+        chunks = aiter(response.body)
+        if request.method == "HEAD":
+            # Without producing the document at all
+            if (aclose := getattr(chunks, "aclose", None)) is not None:
+                await aclose()
+            await send({"type": "http.response.body", "body": b""})
+            return
+        try:
+            async for chunk in chunks:
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        finally:
+            if (aclose := getattr(chunks, "aclose", None)) is not None:
+                await aclose()
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _dispatch(self, request: Request, receive: Receive) -> Any:
+        try:
+            route = pjst_routing.match(self._handlers, request.method, request.path)
+            if request.method in ("POST", "PATCH"):
+                request = dataclasses.replace(
+                    request, body=await _read_body(receive, self._max_body_size)
+                )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if route.view == "operations":
+            return await self._operations(request)
+        resource_cls, plan = route.resource_cls, route.plan
+        if route.view == "relationship":
+            view = self._relationship(
+                resource_cls, plan, request, route.obj_id, route.name, route.related
+            )
+        elif route.view == "one":
+            view = self._one(resource_cls, plan, request, route.obj_id)
+        elif route.view == "create":
+            view = self._create(resource_cls, plan, request)
+        else:
+            view = self._many(resource_cls, plan, request)
+        if resource_cls.TIMING is None:
+            return await view
+        return await self._timed(resource_cls, request.method, view)
+
+    async def _timed(
+        self, resource_cls: type[ResourceHandler], method: str, view: Awaitable[Any]
+    ) -> Any:
+        """`view`'s response, reporting the phases of the request"""
+
+        timer = pjst_timing.Timer(resource_cls)
+        try:
+            response = await view
+        except BaseException:
+            timer.finish(method, 500, None)
+            raise
+        finally:
+            timer.detach()
+        return pjst_routing.finish_timer(timer, method, response, timer.astream)
+
+    def _context(
+        self,
+        resource_cls: type[ResourceHandler],
+        request: Request,
+        fields: frozenset[str] | None = None,
+        include: dict | None = None,
+        obj_id: str | None = None,
+    ) -> RenderContext:
+        prefix = request.root_path
+        return RenderContext(
+            self_link=prefix + request.path,
+            object_link=self._links.object_link(resource_cls.TYPE, prefix),
+            query_params=request.query_params,
+            fields=fields,
+            include=include,
+            included_link=self._links.included_link(prefix),
+            method=request.method,
+            if_none_match=request.headers.get("if-none-match"),
+            obj_id=obj_id,
+            cache_vary=resource_cls._cache_vary(request),
+            cache_generation=resource_cls._cache_generation(obj_id),
+        )
+
+    async def _one(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+        obj_id: str,
+    ) -> Any:
+        try:
+            fields = resource_cls._process_fields(plan, request.query_params)
+            include = resource_cls._process_include(request.query_params)
+            context = self._context(resource_cls, request, fields, include, obj_id)
+            if (cached := resource_cls._cached(context)) is not None:
+                return pjst_routing.document_response(*cached)
+            simple_response = await resource_cls._ahandle_one(
+                plan, request, request.body, obj_id, self._run_sync, fields
+            )
+            if request.method == "DELETE" and simple_response is None:
+                return pjst_routing.Response(204, content_type=None)
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        return pjst_routing.document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_one(
+                    plan, simple_response, context, self._run_sync
+                ),
+            )
+        )
+
+    async def _many(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+    ) -> Any:
+        try:
+            fields = resource_cls._process_fields(plan, request.query_params)
+            include = resource_cls._process_include(request.query_params)
+            context = self._context(resource_cls, request, fields, include)
+            if (cached := resource_cls._cached(context)) is not None:
+                return pjst_routing.document_response(*cached)
+            simple_response = await resource_cls._acall(
+                plan,
+                "get_many",
+                self._run_sync,
+                **resource_cls._process_filters(plan, request.query_params),
+                **plan.inject_request("get_many", request),
+                **plan.inject_fields("get_many", fields),
+            )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        if resource_cls.STREAM_MANY:
+            etag = resource_cls._version_etag(simple_response, context)
+            if result := resource_cls._skip_render(context, etag):
+                return pjst_routing.document_response(*result)
+            if hasattr(simple_response.data, "__aiter__") or plan.async_serialize:
+                content = resource_cls._postprocess_many_astream(
+                    simple_response, context, self._run_sync
+                )
+            else:
+                content = self._iterate(
+                    resource_cls._postprocess_many_stream(simple_response, context)
+                )
+            return pjst_routing.Response(
+                200,
+                content,
+                headers=[("ETag", etag)] if etag is not None else [],
+            )
+        return pjst_routing.document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_many(
+                    plan, simple_response, context, self._run_sync
+                ),
+            )
+        )
+
+    async def _iterate(self, chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+        """Produce each of a sync iterator's chunks in a worker thread"""
+
+        done = object()
+        try:
+            while (chunk := await self._run_sync(next, chunks, done)) is not done:
+                yield chunk
+        finally:
+            # Also if the client went away, not to leave the generator (and
+            # what it holds on to) suspended
+            if (close := getattr(chunks, "close", None)) is not None:
+                await self._run_sync(close)
+
+    async def _create(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+    ) -> Any:
+        try:
+            simple_response, many = await resource_cls._ahandle_create(
+                plan, request, request.body, self._run_sync
+            )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if simple_response is None:
+            return pjst_routing.Response(204, content_type=None)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        content, location = await resource_cls._apostprocess_created(
+            plan,
+            simple_response,
+            many,
+            self._context(resource_cls, request),
+            self._run_sync,
+        )
+        return pjst_routing.Response(
+            201,
+            content,
+            headers=[("Location", location)] if location is not None else [],
+        )
+
+    async def _relationship(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+        obj_id: str,
+        name: str,
+        related: bool,
+    ) -> Any:
+        try:
+            page = resource_cls._process_relationship(name, request.query_params)
+            simple_response = await resource_cls._ahandle_relationship(
+                plan, request, obj_id, name, page, self._run_sync
+            )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = self._context(resource_cls, request)
+        return pjst_routing.document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_relationship(
+                    simple_response, name, related, context, self._run_sync
+                ),
+                store=False,
+            )
+        )
+
+    async def _operations(self, request: Request) -> pjst_routing.Response:
+        def _context(resource_cls: type[ResourceHandler]) -> RenderContext:
+            return self._context(resource_cls, request)
+
+        try:
+            operations = pjst_operations.prepare(request.body, self._handlers)
+            if pjst_operations.needs_loop(operations):
+                results = await pjst_operations.aexecute(operations, request, _context)
+            else:
+                results = await self._run_sync(
+                    pjst_operations.execute, operations, request, _context
+                )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        status, content = pjst_operations.render_results(results)
+        return pjst_routing.Response(
+            status, content, content_type=pjst_operations.ATOMIC_CONTENT_TYPE
+        )
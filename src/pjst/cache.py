@@ -0,0 +1,288 @@
+"""Caching of rendered documents, see `ResourceHandler.CACHE`.
+
+    class ArticleResourceHandler(ResourceHandler):
+        TYPE = "articles"
+        CACHE = ResponseCache(ttl=60, max_entries=1000)
+
+Entries are keyed on the handler's `TYPE`, the object's ID (`None` for
+collections), the normalized query parameters and what `vary` returns for the
+request. Successful `edit_one` and `delete_one` calls invalidate the object's
+entries and all collection entries of the same type. Documents of other types
+that `include` the object are not invalidated and live until their TTL runs
+out.
+
+A request that misses the cache notes the generation of its object (or of the
+collections) before the handler runs, and its document is only stored if no
+invalidation happened since; otherwise a GET that read the data before a
+concurrent PATCH committed would store the old document after the PATCH's
+invalidation. Generations are kept per process, so with `SQLiteBackend` a
+worker can still store such a document after another worker's invalidation.
+
+A cached document is returned before the handler runs, so whatever
+authorization the handler does is skipped. Documents that depend on who asks
+need a `vary`, eg `ResponseCache(ttl=60, vary=lambda request: user_id(request))`
+(`request` is the framework's request object), so that requests only share
+entries when it returns the same string. Revoked access is then still served
+from the cache until the TTL runs out.
+
+`LRUBackend` (the default) is private to each process; use `SQLiteBackend` so
+that the workers of a server on the same host share their entries (and their
+invalidations).
+"""
+
+import collections
+import dataclasses
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Mapping, NamedTuple
+from urllib.parse import urlencode
+
+# (TYPE, object ID or `None` for collections, `vary`, normalized query string)
+CacheKey = tuple[str, str | None, str, str]
+
+
+class CacheEntry(NamedTuple):
+    content: bytes
+    etag: str | None
+
+
+@dataclasses.dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+def make_key(
+    type: str, obj_id: str | None, query_params: Mapping[str, str], vary: str = ""
+) -> CacheKey:
+    return (type, obj_id, vary, urlencode(sorted(query_params.items())))
+
+
+class CacheBackend:
+    """Stores entries until `expires_at` (a `time.time()` timestamp).
+
+    Implementations count their hits, misses and evictions (entries dropped to
+    stay within `max_entries`) in `stats`."""
+
+    stats: CacheStats
+
+    def get(self, key: CacheKey) -> CacheEntry | None:  # pragma: no cover
+        raise NotImplementedError()
+
+    def set(
+        self, key: CacheKey, entry: CacheEntry, expires_at: float
+    ) -> None:  # pragma: no cover
+        raise NotImplementedError()
+
+    def invalidate(self, type: str, obj_id: str | None) -> None:  # pragma: no cover
+        """Drop the entries of `obj_id` and the collection entries of `type`;
+        only the latter if `obj_id` is `None`"""
+
+        raise NotImplementedError()
+
+
+class LRUBackend(CacheBackend):
+    def __init__(self, max_entries: int = 1024) -> None:
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries: collections.OrderedDict[CacheKey, tuple[CacheEntry, float]] = (
+            collections.OrderedDict()
+        )
+        # The keys by (TYPE, object ID), so that invalidating doesn't scan
+        self._keys: collections.defaultdict[tuple[str, str | None], set[CacheKey]] = (
+            collections.defaultdict(set)
+        )
+        self._lock = threading.Lock()
+
+    def _remove(self, key: CacheKey) -> None:
+        del self._entries[key]
+        keys = self._keys[key[:2]]
+        keys.discard(key)
+        if not keys:
+            del self._keys[key[:2]]
+
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[1] <= time.time():
+                if item is not None:
+                    self._remove(key)
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return item[0]
+
+    def set(self, key: CacheKey, entry: CacheEntry, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (entry, expires_at)
+            self._entries.move_to_end(key)
+            self._keys[key[:2]].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.stats.evictions += 1
+
+    def invalidate(self, type: str, obj_id: str | None) -> None:
+        with self._lock:
+            keys = self._keys.pop((type, None), set())
+            if obj_id is not None:
+                keys |= self._keys.pop((type, obj_id), set())
+            for key in keys:
+                del self._entries[key]
+
+
+class SQLiteBackend(CacheBackend):
+    """Keeps the entries in an SQLite database at `path`, shared by all the
+    processes that use the same file. When full, the oldest entries are
+    evicted first. `stats` only counts the current process's operations."""
+
+    def __init__(self, path: str, max_entries: int = 10_000) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS pjst_cache ("
+                "type TEXT NOT NULL, obj_id TEXT, vary TEXT NOT NULL, query TEXT NOT NULL, "
+                "content BLOB NOT NULL, etag TEXT, expires_at REAL NOT NULL, "
+                "stored_at REAL NOT NULL, "
+                "UNIQUE (type, obj_id, vary, query))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS pjst_cache_stored_at "
+                "ON pjst_cache (stored_at)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared between threads
+        if (connection := getattr(self._local, "connection", None)) is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def close(self) -> None:
+        """Close the current thread's connection"""
+
+        if (connection := getattr(self._local, "connection", None)) is not None:
+            connection.close()
+            del self._local.connection
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        type, obj_id, vary, query = key
+        row = (
+            self._connection()
+            .execute(
+                "SELECT content, etag FROM pjst_cache WHERE type = ? "
+                "AND obj_id IS ? AND vary = ? AND query = ? AND expires_at > ?",
+                (type, obj_id, vary, query, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("hits")
+        return CacheEntry(content=row[0], etag=row[1])
+
+    def set(self, key: CacheKey, entry: CacheEntry, expires_at: float) -> None:
+        type, obj_id, vary, query = key
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO pjst_cache "
+                "(type, obj_id, vary, query, content, etag, expires_at, stored_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    type,
+                    obj_id,
+                    vary,
+                    query,
+                    entry.content,
+                    entry.etag,
+                    expires_at,
+                    time.time(),
+                ),
+            )
+            evicted = connection.execute(
+                "DELETE FROM pjst_cache WHERE rowid IN ("
+                "SELECT rowid FROM pjst_cache ORDER BY expires_at <= ? DESC, "
+                "stored_at LIMIT max(0, (SELECT count(*) FROM pjst_cache) - ?))",
+                (time.time(), self.max_entries),
+            ).rowcount
+        if evicted > 0:
+            self._count("evictions", evicted)
+
+    def invalidate(self, type: str, obj_id: str | None) -> None:
+        with self._connection() as connection:
+            connection.execute(
+                "DELETE FROM pjst_cache "
+                "WHERE type = ? AND (obj_id = ? OR obj_id IS NULL)",
+                (type, obj_id),
+            )
+
+
+class ResponseCache:
+    """Per-handler cache configuration: entries expire `ttl` seconds after
+    they were stored; `backend` defaults to an `LRUBackend(max_entries)`.
+    `vary(request)` returns what the documents depend on besides the URL, eg
+    the user, see the module docstring."""
+
+    # Generations are counted in this many slots, by hash of (TYPE, ID), so
+    # that they take constant memory; objects that share a slot only skip
+    # some stores
+    GENERATION_SLOTS = 4096
+
+    def __init__(
+        self,
+        ttl: float,
+        max_entries: int = 1024,
+        backend: CacheBackend | None = None,
+        vary: Callable[[Any], str] | None = None,
+    ) -> None:
+        self.ttl = ttl
+        self.backend = backend if backend is not None else LRUBackend(max_entries)
+        self.vary = vary
+        self._generations = [0] * self.GENERATION_SLOTS
+        self._lock = threading.Lock()
+
+    def _slot(self, type: str, obj_id: str | None) -> int:
+        return hash((type, obj_id)) % self.GENERATION_SLOTS
+
+    def generation(self, type: str, obj_id: str | None) -> int:
+        """Pass to `set` for a document rendered from data read after this
+        call"""
+
+        return self._generations[self._slot(type, obj_id)]
+
+    @property
+    def stats(self) -> CacheStats:
+        return self.backend.stats
+
+    def get(self, key: CacheKey) -> CacheEntry | None:
+        return self.backend.get(key)
+
+    def set(
+        self, key: CacheKey, entry: CacheEntry, generation: int | None = None
+    ) -> None:
+        """Skipped if `key`'s object (or collections) were invalidated since
+        `generation`"""
+
+        with self._lock:
+            if generation is not None and generation != self.generation(*key[:2]):
+                return
+            self.backend.set(key, entry, time.time() + self.ttl)
+
+    def invalidate(self, type: str, obj_id: str | None) -> None:
+        with self._lock:
+            for slot in {self._slot(type, None), self._slot(type, obj_id)}:
+                self._generations[slot] += 1
+            self.backend.invalidate(type, obj_id)
@@ -0,0 +1,110 @@
+"""The JSON codec every adapter renders responses and parses bodies with.
+
+    from pjst import codec
+
+    codec.CODEC = codec.PydanticCodec()  # or OrjsonCodec(), MsgspecCodec()
+
+`CODEC` defaults to `MsgspecCodec` if msgspec is installed, `OrjsonCodec`
+if orjson is, and `PydanticCodec` otherwise; `python -m benchmarks -k
+'pipeline/codec/*'` compares them.
+
+Documents are rendered by their pydantic serializers straight to JSON
+(`dump_model`) in every codec, since turning them into Python objects for
+another encoder would be a second pass; orjson and msgspec only encode the
+plain data that `dumps` gets (error objects, links of streamed collections) and
+parse with `loads`. Those values are encoded the way pydantic-core encodes them:
+anything the encoders don't know (`Decimal`, `timedelta`, sets, ...) goes
+through `pydantic_core.to_jsonable_python`. Datetimes are ISO 8601 with `Z` for
+UTC, UUIDs are hyphenated strings and decimals are strings, in every codec.
+
+Request bodies are validated with pydantic's own JSON parser
+(`validate_json`) by all three, since parsing into Python objects first and
+validating those is slower, `create_many` arrays included; `loads` is for
+handlers that parse JSON of their own.
+"""
+
+from typing import Any
+
+import pydantic
+import pydantic_core
+
+
+class PydanticCodec:
+    name = "pydantic-core"
+
+    def dumps(self, obj: Any) -> bytes:
+        return pydantic_core.to_json(obj)
+
+    def dump_model(self, serializer: pydantic_core.SchemaSerializer, obj: Any) -> bytes:
+        """`obj` as `serializer` renders it, without the fields that weren't
+        set"""
+
+        return serializer.to_json(obj, exclude_unset=True)
+
+    def loads(self, data: bytes | str) -> Any:
+        """Raises `ValueError` for invalid JSON"""
+
+        return pydantic_core.from_json(data)
+
+    def validate_json(
+        self, model: type[pydantic.BaseModel], data: bytes | str
+    ) -> pydantic.BaseModel:
+        """Raises `pydantic.ValidationError`, for invalid JSON too"""
+
+        return model.model_validate_json(data)
+
+
+class OrjsonCodec(PydanticCodec):
+    name = "orjson"
+
+    def __init__(self) -> None:
+        import orjson
+
+        self._orjson = orjson
+        # pydantic-core writes UTC offsets as `Z` too
+        self._option = orjson.OPT_UTC_Z
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._orjson.dumps(
+            obj, default=pydantic_core.to_jsonable_python, option=self._option
+        )
+
+    def loads(self, data: bytes | str) -> Any:
+        # `orjson.JSONDecodeError` is a `ValueError`
+        return self._orjson.loads(data)
+
+
+class MsgspecCodec(PydanticCodec):
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        import msgspec
+
+        self._decode_error = msgspec.DecodeError
+        self._encoder = msgspec.json.Encoder(
+            enc_hook=pydantic_core.to_jsonable_python, decimal_format="string"
+        )
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj: Any) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data: bytes | str) -> Any:
+        try:
+            return self._decoder.decode(data)
+        except self._decode_error as exc:
+            raise ValueError(str(exc)) from exc
+
+
+def default_codec() -> PydanticCodec:
+    """The fastest codec that is installed"""
+
+    for codec_cls in (MsgspecCodec, OrjsonCodec):
+        try:
+            return codec_cls()
+        except ImportError:
+            pass
+    return PydanticCodec()
+
+
+CODEC: PydanticCodec = default_codec()
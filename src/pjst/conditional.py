@@ -0,0 +1,31 @@
+"""Validators for conditional requests (`ETag` / `If-None-Match`)."""
+
+import hashlib
+from typing import Any, Mapping
+
+
+def strong_etag(content: bytes) -> str:
+    return f'"{hashlib.blake2b(content, digest_size=16).hexdigest()}"'
+
+
+def weak_etag(version: Any, self_link: str, query_params: Mapping[str, str]) -> str:
+    """An ETag for a `version` returned by the handler, without rendering.
+
+    The URL is part of the hash since sparse fieldsets, includes and
+    pagination change the representation while the version stays the same."""
+
+    key = repr((self_link, sorted(query_params.items()), str(version)))
+    return f'W/"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def is_not_modified(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of `etag` with an `If-None-Match` header"""
+
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque_tag = etag.removeprefix("W/")
+    return any(
+        tag.strip().removeprefix("W/") == opaque_tag for tag in if_none_match.split(",")
+    )
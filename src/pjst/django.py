@@ -1,113 +1,566 @@
-from typing import cast
+import functools
+import inspect
+from typing import Iterable
 
+from asgiref.sync import async_to_sync, sync_to_async
 from django import http as django_http
-from django.urls import URLPattern, path, reverse
+from django.db import transaction
+from django.urls import (
+    NoReverseMatch,
+    URLPattern,
+    URLResolver,
+    get_resolver,
+    get_script_prefix,
+    path,
+    reverse,
+)
+from django.utils.http import RFC3986_SUBDELIMS
 
 from . import exceptions as pjst_exceptions
+from . import operations as pjst_operations
+from . import timing as pjst_timing
 from . import types as pjst_types
-from .resource_handler import ResourceHandler
-from .utils import hasdirectattr
+from .plan import HandlerPlan, compile_plan
+from .rendering import (
+    JSONAPI_CONTENT_TYPE,
+    LINK_PLACEHOLDER,
+    LinkTemplates,
+    RenderContext,
+    render_errors,
+)
+from .resource_handler import ResourceHandler, RunSync
 
 
-def register(resource_cls: type[ResourceHandler]) -> list[URLPattern]:
+def _error_response(exc: pjst_exceptions.PjstException) -> django_http.HttpResponse:
+    return django_http.HttpResponse(
+        render_errors(exc), status=exc.status, content_type=JSONAPI_CONTENT_TYPE
+    )
+
+
+def _document_response(
+    status: int, content: bytes, etag: str | None
+) -> django_http.HttpResponse:
+    return django_http.HttpResponse(
+        content,
+        status=status,
+        content_type=JSONAPI_CONTENT_TYPE,
+        headers={"ETag": etag} if etag is not None else None,
+    )
+
+
+def _timed(resource_cls: type[ResourceHandler], view):
+    """`view`, reporting the phases of its requests if the handler has
+    `TIMING`"""
+
+    if resource_cls.TIMING is None:
+        return view
+
+    def _finish(
+        timer: pjst_timing.Timer,
+        request: django_http.HttpRequest,
+        response: django_http.HttpResponseBase,
+    ) -> django_http.HttpResponseBase:
+        method, status = request.method or "GET", response.status_code
+        if (header := timer.server_timing()) is not None:
+            response.headers["Server-Timing"] = header
+        if isinstance(response, django_http.StreamingHttpResponse):
+            response.streaming_content = (
+                timer.astream(response.streaming_content, method, status)
+                if response.is_async
+                else timer.stream(response.streaming_content, method, status)
+            )
+        else:
+            timer.finish(method, status, len(response.content))  # type: ignore[attr-defined]
+        return response
+
+    if inspect.iscoroutinefunction(view):
+
+        @functools.wraps(view)
+        async def _async_view(request: django_http.HttpRequest, **kwargs):
+            timer = pjst_timing.Timer(resource_cls)
+            try:
+                response = await view(request, **kwargs)
+            except BaseException:
+                timer.finish(request.method or "GET", 500, None)
+                raise
+            finally:
+                timer.detach()
+            return _finish(timer, request, response)
+
+        return _async_view
+
+    @functools.wraps(view)
+    def _view(request: django_http.HttpRequest, **kwargs):
+        timer = pjst_timing.Timer(resource_cls)
+        try:
+            response = view(request, **kwargs)
+        except BaseException:
+            timer.finish(request.method or "GET", 500, None)
+            raise
+        finally:
+            timer.detach()
+        return _finish(timer, request, response)
+
+    return _view
+
+
+async def _run_sync(func, *args, **kwargs):
+    return await sync_to_async(func)(*args, **kwargs)
+
+
+async def _run_sync_concurrently(func, *args, **kwargs):
+    return await sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+def _run_async(awaitable):
+    return async_to_sync(_await)(awaitable)
+
+
+def _resolve(type: str) -> str | None:
+    # Without the script prefix, which is added per request
+    try:
+        url = reverse(f"{type}_object", kwargs={"obj_id": LINK_PLACEHOLDER})
+    except NoReverseMatch:
+        return None
+    return "/" + url.removeprefix(get_script_prefix())
+
+
+@functools.cache
+def _collection_path(resolver: URLResolver, type: str) -> str:
+    """`/{TYPE}` in the URLconf of `resolver`, without the script prefix like
+    `_resolve`; resolved once instead of on every collection request"""
+
+    url = reverse(f"{type}_list", urlconf=resolver.urlconf_name)
+    return "/" + url.removeprefix(get_script_prefix())
+
+
+_SAFE = RFC3986_SUBDELIMS + "/~:@"
+
+
+@functools.cache
+def _operations_setup(
+    resolver: URLResolver,
+) -> tuple[pjst_operations.Handlers, LinkTemplates]:
+    """The handlers registered in a URLconf, found through the views that
+    `register` tagged, and the link templates to render their results with"""
+
+    def _collect(resolver: URLResolver, handlers: dict) -> dict:
+        for pattern in resolver.url_patterns:
+            if isinstance(pattern, URLResolver):
+                _collect(pattern, handlers)
+            elif (
+                handler := getattr(pattern.callback, "pjst_handler", None)
+            ) is not None:
+                # The first one wins, like when resolving URLs
+                handlers.setdefault(handler[0].TYPE, handler)
+        return handlers
+
+    return _collect(resolver, {}), LinkTemplates(_resolve, safe=_SAFE)
+
+
+def operations_view(request: django_http.HttpRequest) -> django_http.HttpResponse:
+    """`/operations` for the handlers registered in the current URLconf. Runs
+    in a database transaction; requests that involve coroutine handler
+    methods run in one `async_to_sync` call."""
+
+    try:
+        if request.method != "POST":  # pragma: no cover
+            raise pjst_exceptions.MethodNotAllowed(
+                f"Method {request.method} not allowed"
+            )
+        handlers, links = _operations_setup(
+            get_resolver(getattr(request, "urlconf", None))
+        )
+        prefix = get_script_prefix().removesuffix("/")
+
+        def _context(resource_cls: type[ResourceHandler]) -> RenderContext:
+            return RenderContext(
+                self_link=request.path,
+                object_link=links.object_link(resource_cls.TYPE, prefix),
+                method=request.method,
+            )
+
+        operations = pjst_operations.prepare(request.body, handlers)
+        results = pjst_operations.execute(
+            operations,
+            request,
+            _context,
+            run_async=_run_async,
+            transaction=transaction.atomic(),
+            run_sync=_run_sync,
+        )
+    except pjst_exceptions.PjstException as exc:
+        return _error_response(exc)
+    status, content = pjst_operations.render_results(results)
+    return django_http.HttpResponse(
+        content, status=status, content_type=pjst_operations.ATOMIC_CONTENT_TYPE
+    )
+
+
+def register(
+    resource_cls: type[ResourceHandler], *, thread_sensitive: bool = True
+) -> list[URLPattern]:
+    """Returns the URL patterns for `resource_cls`, and `/operations`.
+
+    If any of the handler's methods are coroutines, the views are async so that
+    they run natively under ASGI; the remaining sync methods, and serialization,
+    run through `sync_to_async`. By default that is thread sensitive: every
+    such call of every request queues for the same thread, which Django's
+    database connections and transactions (eg `ATOMIC_REQUESTS`) rely on.
+    `thread_sensitive=False` runs them in a thread pool instead, so that
+    requests overlap; only use it for handlers that don't need the request's
+    connection, as the pool's threads have their own, which see no transaction
+    the request opened and which Django doesn't close at the end of requests.
+    `/operations` stays thread sensitive, for its transaction.
+
+    Every call includes the same `/operations` pattern, which serves all the
+    handlers registered in the URLconf that it is resolved from.
+    """
+
+    return register_many([resource_cls], thread_sensitive=thread_sensitive)
+
+
+def register_many(
+    resource_classes: Iterable[type[ResourceHandler]], *, thread_sensitive: bool = True
+) -> list[URLPattern]:
+    """`register` for several handlers at once, with a single `/operations`
+    pattern, see `pjst.registry`"""
+
+    links = LinkTemplates(_resolve, safe=_SAFE)
+    run_sync = _run_sync if thread_sensitive else _run_sync_concurrently
+    result = []
+    for resource_cls in resource_classes:
+        result.extend(
+            _patterns(
+                compile_plan(resource_cls, django_http.HttpRequest), links, run_sync
+            )
+        )
+    result.append(path("operations", operations_view, name="pjst_operations"))
+    return result
+
+
+def _patterns(
+    plan: HandlerPlan, links: LinkTemplates, run_sync: RunSync
+) -> list[URLPattern]:
+    resource_cls = plan.resource_cls
     result = []
 
+    def _collection_link(request: django_http.HttpRequest) -> str:
+        resolver = get_resolver(getattr(request, "urlconf", None))
+        return get_script_prefix().removesuffix("/") + _collection_path(
+            resolver, resource_cls.TYPE
+        )
+
+    def _context(request, self_link, fields, include, obj_id=None) -> RenderContext:
+        prefix = get_script_prefix().removesuffix("/")
+        object_link = links.object_link(resource_cls.TYPE, prefix)
+        return RenderContext(
+            self_link=self_link if obj_id is None else object_link(obj_id),
+            object_link=object_link,
+            query_params=request.GET,
+            fields=fields,
+            include=include,
+            included_link=links.included_link(prefix),
+            method=request.method or "GET",
+            if_none_match=request.headers.get("If-None-Match"),
+            obj_id=obj_id,
+            cache_vary=resource_cls._cache_vary(request),
+            cache_generation=resource_cls._cache_generation(obj_id),
+        )
+
     def _one_view(
         request: django_http.HttpRequest, obj_id: str
     ) -> django_http.HttpResponse:
         try:
-            simple_response = resource_cls._handle_one(request, request.body, obj_id)
+            fields = resource_cls._process_fields(plan, request.GET)
+            include = resource_cls._process_include(request.GET)
+            context = _context(request, None, fields, include, obj_id)
+            if (cached := resource_cls._cached(context)) is not None:
+                return _document_response(*cached)
+            simple_response = resource_cls._handle_one(
+                plan, request, request.body, obj_id, fields
+            )
             if request.method == "DELETE" and simple_response is None:
                 return django_http.HttpResponse("", status=204)
         except pjst_exceptions.PjstException as exc:
-            result = django_http.JsonResponse(
-                pjst_types.Document(errors=exc.render()).model_dump(exclude_unset=True),
-                status=exc.status,
+            return _error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        return _document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_one(simple_response, context),
+            )
+        )
+
+    async def _async_one_view(
+        request: django_http.HttpRequest, obj_id: str
+    ) -> django_http.HttpResponse:
+        try:
+            fields = resource_cls._process_fields(plan, request.GET)
+            include = resource_cls._process_include(request.GET)
+            context = _context(request, None, fields, include, obj_id)
+            if (cached := resource_cls._cached(context)) is not None:
+                return _document_response(*cached)
+            simple_response = await resource_cls._ahandle_one(
+                plan, request, request.body, obj_id, run_sync, fields
             )
-            result["Content-Type"] = "application/vnd.api+json"
-            return result
+            if request.method == "DELETE" and simple_response is None:
+                return django_http.HttpResponse("", status=204)
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
         if not isinstance(simple_response, pjst_types.Response):
             return simple_response
-        processed_response = resource_cls._postprocess_one(simple_response)
-        assert isinstance(processed_response.data, pjst_types.Resource)
-        self_link = reverse(
-            f"{resource_cls.TYPE}_object", kwargs={"obj_id": processed_response.data.id}
-        )
-        if "self" not in processed_response.links:
-            processed_response.links = {**processed_response.links, "self": self_link}
-        assert isinstance(processed_response.data, pjst_types.Resource)
-        if "self" not in processed_response.data.links:
-            processed_response.data.links = {
-                **processed_response.data.links,
-                "self": self_link,
-            }
-        result = django_http.JsonResponse(
-            processed_response.model_dump(exclude_unset=True)
-        )
-        result["Content-Type"] = "application/vnd.api+json"
-        return result
-
-    if (
-        hasdirectattr(resource_cls, "get_one")
-        or hasdirectattr(resource_cls, "edit_one")
-        or hasdirectattr(resource_cls, "delete_one")
-    ):
+        return _document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_one(
+                    plan, simple_response, context, run_sync
+                ),
+            )
+        )
+
+    if plan.methods & {"get_one", "edit_one", "delete_one"}:
         result.append(
             path(
                 f"{resource_cls.TYPE}/<str:obj_id>",
-                _one_view,
+                _timed(
+                    resource_cls,
+                    _async_one_view if plan.coroutine_methods else _one_view,
+                ),
                 name=f"{resource_cls.TYPE}_object",
             )
         )
 
-    def _many_view(request: django_http.HttpRequest) -> django_http.HttpResponse:
+    can_list = "get_many" in plan.methods
+    can_create = "create_one" in plan.methods
+
+    def _created_response(
+        content: bytes, location: str | None
+    ) -> django_http.HttpResponse:
+        return django_http.HttpResponse(
+            content,
+            status=201,
+            content_type=JSONAPI_CONTENT_TYPE,
+            headers={"Location": location} if location is not None else None,
+        )
+
+    def _create(request: django_http.HttpRequest) -> django_http.HttpResponse:
+        simple_response, many = resource_cls._handle_create(plan, request, request.body)
+        if simple_response is None:
+            return django_http.HttpResponse("", status=204)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = _context(request, request.path, None, None)
+        return _created_response(
+            *resource_cls._postprocess_created(simple_response, many, context)
+        )
+
+    async def _acreate(request: django_http.HttpRequest) -> django_http.HttpResponse:
+        simple_response, many = await resource_cls._ahandle_create(
+            plan, request, request.body, run_sync
+        )
+        if simple_response is None:
+            return django_http.HttpResponse("", status=204)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = _context(request, request.path, None, None)
+        return _created_response(
+            *await resource_cls._apostprocess_created(
+                plan, simple_response, many, context, run_sync
+            ),
+        )
+
+    def _many_view(
+        request: django_http.HttpRequest,
+    ) -> django_http.HttpResponse | django_http.StreamingHttpResponse:
         try:
-            if request.method == "GET":
-                kwargs = resource_cls._process_filters(request.GET)
-                simple_response = resource_cls.get_many(**kwargs)
+            if request.method == "POST" and can_create:
+                return _create(request)
+            if request.method in ("GET", "HEAD") and can_list:
+                fields = resource_cls._process_fields(plan, request.GET)
+                include = resource_cls._process_include(request.GET)
+                context = _context(request, _collection_link(request), fields, include)
+                if (cached := resource_cls._cached(context)) is not None:
+                    return _document_response(*cached)
+                kwargs = resource_cls._process_filters(plan, request.GET)
+                with pjst_timing.phase("handler"):
+                    simple_response = resource_cls.get_many(
+                        **kwargs,
+                        **plan.inject_request("get_many", request),
+                        **plan.inject_fields("get_many", fields),
+                    )
             else:  # pragma: no cover
                 raise pjst_exceptions.MethodNotAllowed(
                     f"Method {request.method} not allowed"
                 )
         except pjst_exceptions.PjstException as exc:
-            result = django_http.JsonResponse(
-                pjst_types.Document(errors=exc.render()).model_dump(exclude_unset=True),
-                status=exc.status,
+            return _error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        if resource_cls.STREAM_MANY:
+            etag = resource_cls._version_etag(simple_response, context)
+            if result := resource_cls._skip_render(context, etag):
+                return _document_response(*result)
+            return django_http.StreamingHttpResponse(
+                resource_cls._postprocess_many_stream(simple_response, context),
+                content_type=JSONAPI_CONTENT_TYPE,
+                headers={"ETag": etag} if etag is not None else None,
             )
-            result["Content-Type"] = "application/vnd.api+json"
-            return result
+        return _document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_many(simple_response, context),
+            )
+        )
+
+    async def _async_many_view(
+        request: django_http.HttpRequest,
+    ) -> django_http.HttpResponse | django_http.StreamingHttpResponse:
+        try:
+            if request.method == "POST" and can_create:
+                return await _acreate(request)
+            if request.method in ("GET", "HEAD") and can_list:
+                fields = resource_cls._process_fields(plan, request.GET)
+                include = resource_cls._process_include(request.GET)
+                context = _context(request, _collection_link(request), fields, include)
+                if (cached := resource_cls._cached(context)) is not None:
+                    return _document_response(*cached)
+                kwargs = resource_cls._process_filters(plan, request.GET)
+                simple_response = await resource_cls._acall(
+                    plan,
+                    "get_many",
+                    run_sync,
+                    **kwargs,
+                    **plan.inject_request("get_many", request),
+                    **plan.inject_fields("get_many", fields),
+                )
+            else:  # pragma: no cover
+                raise pjst_exceptions.MethodNotAllowed(
+                    f"Method {request.method} not allowed"
+                )
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
         if not isinstance(simple_response, pjst_types.Response):
             return simple_response
-        processed_response = resource_cls._postprocess_many(simple_response)
-        processed_response.data = cast(
-            list[pjst_types.Resource], processed_response.data
-        )
-        if "self" not in processed_response.links:
-            processed_response.links = {
-                **processed_response.links,
-                "self": reverse(f"{resource_cls.TYPE}_list"),
-            }
-        for obj in processed_response.data:
-            if "self" not in obj.links:
-                obj.links = {
-                    **obj.links,
-                    "self": reverse(
-                        f"{resource_cls.TYPE}_object", kwargs={"obj_id": obj.id}
-                    ),
-                }
-        result = django_http.JsonResponse(
-            processed_response.model_dump(exclude_unset=True)
-        )
-        result["Content-Type"] = "application/vnd.api+json"
-        return result
-
-    if hasdirectattr(resource_cls, "get_many"):
+        if resource_cls.STREAM_MANY:
+            etag = resource_cls._version_etag(simple_response, context)
+            if result := resource_cls._skip_render(context, etag):
+                return _document_response(*result)
+            return django_http.StreamingHttpResponse(
+                resource_cls._postprocess_many_astream(
+                    simple_response, context, run_sync
+                ),
+                content_type=JSONAPI_CONTENT_TYPE,
+                headers={"ETag": etag} if etag is not None else None,
+            )
+        return _document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_many(
+                    plan, simple_response, context, run_sync
+                ),
+            )
+        )
+
+    if can_list or can_create:
         result.append(
             path(
                 resource_cls.TYPE,
-                _many_view,
+                _timed(
+                    resource_cls,
+                    _async_many_view if plan.coroutine_methods else _many_view,
+                ),
                 name=f"{resource_cls.TYPE}_list",
             )
         )
 
+    def _relationship_view(
+        request: django_http.HttpRequest, obj_id: str, name: str, related: bool
+    ) -> django_http.HttpResponse:
+        try:
+            if request.method not in ("GET", "HEAD"):
+                raise pjst_exceptions.MethodNotAllowed(
+                    f"Method {request.method} not allowed"
+                )
+            page = resource_cls._process_relationship(name, request.GET)
+            simple_response = resource_cls._handle_relationship(
+                plan, request, obj_id, name, page
+            )
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = _context(request, request.path, None, None)
+        return _document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_relationship(
+                    simple_response, name, related, context
+                ),
+                store=False,
+            )
+        )
+
+    async def _async_relationship_view(
+        request: django_http.HttpRequest, obj_id: str, name: str, related: bool
+    ) -> django_http.HttpResponse:
+        try:
+            if request.method not in ("GET", "HEAD"):
+                raise pjst_exceptions.MethodNotAllowed(
+                    f"Method {request.method} not allowed"
+                )
+            page = resource_cls._process_relationship(name, request.GET)
+            simple_response = await resource_cls._ahandle_relationship(
+                plan, request, obj_id, name, page, run_sync
+            )
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = _context(request, request.path, None, None)
+        return _document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_relationship(
+                    simple_response, name, related, context, run_sync
+                ),
+                store=False,
+            )
+        )
+
+    if "get_relationship" in plan.methods:
+        relationship_view = _timed(
+            resource_cls,
+            _async_relationship_view if plan.coroutine_methods else _relationship_view,
+        )
+        result.append(
+            path(
+                f"{resource_cls.TYPE}/<str:obj_id>/relationships/<str:name>",
+                relationship_view,
+                {"related": False},
+                name=f"{resource_cls.TYPE}_relationship",
+            )
+        )
+        result.append(
+            path(
+                f"{resource_cls.TYPE}/<str:obj_id>/<str:name>",
+                relationship_view,
+                {"related": True},
+                name=f"{resource_cls.TYPE}_related",
+            )
+        )
+
+    for pattern in result:
+        pattern.callback.pjst_handler = (resource_cls, plan)  # type: ignore[attr-defined]
     return result
@@ -1,8 +1,10 @@
-from functools import reduce
+from typing import TYPE_CHECKING, Any, Iterator
 
-import pydantic
+if TYPE_CHECKING:
+    # Imported lazily, raising these exceptions doesn't need pydantic
+    import pydantic
 
-from pjst.types import Error
+    from pjst.types import Error
 
 
 def class_name_to_title(text):
@@ -25,7 +27,18 @@ def class_name_to_code(text):
 
 
 class PjstException(Exception):
-    def render(self) -> list[Error]:
+    def render(self) -> "list[Error]":
+        from pjst.types import Error
+
+        return [Error.model_construct(**error) for error in self.errors()]
+
+    def errors(self) -> Iterator[dict[str, Any]]:
+        """The JSON:API error objects as `dict`s, produced lazily so that
+        rendering can stop early"""
+
+        raise NotImplementedError()  # pragma: no cover
+
+    def error_count(self) -> int:
         raise NotImplementedError()  # pragma: no cover
 
     @property
@@ -73,33 +86,45 @@ class PjstExceptionSingle(PjstException):
     DETAIL = "Something went wrong"
     SOURCE = None
 
+    # `STATUS`, `CODE` and `TITLE` resolved once per class, see
+    # `__init_subclass__`
+    _status = "500"
+    _code = "pjst_exception_single"
+    _title = "Pjst exception single"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._status = str(cls.STATUS)
+        cls._code = class_name_to_code(cls.__name__) if cls.CODE is None else cls.CODE
+        cls._title = (
+            class_name_to_title(cls.__name__) if cls.TITLE is None else cls.TITLE
+        )
+
     def __init__(self, detail=None, title=None, source=None):
         if detail is None:
             detail = self.DETAIL
         if title is None:
-            if self.TITLE is None:
-                title = class_name_to_title(self.__class__.__name__)
-            else:
-                title = self.TITLE
+            title = self._title
         if source is None:
             source = self.SOURCE
         # Exception's `__str__` method works best when initialized with only
         # positional arguments.
         super().__init__(title, detail, source)
 
-    def render(self) -> list[Error]:
-        status = str(self.STATUS)
-        code = self.CODE
-        if code is None:
-            code = class_name_to_code(self.__class__.__name__)
-
+    def errors(self) -> Iterator[dict[str, Any]]:
         title, detail, source = self.args
-
-        result = Error(status=status, code=code, title=title, detail=detail)
+        error = {
+            "status": self._status,
+            "code": self._code,
+            "title": title,
+            "detail": detail,
+        }
         if source is not None:
-            result.source = source
+            error["source"] = source
+        yield error
 
-        return [result]
+    def error_count(self) -> int:
+        return 1
 
     @property
     def status(self) -> int:
@@ -116,8 +141,12 @@ class PjstExceptionSingle(PjstException):
 
 
 class PjstExceptionMulti(PjstException):
-    def render(self) -> list[Error]:
-        return reduce(list.__add__, (arg.render() for arg in self.args), [])
+    def errors(self) -> Iterator[dict[str, Any]]:
+        for exc in self.args:
+            yield from exc.errors()
+
+    def error_count(self) -> int:
+        return sum(exc.error_count() for exc in self.args)
 
     @property
     def status(self) -> int:
@@ -140,16 +169,49 @@ class MethodNotAllowed(PjstExceptionSingle):
     STATUS = 405
 
 
+class Conflict(PjstExceptionSingle):
+    STATUS = 409
+
+
+class ContentTooLarge(PjstExceptionSingle):
+    STATUS = 413
+
+
+class InternalServerError(PjstExceptionSingle):
+    STATUS = 500
+
+
+class ValidationBadRequest(PjstExceptionMulti):
+    """A `BadRequest` per error of a pydantic `ValidationError`, converted
+    only as they are rendered. `strip_prefix` is removed from the start of each
+    error's location before it is turned into a JSON pointer."""
+
+    def __init__(self, exc: "pydantic.ValidationError", strip_prefix: tuple = ()):
+        super().__init__(exc, strip_prefix)
+
+    def errors(self) -> Iterator[dict[str, Any]]:
+        exc, strip_prefix = self.args
+        for error in exc.errors(include_url=False):
+            loc = error["loc"]
+            if strip_prefix and loc[: len(strip_prefix)] == strip_prefix:
+                loc = loc[len(strip_prefix) :]
+            yield {
+                "status": BadRequest._status,
+                "code": BadRequest._code,
+                "title": error["type"],
+                "detail": error["msg"],
+                "source": {"pointer": "/" + "/".join((str(part) for part in loc))},
+            }
+
+    def error_count(self) -> int:
+        return self.args[0].error_count()
+
+    @property
+    def status(self) -> int:
+        return BadRequest.STATUS
+
+
 def convert_pydantic_validationerror_to_pjst_badrequest(
-    exc: pydantic.ValidationError,
+    exc: "pydantic.ValidationError", strip_prefix: tuple = ()
 ) -> PjstExceptionMulti:
-    return PjstExceptionMulti(
-        *[
-            BadRequest(
-                error["msg"],
-                error["type"],
-                {"pointer": "/" + "/".join((str(loc) for loc in error["loc"]))},
-            )
-            for error in exc.errors()
-        ]
-    )
+    return ValidationBadRequest(exc, strip_prefix)
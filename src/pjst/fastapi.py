@@ -1,22 +1,188 @@
+import functools
 import inspect
-from typing import Annotated, cast
+from typing import Annotated, Any, Iterable
 
 import fastapi
-from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import create_model
+from starlette.routing import NoMatchFound
 
 from pjst import exceptions as pjst_exceptions
+from pjst import operations as pjst_operations
+from pjst import timing as pjst_timing
 from pjst import types as pjst_types
+from pjst.plan import HandlerPlan, compile_plan
+from pjst.rendering import (
+    JSONAPI_CONTENT_TYPE,
+    LINK_PLACEHOLDER,
+    LinkTemplates,
+    RenderContext,
+    render_errors,
+)
 from pjst.resource_handler import ResourceHandler
-from pjst.utils import hasdirectattr
 
+# (parameter name, query alias, extra `fastapi.Query` arguments)
+_PAGE_QUERY_PARAMETERS = (
+    ("pjst_page_size", "page[size]", int, {}),
+    ("pjst_page_after", "page[after]", str, {}),
+    ("pjst_page_before", "page[before]", str, {}),
+)
 
-class JsonApiResponse(JSONResponse):
-    media_type = "application/vnd.api+json"
+
+class JsonApiResponse(fastapi.Response):
+    media_type = JSONAPI_CONTENT_TYPE
+
+
+def _document_response(status: int, content: bytes, etag: str | None):
+    return JsonApiResponse(
+        content,
+        status_code=status,
+        headers={"ETag": etag} if etag is not None else None,
+    )
+
+
+def _register_operations(
+    app: fastapi.FastAPI, handlers: pjst_operations.Handlers, links: LinkTemplates
+) -> None:
+    async def _operations_view(request: fastapi.Request):
+        prefix = request.scope.get("root_path", "")
+
+        def _context(resource_cls: type[ResourceHandler]) -> RenderContext:
+            return RenderContext(
+                self_link=request.url.path,
+                object_link=links.object_link(resource_cls.TYPE, prefix),
+                method=request.method,
+            )
+
+        try:
+            operations = pjst_operations.prepare(await request.body(), handlers)
+            if pjst_operations.needs_loop(operations):
+                results = await pjst_operations.aexecute(operations, request, _context)
+            else:
+                results = await run_in_threadpool(
+                    pjst_operations.execute, operations, request, _context
+                )
+        except pjst_exceptions.PjstException as exc:
+            return JsonApiResponse(render_errors(exc), status_code=exc.status)
+        status, content = pjst_operations.render_results(results)
+        return fastapi.Response(
+            content,
+            status_code=status,
+            media_type=pjst_operations.ATOMIC_CONTENT_TYPE,
+        )
+
+    app.post("/operations", name="Atomic operations")(_operations_view)
+
+
+def _timed(resource_cls: type[ResourceHandler], view):
+    """`view`, reporting the phases of its requests if the handler has
+    `TIMING`"""
+
+    if resource_cls.TIMING is None:
+        return view
+
+    @functools.wraps(view)
+    async def _view(**kwargs):
+        method = kwargs["request"].method
+        timer = pjst_timing.Timer(resource_cls)
+        try:
+            response = await view(**kwargs)
+        except BaseException:
+            timer.finish(method, 500, None)
+            raise
+        finally:
+            timer.detach()
+        if not isinstance(response, fastapi.Response):
+            # Rendered by FastAPI, with the response model
+            timer.finish(method, 200, None)
+            return response
+        if (header := timer.server_timing()) is not None:
+            response.headers["Server-Timing"] = header
+        if isinstance(response, StreamingResponse):
+            response.body_iterator = timer.astream(
+                response.body_iterator, method, response.status_code
+            )
+        else:
+            timer.finish(method, response.status_code, len(response.body))
+        return response
+
+    return _view
+
+
+def _defer_openapi(app: fastapi.FastAPI, plans: list[HandlerPlan]) -> None:
+    """Have `app.openapi()` document the routes of `plans`.
+
+    The routes that serve requests leave out the response models and the
+    query parameters that are only there for the docs, which are what makes
+    registering routes with FastAPI slow. Documented copies of them are only
+    built when the schema is first generated."""
+
+    openapi = app.openapi
+
+    def _openapi() -> dict:
+        if app.openapi_schema is not None:
+            return openapi()
+        router = fastapi.APIRouter()
+        for plan in plans:
+            _add_routes(router, plan, app.state.pjst_links, documented=True)
+        routes = app.router.routes
+        app.router.routes = [*routes, *router.routes]
+        try:
+            return openapi()
+        finally:
+            app.router.routes = routes
+
+    app.openapi = _openapi  # type: ignore[method-assign]
 
 
 def register(app: fastapi.FastAPI, resource_cls: type[ResourceHandler]) -> None:
-    if resource_type := inspect.signature(resource_cls.serialize).return_annotation:
+    """Registers `resource_cls`'s routes, and `/operations` for all the
+    handlers registered with `app`."""
+
+    register_many(app, [resource_cls])
+
+
+def register_many(
+    app: fastapi.FastAPI, resource_classes: Iterable[type[ResourceHandler]]
+) -> None:
+    """`register` for several handlers at once, see `pjst.registry`"""
+
+    if (handlers := getattr(app.state, "pjst_handlers", None)) is None:
+
+        def _resolve(type: str) -> str | None:
+            try:
+                return app.url_path_for(f"Get {type} object", obj_id=LINK_PLACEHOLDER)
+            except NoMatchFound:
+                return None
+
+        handlers = app.state.pjst_handlers = {}
+        # Starlette inserts path parameters unquoted
+        app.state.pjst_links = LinkTemplates(_resolve)
+        app.state.pjst_plans = []
+        _register_operations(app, handlers, app.state.pjst_links)
+        _defer_openapi(app, app.state.pjst_plans)
+    for resource_cls in resource_classes:
+        plan = compile_plan(resource_cls, fastapi.Request)
+        pjst_operations.add_handler(handlers, plan)
+        app.state.pjst_plans.append(plan)
+        _add_routes(app, plan, app.state.pjst_links, documented=False)
+
+
+def _add_routes(
+    router: fastapi.FastAPI | fastapi.APIRouter,
+    plan: HandlerPlan,
+    links: LinkTemplates,
+    documented: bool,
+) -> None:
+    """The routes of `plan`'s handler; `documented` ones are for the OpenAPI
+    schema only, see `_defer_openapi`"""
+
+    resource_cls = plan.resource_cls
+    single_response_model = collection_response_model = None
+    if documented and (
+        resource_type := inspect.signature(resource_cls.serialize).return_annotation
+    ):
         single_response_model = create_model(
             f"{resource_cls.TYPE}Response",
             __base__=pjst_types.Document,
@@ -27,95 +193,183 @@ def register(app: fastapi.FastAPI, resource_cls: type[ResourceHandler]) -> None:
             __base__=pjst_types.Document,
             data=(list[resource_type], None),
         )
-    else:
-        single_response_model = collection_response_model = None
 
     async def _one_view(obj_id: str, request: fastapi.Request):
         try:
-            simple_response = resource_cls._handle_one(
-                request, await request.body(), obj_id
+            fields = resource_cls._process_fields(plan, request.query_params)
+            include = resource_cls._process_include(request.query_params)
+            context = RenderContext(
+                self_link=request.url.path,
+                object_link=lambda obj_id: request.url.path,
+                query_params=request.query_params,
+                fields=fields,
+                include=include,
+                included_link=links.included_link(request.scope.get("root_path", "")),
+                method=request.method,
+                if_none_match=request.headers.get("If-None-Match"),
+                obj_id=obj_id,
+                cache_vary=resource_cls._cache_vary(request),
+                cache_generation=resource_cls._cache_generation(obj_id),
+            )
+            if (cached := resource_cls._cached(context)) is not None:
+                return _document_response(*cached)
+            simple_response = await resource_cls._ahandle_one(
+                plan,
+                request,
+                await request.body(),
+                obj_id,
+                run_in_threadpool,
+                fields,
             )
             if request.method == "DELETE" and simple_response is None:
                 return fastapi.Response("", status_code=204)
         except pjst_exceptions.PjstException as exc:
-            return JsonApiResponse(
-                pjst_types.Document(errors=exc.render()).model_dump(exclude_unset=True),
-                status_code=exc.status,
-            )
+            return JsonApiResponse(render_errors(exc), status_code=exc.status)
         if not isinstance(simple_response, pjst_types.Response):
             return simple_response
-        processed_response = resource_cls._postprocess_one(simple_response)
-        if "self" not in processed_response.links:
-            processed_response.links = {
-                **processed_response.links,
-                "self": request.url.path,
-            }
-        assert isinstance(processed_response.data, pjst_types.Resource)
-        if "self" not in processed_response.data.links:
-            processed_response.data.links = {
-                **processed_response.data.links,
-                "self": request.url.path,
-            }
-        return JsonApiResponse(processed_response.model_dump(exclude_unset=True))
-
-    if hasdirectattr(resource_cls, "get_one"):
-        app.get(
+        return _document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_one(
+                    plan, simple_response, context, run_in_threadpool
+                ),
+            )
+        )
+
+    one_view = _timed(resource_cls, _one_view)
+    if "get_one" in plan.methods:
+        router.get(
             f"/{resource_cls.TYPE}/{{obj_id}}",
             name=f"Get {resource_cls.TYPE} object",
             response_model=single_response_model,
-        )(_one_view)
+            include_in_schema=documented,
+        )(one_view)
+        router.head(
+            f"/{resource_cls.TYPE}/{{obj_id}}",
+            name=f"Head {resource_cls.TYPE} object",
+            include_in_schema=False,
+        )(one_view)
 
-    if hasdirectattr(resource_cls, "edit_one"):
-        app.patch(
+    if "edit_one" in plan.methods:
+        router.patch(
             f"/{resource_cls.TYPE}/{{obj_id}}",
             name=f"Edit {resource_cls.TYPE} object",
             response_model=single_response_model,
-        )(_one_view)
+            include_in_schema=documented,
+        )(one_view)
 
-    if hasdirectattr(resource_cls, "delete_one"):
-        app.delete(
+    if "delete_one" in plan.methods:
+        router.delete(
             f"/{resource_cls.TYPE}/{{obj_id}}",
             name=f"Delete {resource_cls.TYPE} object",
-        )(_one_view)
+            include_in_schema=documented,
+        )(one_view)
+
+    # (name, alias, type, `fastapi.Query` kwargs)
+    documented_query_parameters: list[tuple[str, str, Any, dict[str, Any]]] = [
+        ("pjst_fields", f"fields[{resource_cls.TYPE}]", str, {}),
+        ("pjst_include", "include", str, {}),
+    ]
+    for filter_parameter in plan.filters:
+        for operator in sorted(filter_parameter.operators):
+            documented_query_parameters.append(
+                (
+                    f"pjst_filter_{filter_parameter.name}_{operator}",
+                    filter_parameter.operator_alias(operator),
+                    # `in` is a comma-separated list, and prefixes aren't
+                    # coerced
+                    str
+                    if operator in ("in", "prefix")
+                    else filter_parameter.value_type,
+                    filter_parameter.metadata.kwargs,
+                )
+            )
+    if plan.page is not None:
+        documented_query_parameters.extend(_PAGE_QUERY_PARAMETERS)
+    if plan.sort is not None:
+        sort_fields = ", ".join(sorted(plan.sort.fields))
+        documented_query_parameters.append(
+            (
+                "pjst_sort",
+                "sort",
+                str,
+                {
+                    "description": "Comma-separated fields to sort by, prefixed "
+                    f"with '-' for descending order. One of: {sort_fields}"
+                },
+            )
+        )
 
     async def _many_view(**kwargs):
-        request = kwargs["request"]
+        request = kwargs.pop("request")
+        for name, *_ in documented_query_parameters:
+            kwargs.pop(name, None)
         try:
-            if request.method == "GET":
-                if "request" not in inspect.signature(resource_cls.get_many).parameters:
-                    kwargs.pop("request")
-                simple_response = resource_cls.get_many(**kwargs)
+            if request.method in ("GET", "HEAD"):
+                fields = resource_cls._process_fields(plan, request.query_params)
+                include = resource_cls._process_include(request.query_params)
+                prefix = request.scope.get("root_path", "")
+                context = RenderContext(
+                    self_link=request.url.path,
+                    object_link=links.object_link(resource_cls.TYPE, prefix),
+                    query_params=request.query_params,
+                    fields=fields,
+                    include=include,
+                    included_link=links.included_link(prefix),
+                    method=request.method,
+                    if_none_match=request.headers.get("If-None-Match"),
+                    cache_vary=resource_cls._cache_vary(request),
+                    cache_generation=resource_cls._cache_generation(None),
+                )
+                if (cached := resource_cls._cached(context)) is not None:
+                    return _document_response(*cached)
+                kwargs.update(resource_cls._process_filters(plan, request.query_params))
+                simple_response = await resource_cls._acall(
+                    plan,
+                    "get_many",
+                    run_in_threadpool,
+                    **kwargs,
+                    **plan.inject_request("get_many", request),
+                    **plan.inject_fields("get_many", fields),
+                )
             else:  # pragma: no cover
                 raise pjst_exceptions.MethodNotAllowed(
                     f"Method {request.method} not allowed"
                 )
         except pjst_exceptions.PjstException as exc:
-            return JsonApiResponse(
-                pjst_types.Document(errors=exc.render()).model_dump(exclude_unset=True),
-                status_code=exc.status,
-            )
+            return JsonApiResponse(render_errors(exc), status_code=exc.status)
         if not isinstance(simple_response, pjst_types.Response):
             return simple_response
-        processed_response = resource_cls._postprocess_many(simple_response)
-        processed_response.data = cast(
-            list[pjst_types.Resource], processed_response.data
+        if resource_cls.STREAM_MANY:
+            etag = resource_cls._version_etag(simple_response, context)
+            if result := resource_cls._skip_render(context, etag):
+                return _document_response(*result)
+            if hasattr(simple_response.data, "__aiter__") or plan.async_serialize:
+                content = resource_cls._postprocess_many_astream(
+                    simple_response, context, run_in_threadpool
+                )
+            else:
+                # Starlette iterates sync iterators in its threadpool
+                content = resource_cls._postprocess_many_stream(
+                    simple_response, context
+                )
+            return StreamingResponse(
+                content,
+                media_type=JSONAPI_CONTENT_TYPE,
+                headers={"ETag": etag} if etag is not None else None,
+            )
+        return _document_response(
+            *await resource_cls._aconditional(
+                simple_response,
+                context,
+                lambda: resource_cls._apostprocess_many(
+                    plan, simple_response, context, run_in_threadpool
+                ),
+            )
         )
-        if "self" not in processed_response.links:
-            processed_response.links = {
-                **processed_response.links,
-                "self": request.url.path,
-            }
-        for obj in processed_response.data:
-            if "self" not in obj.links:
-                obj.links = {
-                    **obj.links,
-                    "self": app.url_path_for(
-                        f"Get {resource_cls.TYPE} object", obj_id=obj.id
-                    ),
-                }
-        return JsonApiResponse(processed_response.model_dump(exclude_unset=True))
 
-    if hasdirectattr(resource_cls, "get_many"):
+    if "get_many" in plan.methods:
         parameters = [
             inspect.Parameter(
                 "request",
@@ -123,43 +377,133 @@ def register(app: fastapi.FastAPI, resource_cls: type[ResourceHandler]) -> None:
                 annotation=fastapi.Request,
             )
         ]
-        for key, value in inspect.signature(resource_cls.get_many).parameters.items():
-            if value.annotation is fastapi.Request:
-                continue
-
-            if (
-                hasattr(value.annotation, "__origin__")
-                and hasattr(value.annotation, "__metadata__")
-                and len(value.annotation.__metadata__) == 1
-                and isinstance(
-                    metadata := value.annotation.__metadata__[0], pjst_types.Filter
+        # Only here so that they show up in the OpenAPI docs, the values
+        # (filters included) are parsed by `ResourceHandler` like in the other
+        # adapters
+        for name, alias, value_type, query_kwargs in (
+            documented_query_parameters if documented else ()
+        ):
+            parameters.append(
+                inspect.Parameter(
+                    name,
+                    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                    default=None,
+                    annotation=Annotated[
+                        value_type | None,
+                        fastapi.Query(alias=alias, **query_kwargs),
+                    ],
                 )
-            ):
-                parameters.append(
-                    inspect.Parameter(
-                        key,
-                        inspect.Parameter.POSITIONAL_OR_KEYWORD,
-                        default=value.default,
-                        annotation=Annotated[
-                            value.annotation.__origin__,
-                            fastapi.Query(alias=f"filter[{key}]", **metadata.kwargs),
-                        ],
-                    )
-                )
-            else:
-                parameters.append(
-                    inspect.Parameter(
-                        key,
-                        inspect.Parameter.POSITIONAL_OR_KEYWORD,
-                        default=value.default,
-                        annotation=value.annotation,
-                    )
+            )
+        for value in plan.get_many_parameters:
+            parameters.append(
+                inspect.Parameter(
+                    value.name,
+                    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                    default=value.default,
+                    annotation=value.annotation,
                 )
+            )
 
         _many_view.__signature__ = inspect.Signature(parameters)  # type: ignore
+        many_view = _timed(resource_cls, _many_view)
 
-        app.get(
+        router.get(
             f"/{resource_cls.TYPE}",
             name=f"Get {resource_cls.TYPE} collection",
             response_model=collection_response_model,
-        )(_many_view)
+            include_in_schema=documented,
+        )(many_view)
+        router.head(
+            f"/{resource_cls.TYPE}",
+            name=f"Head {resource_cls.TYPE} collection",
+            include_in_schema=False,
+        )(many_view)
+
+    async def _create_view(request: fastapi.Request):
+        try:
+            simple_response, many = await resource_cls._ahandle_create(
+                plan, request, await request.body(), run_in_threadpool
+            )
+        except pjst_exceptions.PjstException as exc:
+            return JsonApiResponse(render_errors(exc), status_code=exc.status)
+        if simple_response is None:
+            return fastapi.Response("", status_code=204)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        prefix = request.scope.get("root_path", "")
+        context = RenderContext(
+            self_link=request.url.path,
+            object_link=links.object_link(resource_cls.TYPE, prefix),
+            method=request.method,
+        )
+        content, location = await resource_cls._apostprocess_created(
+            plan, simple_response, many, context, run_in_threadpool
+        )
+        return JsonApiResponse(
+            content,
+            status_code=201,
+            headers={"Location": location} if location is not None else None,
+        )
+
+    if "create_one" in plan.methods:
+        router.post(
+            f"/{resource_cls.TYPE}",
+            name=f"Create {resource_cls.TYPE} object",
+            status_code=201,
+            response_model=single_response_model,
+            include_in_schema=documented,
+        )(_timed(resource_cls, _create_view))
+
+    def _relationship_view(related: bool):
+        async def _view(obj_id: str, name: str, request: fastapi.Request):
+            try:
+                page = resource_cls._process_relationship(name, request.query_params)
+                simple_response = await resource_cls._ahandle_relationship(
+                    plan, request, obj_id, name, page, run_in_threadpool
+                )
+            except pjst_exceptions.PjstException as exc:
+                return JsonApiResponse(render_errors(exc), status_code=exc.status)
+            if not isinstance(simple_response, pjst_types.Response):
+                return simple_response
+            prefix = request.scope.get("root_path", "")
+            context = RenderContext(
+                self_link=request.url.path,
+                object_link=links.object_link(resource_cls.TYPE, prefix),
+                query_params=request.query_params,
+                included_link=links.included_link(prefix),
+                method=request.method,
+                if_none_match=request.headers.get("If-None-Match"),
+            )
+            return _document_response(
+                *await resource_cls._aconditional(
+                    simple_response,
+                    context,
+                    lambda: resource_cls._apostprocess_relationship(
+                        simple_response, name, related, context, run_in_threadpool
+                    ),
+                    store=False,
+                )
+            )
+
+        return _timed(resource_cls, _view)
+
+    if "get_relationship" in plan.methods:
+        for related, path, label in (
+            (
+                False,
+                f"/{resource_cls.TYPE}/{{obj_id}}/relationships/{{name}}",
+                "relationship",
+            ),
+            (True, f"/{resource_cls.TYPE}/{{obj_id}}/{{name}}", "related"),
+        ):
+            view = _relationship_view(related)
+            router.get(
+                path,
+                name=f"Get {resource_cls.TYPE} {label}",
+                include_in_schema=documented,
+            )(view)
+            router.head(
+                path,
+                name=f"Head {resource_cls.TYPE} {label}",
+                include_in_schema=False,
+            )(view)
@@ -1,105 +1,300 @@
-from typing import cast
+import functools
+from typing import Iterable
 
 import flask
+from werkzeug.routing import BuildError
 
 from . import exceptions as pjst_exceptions
+from . import operations as pjst_operations
+from . import routing as pjst_routing
+from . import timing as pjst_timing
 from . import types as pjst_types
+from .plan import HandlerPlan, compile_plan
+from .rendering import (
+    JSONAPI_CONTENT_TYPE,
+    LINK_PLACEHOLDER,
+    LinkTemplates,
+    RenderContext,
+    render_errors,
+)
 from .resource_handler import ResourceHandler
-from .utils import hasdirectattr
+
+
+def _error_response(exc: pjst_exceptions.PjstException) -> flask.Response:
+    return flask.Response(
+        render_errors(exc), status=exc.status, content_type=JSONAPI_CONTENT_TYPE
+    )
+
+
+def _document_response(status: int, content, etag: str | None) -> flask.Response:
+    return flask.Response(
+        content,
+        status=status,
+        content_type=JSONAPI_CONTENT_TYPE,
+        headers={"ETag": etag} if etag is not None else None,
+    )
+
+
+def _timed(resource_cls: type[ResourceHandler], view):
+    """`view`, reporting the phases of its requests if the handler has
+    `TIMING`"""
+
+    if resource_cls.TIMING is None:
+        return view
+
+    @functools.wraps(view)
+    def _view(**kwargs) -> flask.Response:
+        method = flask.request.method
+        timer = pjst_timing.Timer(resource_cls)
+        try:
+            response = flask.make_response(view(**kwargs))
+        except BaseException:
+            timer.finish(method, 500, None)
+            raise
+        finally:
+            timer.detach()
+        if (header := timer.server_timing()) is not None:
+            response.headers["Server-Timing"] = header
+        if response.is_streamed:
+            response.response = timer.stream(
+                response.response, method, response.status_code
+            )
+        else:
+            timer.finish(method, response.status_code, len(response.get_data()))
+        return response
+
+    return _view
+
+
+def _link_templates(app: flask.Flask) -> LinkTemplates:
+    def _resolve(type: str) -> str | None:
+        try:
+            return app.url_map.bind("", script_name="/").build(
+                f"{type}_object", {"obj_id": LINK_PLACEHOLDER}
+            )
+        except BuildError:
+            return None
+
+    return LinkTemplates(_resolve, safe=pjst_routing.SAFE)
+
+
+def _register_operations(app: flask.Flask, handlers: pjst_operations.Handlers) -> None:
+    links = _link_templates(app)
+
+    def _context(resource_cls: type[ResourceHandler]) -> RenderContext:
+        return RenderContext(
+            self_link=flask.request.path,
+            object_link=links.object_link(resource_cls.TYPE, flask.request.script_root),
+            method=flask.request.method,
+        )
+
+    def _operations_view() -> flask.Response:
+        try:
+            operations = pjst_operations.prepare(flask.request.get_data(), handlers)
+            results = pjst_operations.execute(operations, flask.request, _context)
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
+        status, content = pjst_operations.render_results(results)
+        return flask.Response(
+            content, status=status, content_type=pjst_operations.ATOMIC_CONTENT_TYPE
+        )
+
+    app.add_url_rule(
+        "/operations", "pjst_operations", _operations_view, methods=["POST"]
+    )
 
 
 def register(app: flask.Flask, resource_cls: type[ResourceHandler]) -> None:
-    def _one_view(
-        obj_id: str,
-    ) -> (
-        tuple[dict, dict[str, str]] | tuple[dict, int, dict[str, str]] | tuple[str, int]
-    ):
+    """Registers `resource_cls`'s routes, and `/operations` for all the
+    handlers registered with `app`."""
+
+    register_many(app, [resource_cls])
+
+
+def register_many(
+    app: flask.Flask, resource_classes: Iterable[type[ResourceHandler]]
+) -> None:
+    """`register` for several handlers at once, see `pjst.registry`"""
+
+    if (handlers := app.extensions.get("pjst")) is None:
+        handlers = app.extensions["pjst"] = {}
+        _register_operations(app, handlers)
+    links = _link_templates(app)
+    for resource_cls in resource_classes:
+        plan = compile_plan(resource_cls, flask.Request)
+        pjst_operations.add_handler(handlers, plan)
+        _add_routes(app, plan, links)
+
+
+def _add_routes(app: flask.Flask, plan: HandlerPlan, links: LinkTemplates) -> None:
+    resource_cls = plan.resource_cls
+
+    def _context(
+        fields: frozenset[str] | None,
+        include: dict | None,
+        obj_id: str | None = None,
+    ) -> RenderContext:
+        prefix = flask.request.script_root
+        return RenderContext(
+            self_link=flask.request.path,
+            object_link=links.object_link(resource_cls.TYPE, prefix),
+            query_params=flask.request.args,
+            fields=fields,
+            include=include,
+            included_link=links.included_link(prefix),
+            method=flask.request.method,
+            if_none_match=flask.request.headers.get("If-None-Match"),
+            obj_id=obj_id,
+            cache_vary=resource_cls._cache_vary(flask.request),
+            cache_generation=resource_cls._cache_generation(obj_id),
+        )
+
+    def _one_view(obj_id: str) -> flask.Response | tuple[str, int]:
         try:
+            fields = resource_cls._process_fields(plan, flask.request.args)
+            include = resource_cls._process_include(flask.request.args)
+            context = _context(fields, include, obj_id)
+            if (cached := resource_cls._cached(context)) is not None:
+                return _document_response(*cached)
             simple_response = resource_cls._handle_one(
-                flask.request, flask.request.get_json(silent=True), obj_id
+                plan, flask.request, flask.request.get_data(), obj_id, fields
             )
             if flask.request.method == "DELETE" and simple_response is None:
                 return "", 204
         except pjst_exceptions.PjstException as exc:
-            return (
-                pjst_types.Document(errors=exc.render()).model_dump(exclude_unset=True),
-                exc.status,
-                {
-                    "Content-Type": "application/vnd.api+json",
-                },
-            )
+            return _error_response(exc)
         if not isinstance(simple_response, pjst_types.Response):
             return simple_response
-        processed_response = resource_cls._postprocess_one(simple_response)
-        if "self" not in processed_response.links:
-            processed_response.links = {
-                **processed_response.links,
-                "self": flask.request.path,
-            }
-        assert isinstance(processed_response.data, pjst_types.Resource)
-        if "self" not in processed_response.data.links:
-            processed_response.data.links = {
-                **processed_response.data.links,
-                "self": app.url_for(f"{resource_cls.TYPE}_object", obj_id=obj_id),
-            }
-        return processed_response.model_dump(exclude_unset=True), {
-            "Content-Type": "application/vnd.api+json"
-        }
-
-    if (
-        hasdirectattr(resource_cls, "get_one")
-        or hasdirectattr(resource_cls, "edit_one")
-        or hasdirectattr(resource_cls, "delete_one")
-    ):
+        return _document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_one(simple_response, context),
+            )
+        )
+
+    if plan.methods & {"get_one", "edit_one", "delete_one"}:
         app.add_url_rule(
             f"/{resource_cls.TYPE}/<obj_id>",
             f"{resource_cls.TYPE}_object",
-            _one_view,
+            _timed(resource_cls, _one_view),
             methods=["GET", "PATCH", "DELETE"],
         )
 
-    def _many_view():
+    def _many_view() -> flask.Response:
         try:
-            if flask.request.method == "GET":
-                kwargs = resource_cls._process_filters(flask.request.args)
-                simple_response = resource_cls.get_many(**kwargs)
+            if flask.request.method in ("GET", "HEAD"):
+                fields = resource_cls._process_fields(plan, flask.request.args)
+                include = resource_cls._process_include(flask.request.args)
+                context = _context(fields, include)
+                if (cached := resource_cls._cached(context)) is not None:
+                    return _document_response(*cached)
+                kwargs = resource_cls._process_filters(plan, flask.request.args)
+                with pjst_timing.phase("handler"):
+                    simple_response = resource_cls.get_many(
+                        **kwargs,
+                        **plan.inject_request("get_many", flask.request),
+                        **plan.inject_fields("get_many", fields),
+                    )
             else:  # pragma: no cover
                 raise pjst_exceptions.MethodNotAllowed(
                     f"Method {flask.request.method} not allowed"
                 )
         except pjst_exceptions.PjstException as exc:
-            return (
-                pjst_types.Document(errors=exc.render()).model_dump(exclude_unset=True),
-                exc.status,
-                {
-                    "Content-Type": "application/vnd.api+json",
-                },
-            )
+            return _error_response(exc)
         if not isinstance(simple_response, pjst_types.Response):
             return simple_response
-        processed_response = resource_cls._postprocess_many(simple_response)
-        processed_response.data = cast(
-            list[pjst_types.Resource], processed_response.data
+        if resource_cls.STREAM_MANY:
+            etag = resource_cls._version_etag(simple_response, context)
+            if result := resource_cls._skip_render(context, etag):
+                return _document_response(*result)
+            return _document_response(
+                200,
+                flask.stream_with_context(
+                    resource_cls._postprocess_many_stream(simple_response, context)
+                ),
+                etag,
+            )
+        return _document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_many(simple_response, context),
+            )
         )
-        if "self" not in processed_response.links:
-            processed_response.links = {
-                **processed_response.links,
-                "self": flask.request.path,
-            }
-        for obj in processed_response.data:
-            if "self" not in obj.links:
-                obj.links = {
-                    **obj.links,
-                    "self": app.url_for(f"{resource_cls.TYPE}_object", obj_id=obj.id),
-                }
-        return processed_response.model_dump(exclude_unset=True), {
-            "Content-Type": "application/vnd.api+json"
-        }
-
-    if hasdirectattr(resource_cls, "get_many"):
+
+    if "get_many" in plan.methods:
         app.add_url_rule(
             f"/{resource_cls.TYPE}",
             f"{resource_cls.TYPE}_list",
-            _many_view,
+            _timed(resource_cls, _many_view),
+            methods=["GET"],
+        )
+
+    def _create_view() -> flask.Response | tuple[str, int]:
+        try:
+            simple_response, many = resource_cls._handle_create(
+                plan, flask.request, flask.request.get_data()
+            )
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
+        if simple_response is None:
+            return "", 204
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        content, location = resource_cls._postprocess_created(
+            simple_response, many, _context(None, None)
+        )
+        return flask.Response(
+            content,
+            status=201,
+            content_type=JSONAPI_CONTENT_TYPE,
+            headers={"Location": location} if location is not None else None,
+        )
+
+    if "create_one" in plan.methods:
+        app.add_url_rule(
+            f"/{resource_cls.TYPE}",
+            f"{resource_cls.TYPE}_create",
+            _timed(resource_cls, _create_view),
+            methods=["POST"],
+        )
+
+    def _relationship_view(obj_id: str, name: str, related: bool) -> flask.Response:
+        try:
+            page = resource_cls._process_relationship(name, flask.request.args)
+            simple_response = resource_cls._handle_relationship(
+                plan, flask.request, obj_id, name, page
+            )
+        except pjst_exceptions.PjstException as exc:
+            return _error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = _context(None, None)
+        return _document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_relationship(
+                    simple_response, name, related, context
+                ),
+                store=False,
+            )
+        )
+
+    if "get_relationship" in plan.methods:
+        relationship_view = _timed(resource_cls, _relationship_view)
+        app.add_url_rule(
+            f"/{resource_cls.TYPE}/<obj_id>/relationships/<name>",
+            f"{resource_cls.TYPE}_relationship",
+            relationship_view,
+            defaults={"related": False},
+            methods=["GET"],
+        )
+        app.add_url_rule(
+            f"/{resource_cls.TYPE}/<obj_id>/<name>",
+            f"{resource_cls.TYPE}_related",
+            relationship_view,
+            defaults={"related": True},
             methods=["GET"],
         )
@@ -0,0 +1,416 @@
+"""JSON:API Atomic Operations (https://jsonapi.org/ext/atomic/).
+
+The adapters serve `/operations` next to the handlers' routes. The whole
+request is validated before anything is written; consecutive operations of the
+same kind on the same type are then run together (see
+`ResourceHandler.edit_many`), inside the handlers' `TRANSACTION`s.
+"""
+
+import asyncio
+import contextlib
+import dataclasses
+import itertools
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Iterator,
+    Literal,
+    Mapping,
+)
+
+import pydantic
+
+from . import codec as pjst_codec
+from . import exceptions as pjst_exceptions
+from . import types as pjst_types
+from .plan import HandlerPlan
+from .rendering import JSONAPI_CONTENT_TYPE, RenderContext, render_resource
+from .resource_handler import ResourceHandler, RunSync
+
+ATOMIC_EXTENSION = "https://jsonapi.org/ext/atomic"
+ATOMIC_CONTENT_TYPE = f'{JSONAPI_CONTENT_TYPE}; ext="{ATOMIC_EXTENSION}"'
+
+# `TYPE` => the handler registered for it and its plan
+Handlers = Mapping[str, tuple[type[ResourceHandler], HandlerPlan]]
+
+
+def add_handler(
+    handlers: dict[str, tuple[type[ResourceHandler], HandlerPlan]],
+    plan: HandlerPlan,
+) -> None:
+    """Add an adapter's handler; each `TYPE` can only be served by one"""
+
+    resource_cls = plan.resource_cls
+    if (other := handlers.get(resource_cls.TYPE)) is not None:
+        raise ValueError(
+            f"{resource_cls.__name__} and {other[0].__name__} have the same "
+            f"TYPE '{resource_cls.TYPE}'"
+        )
+    handlers[resource_cls.TYPE] = (resource_cls, plan)
+
+
+# The `RenderContext` to serialize a handler's results with
+ContextFactory = Callable[[type[ResourceHandler]], RenderContext]
+
+# The method that implements each operation
+_METHODS = {"add": "create_one", "update": "edit_one", "remove": "delete_one"}
+
+# The (batch, single) methods of the operations that return data
+_WRITES = {"add": ("create_many", "create_one"), "update": ("edit_many", "edit_one")}
+
+
+class OperationRef(pydantic.BaseModel):
+    type: str
+    id: str | None = None
+
+
+class Operation(pydantic.BaseModel):
+    op: Literal["add", "update", "remove"]
+    ref: OperationRef | None = None
+    data: Any = None
+
+
+class OperationsDocument(pydantic.BaseModel):
+    operations: list[Operation] = pydantic.Field(
+        alias="atomic:operations", min_length=1
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class PreparedOperation:
+    index: int
+    op: str
+    resource_cls: type[ResourceHandler]
+    plan: HandlerPlan
+    # `None` for additions without a client-generated ID
+    obj_id: str | None
+    # The validated body of an addition or update
+    obj: Any = None
+
+
+def prepare(body: bytes, handlers: Handlers) -> list[PreparedOperation]:
+    """Validate an `/operations` request body. Every problem is reported at
+    once, with a pointer to the operation it was found in."""
+
+    try:
+        document = pjst_codec.CODEC.validate_json(OperationsDocument, body)
+    except pydantic.ValidationError as exc:
+        raise pjst_exceptions.convert_pydantic_validationerror_to_pjst_badrequest(exc)
+
+    errors: list[pjst_exceptions.PjstException] = []
+    targets: list[tuple[type[ResourceHandler], HandlerPlan, str | None] | None] = []
+    # Bodies are validated per type and operation, with one call each
+    bodies: dict[tuple[str, str], list[tuple[int, Any]]] = {}
+    for index, operation in enumerate(document.operations):
+        pointer = f"/atomic:operations/{index}"
+        data = operation.data if isinstance(operation.data, dict) else {}
+        type = operation.ref.type if operation.ref is not None else data.get("type")
+        obj_id = operation.ref.id if operation.ref is not None else None
+        targets.append(None)
+        if type is None:
+            errors.append(
+                pjst_exceptions.BadRequest(
+                    "Operation needs a 'ref' or a 'data' with a type",
+                    source={"pointer": pointer},
+                )
+            )
+            continue
+        if type not in handlers:
+            errors.append(
+                pjst_exceptions.BadRequest(
+                    f"Unknown type '{type}'", source={"pointer": pointer}
+                )
+            )
+            continue
+        resource_cls, plan = handlers[type]
+        method = _METHODS.get(operation.op)
+        if method is None or method not in plan.methods:
+            errors.append(
+                pjst_exceptions.BadRequest(
+                    f"Operation '{operation.op}' is not supported for type '{type}'",
+                    source={"pointer": f"{pointer}/op"},
+                )
+            )
+            continue
+        if operation.op in ("add", "update"):
+            if not isinstance(operation.data, dict):
+                errors.append(
+                    pjst_exceptions.BadRequest(
+                        "Invalid data field", source={"pointer": f"{pointer}/data"}
+                    )
+                )
+                continue
+            if data.get("type", type) != type or (
+                obj_id is not None and data.get("id", obj_id) != obj_id
+            ):
+                errors.append(
+                    pjst_exceptions.BadRequest(
+                        "'ref' does not match 'data'", source={"pointer": pointer}
+                    )
+                )
+                continue
+            obj_id = data.get("id", obj_id)
+            if obj_id is not None:
+                # The ID may be given in `ref` only
+                data = {**data, "id": obj_id}
+            bodies.setdefault((type, operation.op), []).append((index, data))
+        if not isinstance(obj_id, str) and not (
+            operation.op == "add" and obj_id is None
+        ):
+            errors.append(
+                pjst_exceptions.BadRequest(
+                    "Missing resource id", source={"pointer": pointer}
+                )
+            )
+            continue
+        targets[index] = (resource_cls, plan, obj_id)
+
+    objs: dict[int, Any] = {}
+    for (type, op), items in bodies.items():
+        plan = handlers[type][1]
+        indexes = [index for index, _ in items]
+        try:
+            validated = (
+                plan.create_many if op == "add" else plan.body_many
+            ).validate_python([data for _, data in items])
+        except pydantic.ValidationError as exc:
+            for error in exc.errors(include_url=False):
+                position, *loc = error["loc"]
+                pointer = "/".join(
+                    (f"/atomic:operations/{indexes[position]}/data", *map(str, loc))
+                )
+                errors.append(
+                    pjst_exceptions.BadRequest(
+                        error["msg"], error["type"], {"pointer": pointer}
+                    )
+                )
+        else:
+            objs.update(zip(indexes, validated))
+
+    if errors:
+        raise pjst_exceptions.PjstExceptionMulti(*errors)
+    return [
+        PreparedOperation(
+            index=index,
+            op=operation.op,
+            resource_cls=target[0],
+            plan=target[1],
+            obj_id=target[2],
+            obj=objs.get(index),
+        )
+        for index, (operation, target) in enumerate(zip(document.operations, targets))
+        if target is not None
+    ]
+
+
+def needs_loop(operations: list[PreparedOperation]) -> bool:
+    """Whether any of the handlers has coroutine methods, so that `aexecute`
+    runs the request"""
+
+    return any(
+        operation.plan.coroutine_methods or operation.plan.async_serialize
+        for operation in operations
+    )
+
+
+async def _run_inline(func: Callable[..., Any], *args, **kwargs) -> Any:
+    return func(*args, **kwargs)
+
+
+def execute(
+    operations: list[PreparedOperation],
+    request: Any,
+    context: ContextFactory,
+    run_async: Callable[[Awaitable[Any]], Any] = asyncio.run,
+    transaction: ContextManager[Any] | None = None,
+    run_sync: RunSync | None = None,
+) -> list[pjst_types.Resource | None]:
+    """Run prepared operations in order and return their results.
+
+    If any of the handlers' methods are coroutines, the whole request is run
+    by `aexecute` in one `run_async` call, so that everything shares one
+    event loop; its sync methods go through `run_sync`, which by default
+    calls them right there, on the loop's thread. `transaction` is entered
+    around everything, before the handlers' `TRANSACTION`s."""
+
+    if needs_loop(operations):
+        with transaction if transaction is not None else contextlib.nullcontext():
+            return run_async(
+                aexecute(operations, request, context, run_sync or _run_inline)
+            )
+
+    def call(operation: PreparedOperation, method: str, *args) -> Any:
+        return getattr(operation.resource_cls, method)(
+            *args, **operation.plan.inject_request(method, request)
+        )
+
+    results: list[pjst_types.Resource | None] = []
+    with _transactions(operations, transaction):
+        for run in _runs(operations):
+            first = run[0]
+            if first.op == "remove":
+                if "delete_many" in first.plan.batch_methods:
+                    call(first, "delete_many", [item.obj_id for item in run])
+                else:
+                    for item in run:
+                        call(item, "delete_one", item.obj_id)
+                results.extend(None for _ in run)
+                continue
+            batch, single = _WRITES[first.op]
+            if batch in first.plan.batch_methods:
+                responses = _unbatch(
+                    run, batch, call(first, batch, [item.obj for item in run])
+                )
+            else:
+                responses = [call(item, single, item.obj) for item in run]
+            serialized = first.resource_cls._serialize_many(
+                _response_data(responses), context(first.resource_cls)
+            )
+            results.extend(_results(responses, serialized))
+    _invalidate(operations, results)
+    return results
+
+
+async def aexecute(
+    operations: list[PreparedOperation],
+    request: Any,
+    context: ContextFactory,
+    run_sync: RunSync = _run_inline,
+) -> list[pjst_types.Resource | None]:
+    """Async counterpart of `execute`; sync handler methods are handed to
+    `run_sync`. By default they are called right there, on the thread that
+    entered the `TRANSACTION`s, so that transactions holding thread-bound
+    resources (eg a scoped session) cover their writes too; sync writes then
+    block the loop for the request's duration, like a single-threaded server."""
+
+    async def call(operation: PreparedOperation, method: str, *args) -> Any:
+        return await operation.resource_cls._acall(
+            operation.plan,
+            method,
+            run_sync,
+            *args,
+            **operation.plan.inject_request(method, request),
+        )
+
+    results: list[pjst_types.Resource | None] = []
+    with _transactions(operations):
+        for run in _runs(operations):
+            first = run[0]
+            if first.op == "remove":
+                if "delete_many" in first.plan.batch_methods:
+                    await call(first, "delete_many", [item.obj_id for item in run])
+                else:
+                    for item in run:
+                        await call(item, "delete_one", item.obj_id)
+                results.extend(None for _ in run)
+                continue
+            batch, single = _WRITES[first.op]
+            if batch in first.plan.batch_methods:
+                responses = _unbatch(
+                    run, batch, await call(first, batch, [item.obj for item in run])
+                )
+            else:
+                responses = [await call(item, single, item.obj) for item in run]
+            data = _response_data(responses)
+            serialized = await first.resource_cls._aserialize_many(
+                data, context(first.resource_cls), run_sync
+            )
+            results.extend(_results(responses, serialized))
+    _invalidate(operations, results)
+    return results
+
+
+def render_results(results: list[pjst_types.Resource | None]) -> tuple[int, bytes]:
+    """The status and body of an `/operations` response; 204 if none of the
+    operations returned data."""
+
+    if all(result is None for result in results):
+        return 204, b""
+    return 200, b"".join(
+        (
+            b'{"atomic:results":[',
+            b",".join(
+                b"{}"
+                if result is None
+                else b'{"data":' + render_resource(result) + b"}"
+                for result in results
+            ),
+            b"]}",
+        )
+    )
+
+
+def _runs(operations: list[PreparedOperation]) -> Iterator[list[PreparedOperation]]:
+    """Consecutive operations of the same kind on the same type"""
+
+    for _, run in itertools.groupby(
+        operations, key=lambda operation: (operation.resource_cls, operation.op)
+    ):
+        yield list(run)
+
+
+@contextlib.contextmanager
+def _transactions(
+    operations: list[PreparedOperation],
+    transaction: ContextManager[Any] | None = None,
+) -> Iterator[None]:
+    factories = dict.fromkeys(
+        operation.resource_cls.TRANSACTION
+        for operation in operations
+        if operation.resource_cls.TRANSACTION is not None
+    )
+    with contextlib.ExitStack() as stack:
+        if transaction is not None:
+            stack.enter_context(transaction)
+        for factory in factories:
+            stack.enter_context(factory())
+        yield
+
+
+def _response_data(responses: list[Any]) -> list[Any]:
+    return [
+        response.data
+        for response in responses
+        if isinstance(response, pjst_types.Response)
+    ]
+
+
+def _results(
+    responses: list[Any], serialized: list[pjst_types.Resource]
+) -> Iterator[pjst_types.Resource | None]:
+    remaining = iter(serialized)
+    for response in responses:
+        yield next(remaining) if isinstance(response, pjst_types.Response) else None
+
+
+def _unbatch(run: list[PreparedOperation], method: str, returned: Any) -> list[Any]:
+    """What the single methods would have returned, from what the batch
+    method did"""
+
+    if run[0].op == "add":
+        # `create_many` returns one `Response` for all the new objects
+        returned = (
+            [pjst_types.Response.model_construct(data=obj) for obj in returned.data]
+            if isinstance(returned, pjst_types.Response)
+            and isinstance(returned.data, (list, tuple))
+            else None
+        )
+    if not isinstance(returned, (list, tuple)) or len(returned) != len(run):
+        raise pjst_exceptions.InternalServerError(
+            f"{run[0].resource_cls.__name__}.{method} did not return one result "
+            f"for each of the {len(run)} objects"
+        )
+    return list(returned)
+
+
+def _invalidate(
+    operations: list[PreparedOperation], results: list[pjst_types.Resource | None]
+) -> None:
+    # Only once everything is committed
+    for operation, result in zip(operations, results):
+        obj_id = operation.obj_id
+        if obj_id is None and result is not None:
+            obj_id = result.id
+        operation.resource_cls._invalidate(obj_id)
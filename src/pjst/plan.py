@@ -0,0 +1,424 @@
+import dataclasses
+import functools
+import inspect
+import types
+import typing
+from types import MappingProxyType
+from typing import Annotated, Any, Mapping
+
+import pydantic
+
+from . import types as pjst_types
+from .utils import find_metadata, hasdirectattr
+
+if typing.TYPE_CHECKING:
+    from .resource_handler import ResourceHandler
+
+
+_FILTER_OPERATORS = frozenset(typing.get_args(pjst_types.FilterOperator))
+
+# The methods that map to routes and operations
+_ROUTE_METHODS = (
+    "get_one",
+    "edit_one",
+    "delete_one",
+    "get_many",
+    "create_one",
+    "get_relationship",
+)
+# Optional batch versions of the write methods, for `/operations`
+BATCH_METHODS = ("create_many", "edit_many", "delete_many")
+# The methods that receive requests, and that may be coroutine functions
+_HANDLER_METHODS = _ROUTE_METHODS + BATCH_METHODS
+_SERIALIZE_METHODS = ("serialize", "serialize_many")
+_OBJECT_HTTP_METHODS = (
+    ("get_one", ("GET", "HEAD")),
+    ("edit_one", ("PATCH",)),
+    ("delete_one", ("DELETE",)),
+)
+_COLLECTION_HTTP_METHODS = (("get_many", ("GET", "HEAD")), ("create_one", ("POST",)))
+_RELATIONSHIP_HTTP_METHODS = (("get_relationship", ("GET", "HEAD")),)
+
+
+@dataclasses.dataclass(frozen=True)
+class FilterParameter:
+    name: str
+    alias: str
+    default: Any
+    metadata: pjst_types.Filter
+    operators: frozenset[str]
+    # Whether the parameter receives `Conditions` rather than a plain value
+    conditions: bool
+    # What the query string values are coerced to
+    value_type: Any
+
+    @functools.cached_property
+    def adapter(self) -> pydantic.TypeAdapter:
+        """Built on first use rather than per request"""
+
+        return pydantic.TypeAdapter(self.value_type)
+
+    def operator_alias(self, operator: str) -> str:
+        return self.alias if operator == "eq" else f"{self.alias}[{operator}]"
+
+
+@dataclasses.dataclass(frozen=True)
+class PageParameter:
+    name: str
+    metadata: pjst_types.Page
+
+
+@dataclasses.dataclass(frozen=True)
+class SortParameter:
+    name: str
+    fields: frozenset[str]
+
+
+@dataclasses.dataclass(frozen=True)
+class HandlerPlan:
+    """Everything a view needs to know about a handler's method signatures,
+    computed once when the handler is registered so that requests don't have
+    to go through `inspect` again.
+
+    The pydantic models for request bodies are only built on first use, which
+    keeps registering many handlers cheap."""
+
+    resource_cls: "type[ResourceHandler]"
+    # Of `get_one`/`edit_one`/`delete_one`/`get_many`/`create_one`/
+    # `get_relationship`, the ones that the handler defines
+    methods: frozenset[str]
+    request_parameters: Mapping[str, tuple[str, ...]]
+    coroutine_methods: frozenset[str]
+    # Collections are serialized on the event loop, see
+    # `ResourceHandler._serializes_async`
+    async_serialize: bool
+    # `create_many`/`edit_many`/`delete_many`, if the handler implements them
+    batch_methods: frozenset[str]
+    filters: tuple[FilterParameter, ...]
+    # `filter[created_at][gte]` => (created_at's parameter, "gte")
+    filter_aliases: Mapping[str, tuple[FilterParameter, str]]
+    page: PageParameter | None
+    sort: SortParameter | None
+    get_many_parameters: tuple[inspect.Parameter, ...]
+    attribute_names: frozenset[str] | None
+    fields_parameters: Mapping[str, str | None]
+
+    def inject_request(self, method: str, request: Any) -> dict[str, Any]:
+        return {key: request for key in self.request_parameters[method]}
+
+    def inject_fields(
+        self, method: str, fields: frozenset[str] | None
+    ) -> dict[str, frozenset[str] | None]:
+        if (key := self.fields_parameters[method]) is None:
+            return {}
+        return {key: fields}
+
+    @functools.cached_property
+    def object_http_methods(self) -> frozenset[str]:
+        """The HTTP methods of `/{TYPE}/{id}`, for the adapters that route
+        requests themselves"""
+
+        return frozenset(
+            http_method
+            for method, http_methods in _OBJECT_HTTP_METHODS
+            if method in self.methods
+            for http_method in http_methods
+        )
+
+    @functools.cached_property
+    def collection_http_methods(self) -> frozenset[str]:
+        """The same as `object_http_methods` for `/{TYPE}`"""
+
+        return frozenset(
+            http_method
+            for method, http_methods in _COLLECTION_HTTP_METHODS
+            if method in self.methods
+            for http_method in http_methods
+        )
+
+    @functools.cached_property
+    def relationship_http_methods(self) -> frozenset[str]:
+        """The same for `/{TYPE}/{id}/relationships/{name}` and
+        `/{TYPE}/{id}/{name}`"""
+
+        return frozenset(
+            http_method
+            for method, http_methods in _RELATIONSHIP_HTTP_METHODS
+            if method in self.methods
+            for http_method in http_methods
+        )
+
+    @functools.cached_property
+    def _edit_models(self):
+        return _body_models(self.resource_cls, "edit_one", "BodyDocument")
+
+    @functools.cached_property
+    def _create_models(self):
+        return _body_models(self.resource_cls, "create_one", "CreateDocument")
+
+    @functools.cached_property
+    def body_annotation(self) -> Any:
+        return self._edit_models[0]
+
+    @functools.cached_property
+    def body_document(self) -> type[pydantic.BaseModel]:
+        return self._edit_models[1]
+
+    @functools.cached_property
+    def body_many(self) -> pydantic.TypeAdapter:
+        """Validates the `data` of a list of `/operations` at once"""
+
+        return self._edit_models[2]
+
+    @functools.cached_property
+    def create_document(self) -> type[pydantic.BaseModel]:
+        """The same as `body_document` for `create_one`'s argument"""
+
+        return self._create_models[1]
+
+    @functools.cached_property
+    def create_many(self) -> pydantic.TypeAdapter:
+        return self._create_models[2]
+
+    @functools.cached_property
+    def create_one_or_many(self) -> type[pydantic.BaseModel]:
+        """`create_document` whose `data` may also be an array, for handlers
+        with `create_many`. `data` is tagged `one` or `many` (see
+        `_one_or_many`), so that a body is parsed and validated in one go."""
+
+        data_annotation = self.create_document.model_fields["data"].annotation
+        return pydantic.create_model(
+            f"{self.resource_cls.__name__}CreateOneOrManyDocument",
+            data=(
+                Annotated[
+                    Annotated[data_annotation, pydantic.Tag("one")]
+                    | Annotated[list[data_annotation], pydantic.Tag("many")],  # type: ignore[valid-type]
+                    pydantic.Discriminator(_one_or_many),
+                ],
+                ...,
+            ),
+        )
+
+
+def compile_plan(
+    resource_cls: "type[ResourceHandler]", request_cls: type
+) -> HandlerPlan:
+    request_parameters = {
+        method: tuple(
+            key
+            for key, value in _parameters(resource_cls, method).items()
+            if value.annotation == request_cls
+            # `get_many(cls, request)` received the request by name before
+            # annotations were used
+            or (
+                method == "get_many"
+                and key == "request"
+                and value.annotation is inspect.Parameter.empty
+            )
+        )
+        for method in _HANDLER_METHODS
+    }
+
+    coroutine_methods = frozenset(
+        method
+        for method in _HANDLER_METHODS + _SERIALIZE_METHODS
+        if inspect.iscoroutinefunction(getattr(resource_cls, method))
+    )
+
+    fields_parameters = {
+        method: next(
+            (
+                key
+                for key, value in _parameters(resource_cls, method).items()
+                if find_metadata(value.annotation, pjst_types.Fields) is not None
+            ),
+            None,
+        )
+        for method in ("get_one", "get_many")
+    }
+
+    filters = []
+    page = None
+    sort = None
+    get_many_parameters = []
+    for key, value in _parameters(resource_cls, "get_many").items():
+        if (
+            key in request_parameters["get_many"]
+            or key == fields_parameters["get_many"]
+        ):
+            continue
+        if (metadata := find_metadata(value.annotation, pjst_types.Filter)) is not None:
+            filters.append(_filter_parameter(resource_cls, key, value, metadata))
+        elif (metadata := find_metadata(value.annotation, pjst_types.Page)) is not None:
+            page = PageParameter(name=key, metadata=metadata)
+        elif (metadata := find_metadata(value.annotation, pjst_types.Sort)) is not None:
+            sort = SortParameter(name=key, fields=_sort_fields(resource_cls, metadata))
+        elif value.kind in (
+            inspect.Parameter.POSITIONAL_OR_KEYWORD,
+            inspect.Parameter.KEYWORD_ONLY,
+        ):
+            get_many_parameters.append(value)
+
+    resource_annotation = inspect.signature(resource_cls.serialize).return_annotation
+    attribute_names = None
+    if isinstance(resource_annotation, type) and issubclass(
+        resource_annotation, pjst_types.Resource
+    ):
+        attributes_annotation = resource_annotation.model_fields[
+            "attributes"
+        ].annotation
+        if isinstance(attributes_annotation, type) and issubclass(
+            attributes_annotation, pydantic.BaseModel
+        ):
+            attribute_names = frozenset(attributes_annotation.model_fields)
+
+    return HandlerPlan(
+        resource_cls=resource_cls,
+        methods=frozenset(
+            method for method in _ROUTE_METHODS if hasdirectattr(resource_cls, method)
+        ),
+        request_parameters=MappingProxyType(request_parameters),
+        coroutine_methods=coroutine_methods,
+        async_serialize=resource_cls._serializes_async(),
+        batch_methods=resource_cls._batch_methods(),
+        filters=tuple(filters),
+        filter_aliases=MappingProxyType(_filter_aliases(filters)),
+        page=page,
+        sort=sort,
+        get_many_parameters=tuple(get_many_parameters),
+        attribute_names=attribute_names,
+        fields_parameters=MappingProxyType(fields_parameters),
+    )
+
+
+def _parameters(
+    resource_cls: "type[ResourceHandler]", method: str
+) -> Mapping[str, inspect.Parameter]:
+    """The parameters of one of the handler's classmethods, without `cls`"""
+
+    attr = getattr(resource_cls, method)
+    if (func := getattr(attr, "__func__", None)) is None:  # pragma: no cover
+        return inspect.signature(attr).parameters
+    return _function_parameters(func)
+
+
+@functools.cache
+def _function_parameters(func: Any) -> Mapping[str, inspect.Parameter]:
+    # Per function, since most handlers inherit most of their methods from
+    # `ResourceHandler`
+    return MappingProxyType(dict(list(inspect.signature(func).parameters.items())[1:]))
+
+
+def _body_models(
+    resource_cls: "type[ResourceHandler]", method: str, suffix: str
+) -> tuple[Any, type[pydantic.BaseModel], pydantic.TypeAdapter]:
+    """The annotation of `method`'s `obj` parameter, a `{"data": ...}` model
+    for request bodies and an adapter for lists of `data`"""
+
+    parameters = _parameters(resource_cls, method)
+    if "obj" in parameters:
+        annotation = parameters["obj"].annotation
+    else:  # pragma: no cover
+        annotation = pjst_types.Resource
+    if isinstance(annotation, type) and issubclass(annotation, pydantic.BaseModel):
+        data_annotation = annotation
+    else:
+        data_annotation = pjst_types.Resource
+    document = pydantic.create_model(
+        f"{resource_cls.__name__}{suffix}", data=(data_annotation, ...)
+    )
+    many = pydantic.TypeAdapter(list[data_annotation])  # type: ignore[valid-type]
+    return annotation, document, many
+
+
+def _one_or_many(data: Any) -> str | None:
+    if isinstance(data, list):
+        return "many"
+    if isinstance(data, (dict, pydantic.BaseModel)):
+        return "one"
+    # Reported as an invalid `data`
+    return None
+
+
+def _sort_fields(
+    resource_cls: "type[ResourceHandler]", metadata: pjst_types.Sort
+) -> frozenset[str]:
+    fields = frozenset(metadata.fields)
+    if not fields or len(fields) != len(metadata.fields):
+        raise ValueError(
+            f"{resource_cls.__name__}.get_many: Sort() needs distinct field names"
+        )
+    for field in fields:
+        if not field or field.startswith("-") or "," in field:
+            raise ValueError(
+                f"{resource_cls.__name__}.get_many: invalid sort field {field!r}"
+            )
+    return fields
+
+
+def _filter_parameter(
+    resource_cls: "type[ResourceHandler]",
+    name: str,
+    parameter: inspect.Parameter,
+    metadata: pjst_types.Filter,
+) -> FilterParameter:
+    operators = frozenset(metadata.operators)
+    if not operators or not operators <= _FILTER_OPERATORS:
+        raise ValueError(
+            f"{resource_cls.__name__}.get_many: invalid filter operators for "
+            f"{name!r}: {', '.join(metadata.operators) or '(none)'}"
+        )
+    annotation = parameter.annotation.__origin__
+    value_type = _conditions_type(annotation)
+    if value_type is None and operators != {"eq"}:
+        raise ValueError(
+            f"{resource_cls.__name__}.get_many: {name!r} needs a Conditions[...] "
+            "annotation to support operators other than 'eq'"
+        )
+    return FilterParameter(
+        name=name,
+        alias=f"filter[{name}]",
+        default=None
+        if parameter.default is inspect.Parameter.empty
+        else parameter.default,
+        metadata=metadata,
+        operators=operators,
+        conditions=value_type is not None,
+        value_type=annotation if value_type is None else value_type,
+    )
+
+
+def _filter_aliases(
+    filters: list[FilterParameter],
+) -> dict[str, tuple[FilterParameter, str]]:
+    """`filter[name][operator]` for every operator, and `filter[name]` too for
+    `eq`"""
+
+    aliases = {}
+    for parameter in filters:
+        for operator in parameter.operators:
+            aliases[f"{parameter.alias}[{operator}]"] = (parameter, operator)
+        if "eq" in parameter.operators:
+            aliases[parameter.alias] = (parameter, "eq")
+    return aliases
+
+
+def _conditions_type(annotation: Any) -> Any:
+    """`Conditions[T] | None` => `T`, `None` if `annotation` isn't
+    `Conditions`."""
+
+    if (
+        isinstance(annotation, types.UnionType)
+        or typing.get_origin(annotation) is typing.Union
+    ):
+        members = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        if len(members) != 1:
+            return None
+        annotation = members[0]
+    if annotation is pjst_types.Conditions:
+        return Any
+    metadata = getattr(annotation, "__pydantic_generic_metadata__", None)
+    if metadata is None or metadata["origin"] is not pjst_types.Conditions:
+        return None
+    (value_type,) = metadata["args"] or (Any,)
+    return value_type
@@ -0,0 +1,85 @@
+"""Registering many resource handlers in one pass.
+
+    registry = Registry()
+
+    @registry.add
+    class ArticleResourceHandler(ResourceHandler):
+        TYPE = "articles"
+        ...
+
+    registry.flask(app)  # or `registry.fastapi(app)`,
+                         # `urlpatterns = registry.django()`,
+                         # `app = registry.asgi()`,
+                         # `application = registry.wsgi()`
+
+Each adapter sets up what its handlers share (`/operations`, link templates)
+once, instead of once per `register` call. The pydantic models for request
+bodies and filters are built on the first request that needs them, and with
+FastAPI the OpenAPI models on the first `app.openapi()` call.
+
+This module only imports the adapter of the framework it is asked for, when
+it is asked for it.
+"""
+
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from .resource_handler import ResourceHandler
+
+H = TypeVar("H", bound="type[ResourceHandler]")
+
+
+class Registry:
+    def __init__(self, resource_classes: "Iterable[type[ResourceHandler]]" = ()):
+        self._handlers: "dict[str, type[ResourceHandler]]" = {}
+        for resource_cls in resource_classes:
+            self.add(resource_cls)
+
+    def add(self, resource_cls: H) -> H:
+        """Add a handler; may be used as a class decorator"""
+
+        if (other := self._handlers.get(resource_cls.TYPE)) is not None:
+            raise ValueError(
+                f"{resource_cls.__name__} and {other.__name__} have the same "
+                f"TYPE '{resource_cls.TYPE}'"
+            )
+        self._handlers[resource_cls.TYPE] = resource_cls
+        return resource_cls
+
+    def __iter__(self) -> "Iterator[type[ResourceHandler]]":
+        return iter(self._handlers.values())
+
+    def __len__(self) -> int:
+        return len(self._handlers)
+
+    def flask(self, app: Any) -> None:
+        from .flask import register_many
+
+        register_many(app, self)
+
+    def fastapi(self, app: Any) -> None:
+        from .fastapi import register_many
+
+        register_many(app, self)
+
+    def django(self, **kwargs: Any) -> list:
+        """The URL patterns of every handler, and `/operations`, see
+        `pjst.django.register`"""
+
+        from .django import register_many
+
+        return register_many(self, **kwargs)
+
+    def asgi(self, **kwargs: Any) -> Any:
+        """A `pjst.asgi.App` serving every handler"""
+
+        from .asgi import App
+
+        return App(self, **kwargs)
+
+    def wsgi(self) -> Any:
+        """A `pjst.wsgi.App` serving every handler"""
+
+        from .wsgi import App
+
+        return App(self)
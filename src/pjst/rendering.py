@@ -0,0 +1,223 @@
+import dataclasses
+import itertools
+from typing import Any, Callable, Mapping
+from urllib.parse import quote
+
+import pydantic
+
+from . import codec as pjst_codec
+from . import exceptions as pjst_exceptions
+from . import timing as pjst_timing
+from . import types as pjst_types
+
+JSONAPI_CONTENT_TYPE = "application/vnd.api+json"
+
+# Passed as the object ID when resolving a `LinkTemplate`; URL quoting leaves it
+# untouched
+LINK_PLACEHOLDER = "pjst-obj-id"
+
+# Most errors reported in one response, see `render_errors`
+MAX_ERRORS = 100
+
+
+@dataclasses.dataclass(frozen=True)
+class LinkTemplate:
+    """An object's URL, resolved once by the adapter with `LINK_PLACEHOLDER`
+    as the ID, so that links are built by concatenation instead of going
+    through the framework's URL reversing for every object.
+
+    `safe` are the characters that the framework doesn't quote in IDs, `None`
+    if it inserts them as they are. The script prefix / mount path is passed
+    per request since it may change between requests."""
+
+    head: str
+    tail: str = ""
+    safe: str | None = None
+
+    @classmethod
+    def from_url(cls, url: str, safe: str | None = None) -> "LinkTemplate":
+        head, _, tail = url.rpartition(LINK_PLACEHOLDER)
+        return cls(head=head, tail=tail, safe=safe)
+
+    def format(self, obj_id: str, prefix: str = "") -> str:
+        if self.safe is not None:
+            obj_id = quote(obj_id, safe=self.safe)
+        return f"{prefix}{self.head}{obj_id}{self.tail}"
+
+    def bind(self, prefix: str = "") -> Callable[[str], str]:
+        head, tail, safe = prefix + self.head, self.tail, self.safe
+        if safe is None:
+            return lambda obj_id: f"{head}{obj_id}{tail}"
+        return lambda obj_id: f"{head}{quote(obj_id, safe=safe)}{tail}"
+
+
+class LinkTemplates:
+    """The `LinkTemplate`s of an adapter by `TYPE`.
+
+    `resolve(type)` returns the URL of one of `type`'s objects with
+    `LINK_PLACEHOLDER` as its ID, or `None` if there is no such route. It is
+    called once per type, on first use, so that handlers can be registered in
+    any order."""
+
+    def __init__(
+        self, resolve: Callable[[str], str | None], safe: str | None = None
+    ) -> None:
+        self._resolve = resolve
+        self._safe = safe
+        self._templates: dict[str, LinkTemplate | None] = {}
+
+    def get(self, type: str) -> LinkTemplate | None:
+        try:
+            return self._templates[type]
+        except KeyError:
+            url = self._resolve(type)
+            template = (
+                None if url is None else LinkTemplate.from_url(url, safe=self._safe)
+            )
+            self._templates[type] = template
+            return template
+
+    def object_link(self, type: str, prefix: str = "") -> Callable[[str], str | None]:
+        if (template := self.get(type)) is None:
+            return lambda obj_id: None
+        return template.bind(prefix)
+
+    def included_link(self, prefix: str = "") -> Callable[[str, str], str | None]:
+        def _included_link(type: str, obj_id: str) -> str | None:
+            if (template := self.get(type)) is None:
+                return None
+            return template.format(obj_id, prefix)
+
+        return _included_link
+
+
+@dataclasses.dataclass(frozen=True)
+class RenderContext:
+    """Per-request information the adapters pass to `ResourceHandler`'s
+    `_postprocess_*` methods."""
+
+    self_link: str
+    object_link: Callable[[str], str | None]
+    query_params: Mapping[str, str] = dataclasses.field(default_factory=dict)
+    fields: frozenset[str] | None = None
+    # Relationship paths requested with `include=...`, as a tree of names
+    include: Mapping[str, Any] | None = None
+    # `included_link(type, id)` returns the self link of an included resource
+    included_link: Callable[[str, str], str | None] | None = None
+    method: str = "GET"
+    if_none_match: str | None = None
+    # The requested object's ID, `None` for collections
+    obj_id: str | None = None
+    # What `CACHE.vary` returned for the request, part of the cache key
+    cache_vary: str = ""
+    # `CACHE.generation` when the request started, see `pjst.cache`
+    cache_generation: int | None = None
+
+
+def render_document(document: pjst_types.Document) -> bytes:
+    """Serialize a document straight to UTF-8 JSON bytes with the codec (see
+    `pjst.codec`), skipping the `model_dump` call of pydantic's own API."""
+
+    with pjst_timing.phase("render"):
+        return pjst_codec.CODEC.dump_model(
+            pjst_types.Document.__pydantic_serializer__, document
+        )
+
+
+def render_resource(resource: pjst_types.Resource) -> bytes:
+    return pjst_codec.CODEC.dump_model(
+        pjst_types.Resource.__pydantic_serializer__, resource
+    )
+
+
+def render_errors(
+    exc: pjst_exceptions.PjstException, max_errors: int | None = None
+) -> bytes:
+    """Serialize the error objects straight from `dict`s. Past `max_errors`
+    (`MAX_ERRORS` by default) the rest are left unrendered and summed up in a
+    last error."""
+
+    if max_errors is None:
+        max_errors = MAX_ERRORS
+    with pjst_timing.phase("render"):
+        errors = list(itertools.islice(exc.errors(), max_errors + 1))
+        if len(errors) > max_errors:
+            errors[max_errors:] = [
+                {
+                    "status": str(exc.status),
+                    "code": "too_many_errors",
+                    "title": "Too many errors",
+                    "detail": f"{exc.error_count() - max_errors} more errors "
+                    "were not reported",
+                }
+            ]
+        return pjst_codec.CODEC.dumps({"errors": errors})
+
+
+def restrict_attributes(attributes: Any, fields: frozenset[str]) -> Any:
+    """Keep only `fields` of a resource's attributes for sparse fieldsets.
+
+    The attributes are rebuilt with `model_construct` and a reduced fields-set,
+    so the other attributes are dropped by `exclude_unset` when rendering."""
+
+    if isinstance(attributes, pydantic.BaseModel):
+        return attributes.model_construct(
+            _fields_set=attributes.model_fields_set & fields,
+            **{
+                name: getattr(attributes, name)
+                for name in type(attributes).model_fields
+                if name in fields
+            },
+        )
+    if isinstance(attributes, dict):
+        return {key: value for key, value in attributes.items() if key in fields}
+    return attributes  # pragma: no cover
+
+
+def with_self_link(links: dict[str, str], self_link: str) -> dict[str, str]:
+    if "self" in links:
+        return links
+    return {**links, "self": self_link}
+
+
+class DocumentStream:
+    """Renders a collection document one resource at a time.
+
+    Resources are buffered into chunks of roughly `chunk_size` bytes so that
+    servers don't have to write one tiny chunk per row, while memory stays
+    bounded no matter how many resources are rendered.
+
+        >>> stream = DocumentStream({"self": "/articles"})
+        >>> chunks = [stream.start()]
+        >>> for resource in resources:
+        ...     if (chunk := stream.add(resource)) is not None:
+        ...         chunks.append(chunk)
+        >>> chunks.append(stream.end())
+    """
+
+    def __init__(self, links: dict[str, str], chunk_size: int = 64 * 1024) -> None:
+        self.links = links
+        self.chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._empty = True
+
+    def start(self) -> bytes:
+        return b'{"data":['
+
+    def add(self, resource: pjst_types.Resource) -> bytes | None:
+        if not self._empty:
+            self._buffer += b","
+        self._empty = False
+        self._buffer += render_resource(resource)
+        if len(self._buffer) < self.chunk_size:
+            return None
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+    def end(self, included: list[pjst_types.Resource] | None = None) -> bytes:
+        chunk = bytes(self._buffer) + b'],"links":' + pjst_codec.CODEC.dumps(self.links)
+        self._buffer.clear()
+        if included is not None:
+            chunk += b',"included":[' + b",".join(map(render_resource, included)) + b"]"
+        return chunk + b"}"
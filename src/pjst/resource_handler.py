@@ -1,15 +1,67 @@
+import asyncio
 import inspect
-from typing import Any, Mapping
+import itertools
+from types import MappingProxyType
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    Mapping,
+)
+from urllib.parse import urlencode
 
 import pydantic
 
+from . import codec as pjst_codec
 from . import exceptions as pjst_exceptions
+from . import timing as pjst_timing
 from . import types as pjst_types
-from .utils import find_annotations
+from .cache import CacheEntry, ResponseCache, make_key
+from .conditional import is_not_modified, strong_etag, weak_etag
+from .plan import BATCH_METHODS, FilterParameter, HandlerPlan
+from .rendering import (
+    DocumentStream,
+    RenderContext,
+    render_document,
+    restrict_attributes,
+    with_self_link,
+)
+from .utils import abatched, alist
+
+# `run_sync(func, *args, **kwargs)` runs `func` in a worker thread
+RunSync = Callable[..., Awaitable[Any]]
+
+# Request bodies larger than this are validated in a worker thread by the async
+# views
+OFFLOAD_THRESHOLD = 64 * 1024
+
+# Streamed collections are passed to `serialize_many` in batches of this size
+SERIALIZE_BATCH_SIZE = 1000
 
 
 class ResourceHandler:
     TYPE: str
+    # Emit `get_many` responses incrementally instead of building the whole
+    # document in memory; `get_many` may then return any (async) iterator.
+    STREAM_MANY: bool = False
+    # Relationships that can be requested with `include=...`. Handlers assign
+    # their own mapping; the empty default is read-only since all share it.
+    RELATIONSHIPS: Mapping[str, pjst_types.Relation] = MappingProxyType({})
+    # Cache rendered `get_one`/`get_many` documents, see `pjst.cache`. Cached
+    # documents are returned without calling the handler, so responses that
+    # depend on who makes the request need the cache's `vary`.
+    CACHE: ResponseCache | None = None
+    # Entered around the writes of an `/operations` request to this type (eg a
+    # function starting a database transaction). Handlers that share one are
+    # committed or rolled back together.
+    TRANSACTION: Callable[[], ContextManager[Any]] | None = None
+    # Time the phases of each request to this handler's routes, see
+    # `pjst.timing`
+    TIMING: pjst_timing.Timing | None = None
 
     @classmethod
     def get_one(cls, obj_id: str, *args, **kwargs) -> Any:  # pragma: no cover
@@ -32,91 +84,1180 @@ class ResourceHandler:
         raise NotImplementedError()
 
     @classmethod
-    def _handle_one(cls, request, request_body, obj_id: str) -> Any:
-        if request.method == "GET":
-            request_parameters = find_annotations(cls.get_one, type(request))
-            simple_response = cls.get_one(
-                obj_id, **{key: request for key in request_parameters}
-            )
+    def serialize_many(cls, objs: list[Any]) -> list[Any]:
+        """Serialize a whole page of objects at once.
+
+        Override this to convert collections in bulk (eg with a single
+        `TypeAdapter(list[...])` validation); by default `serialize` is called
+        for each object. May be a coroutine function."""
+
+        return [cls.serialize(obj) for obj in objs]
+
+    @classmethod
+    def load_many(cls, ids: list[str]) -> Any:  # pragma: no cover
+        """Return the objects with the given IDs, in any order, for `include`.
+        May be a coroutine function."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def get_relationship(
+        cls, obj_id: str, name: str, page: pjst_types.Cursor | None
+    ) -> Any:  # pragma: no cover
+        """The linkage of relationship `name` (one of `RELATIONSHIPS`) of
+        object `obj_id`, for `/{TYPE}/{id}/relationships/{name}` and
+        `/{TYPE}/{id}/{name}`.
+
+        Returns a `Response` whose `data` is the related object's ID, or
+        `None`, for to-one relationships. For to-many ones `page` is set and
+        `data` are the IDs on that page, with `next_cursor`/`prev_cursor` like
+        `get_many`. IDs are all it takes, so that the linkage can be read from
+        foreign key columns; the related objects are only loaded, with the
+        related handler's `load_many`, for `/{TYPE}/{id}/{name}`. May be a
+        coroutine function."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def create_one(cls, obj: Any) -> Any:  # pragma: no cover
+        """Create an object from the body of a POST to `/{TYPE}`.
+
+        Returns a `Response` with the new object, which is rendered with a 201
+        and a `Location` header, or `None` for a 204. Clients may send their
+        own IDs; check `"id" in obj.model_fields_set`."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def create_many(cls, objs: list[Any]) -> Any:  # pragma: no cover
+        """Optional batch version of `create_one`, eg for a single bulk insert.
+
+        Implementing it lets clients POST a list of resources as `data`, and
+        it is used for consecutive `add` operations in `/operations`. Returns
+        a `Response` whose `data` are the new objects, in order. May be a
+        coroutine function."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def edit_many(cls, objs: list[Any]) -> list[Any]:  # pragma: no cover
+        """Optional batch version of `edit_one` for `/operations`.
+
+        Receives the bodies of consecutive update operations on this type, eg
+        to apply them with one bulk statement, and returns what `edit_one`
+        would for each of them, in order. Without it `edit_one` is called once
+        per operation. May be a coroutine function."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def delete_many(cls, obj_ids: list[str]) -> None:  # pragma: no cover
+        """Optional batch version of `delete_one` for `/operations`, see
+        `edit_many`."""
+
+        raise NotImplementedError()
+
+    @classmethod
+    def _handle_one(
+        cls,
+        plan: HandlerPlan,
+        request,
+        request_body,
+        obj_id: str,
+        fields: frozenset[str] | None = None,
+    ) -> Any:
+        if request.method in ("GET", "HEAD"):
+            with pjst_timing.phase("handler"):
+                simple_response = cls.get_one(
+                    obj_id,
+                    **plan.inject_request("get_one", request),
+                    **plan.inject_fields("get_one", fields),
+                )
         elif request.method == "PATCH":
-            obj = cls._process_body(
-                request_body,
-                inspect.signature(cls.edit_one).parameters["obj"].annotation,
+            obj = cls._process_body(request_body, plan.body_document)
+            cls._check_body_id(obj, obj_id)
+            with pjst_timing.phase("handler"):
+                simple_response = cls.edit_one(
+                    obj, **plan.inject_request("edit_one", request)
+                )
+            cls._invalidate(obj_id)
+        elif request.method == "DELETE":
+            with pjst_timing.phase("handler"):
+                simple_response = cls.delete_one(
+                    obj_id, **plan.inject_request("delete_one", request)
+                )
+            cls._invalidate(obj_id)
+        else:  # pragma: no cover
+            raise pjst_exceptions.MethodNotAllowed(
+                f"Method {request.method} not allowed"
             )
-            if isinstance(obj, pjst_types.Resource) and obj.id != obj_id:
-                raise pjst_exceptions.BadRequest(
-                    f"ID in URL ({obj_id}) does not match ID in body ({obj.id})"
+        return simple_response
+
+    @classmethod
+    async def _ahandle_one(
+        cls,
+        plan: HandlerPlan,
+        request,
+        request_body: bytes,
+        obj_id: str,
+        run_sync: RunSync,
+        fields: frozenset[str] | None = None,
+    ) -> Any:
+        """Async counterpart of `_handle_one`. Coroutine handler methods are
+        awaited, sync ones (and the validation of large bodies) are handed to
+        `run_sync` so that they don't block the event loop."""
+
+        if request.method in ("GET", "HEAD"):
+            return await cls._acall(
+                plan,
+                "get_one",
+                run_sync,
+                obj_id,
+                **plan.inject_request("get_one", request),
+                **plan.inject_fields("get_one", fields),
+            )
+        elif request.method == "PATCH":
+            if len(request_body) > OFFLOAD_THRESHOLD:
+                obj = await run_sync(
+                    cls._process_body, request_body, plan.body_document
                 )
-            request_parameters = find_annotations(cls.edit_one, type(request))
-            simple_response = cls.edit_one(
-                obj, **{key: request for key in request_parameters}
+            else:
+                obj = cls._process_body(request_body, plan.body_document)
+            cls._check_body_id(obj, obj_id)
+            simple_response = await cls._acall(
+                plan,
+                "edit_one",
+                run_sync,
+                obj,
+                **plan.inject_request("edit_one", request),
             )
+            cls._invalidate(obj_id)
+            return simple_response
         elif request.method == "DELETE":
-            request_parameters = find_annotations(cls.delete_one, type(request))
-            simple_response = cls.delete_one(
-                obj_id, **{key: request for key in request_parameters}
+            simple_response = await cls._acall(
+                plan,
+                "delete_one",
+                run_sync,
+                obj_id,
+                **plan.inject_request("delete_one", request),
             )
+            cls._invalidate(obj_id)
+            return simple_response
         else:  # pragma: no cover
             raise pjst_exceptions.MethodNotAllowed(
                 f"Method {request.method} not allowed"
             )
-        return simple_response
+
+    @classmethod
+    def _handle_create(
+        cls, plan: HandlerPlan, request, request_body: bytes
+    ) -> tuple[Any, bool]:
+        """Returns what `create_one` or `create_many` returned, and whether it
+        was `create_many`"""
+
+        obj = cls._process_create_body(plan, request_body)
+        with pjst_timing.phase("handler"):
+            if isinstance(obj, list):
+                result = (
+                    cls.create_many(obj, **plan.inject_request("create_many", request)),
+                    True,
+                )
+            else:
+                result = (
+                    cls.create_one(obj, **plan.inject_request("create_one", request)),
+                    False,
+                )
+        # Whatever the handler returned; new objects have no entries of their
+        # own yet
+        cls._invalidate(None)
+        return result
+
+    @classmethod
+    async def _ahandle_create(
+        cls, plan: HandlerPlan, request, request_body: bytes, run_sync: RunSync
+    ) -> tuple[Any, bool]:
+        if len(request_body) > OFFLOAD_THRESHOLD:
+            obj = await run_sync(cls._process_create_body, plan, request_body)
+        else:
+            obj = cls._process_create_body(plan, request_body)
+        method = "create_many" if isinstance(obj, list) else "create_one"
+        simple_response = await cls._acall(
+            plan, method, run_sync, obj, **plan.inject_request(method, request)
+        )
+        cls._invalidate(None)
+        return simple_response, method == "create_many"
+
+    @classmethod
+    def _handle_relationship(
+        cls,
+        plan: HandlerPlan,
+        request,
+        obj_id: str,
+        name: str,
+        page: pjst_types.Cursor | None,
+    ) -> Any:
+        with pjst_timing.phase("handler"):
+            return cls.get_relationship(
+                obj_id, name, page, **plan.inject_request("get_relationship", request)
+            )
+
+    @classmethod
+    async def _ahandle_relationship(
+        cls,
+        plan: HandlerPlan,
+        request,
+        obj_id: str,
+        name: str,
+        page: pjst_types.Cursor | None,
+        run_sync: RunSync,
+    ) -> Any:
+        return await cls._acall(
+            plan,
+            "get_relationship",
+            run_sync,
+            obj_id,
+            name,
+            page,
+            **plan.inject_request("get_relationship", request),
+        )
+
+    @classmethod
+    async def _acall(
+        cls, plan: HandlerPlan, method: str, run_sync: RunSync, *args, **kwargs
+    ) -> Any:
+        func = getattr(cls, method)
+        with pjst_timing.phase("handler"):
+            if method in plan.coroutine_methods:
+                return await func(*args, **kwargs)
+            return await run_sync(func, *args, **kwargs)
+
+    @classmethod
+    def _check_body_id(cls, obj: Any, obj_id: str) -> None:
+        if isinstance(obj, pjst_types.Resource) and obj.id != obj_id:
+            raise pjst_exceptions.BadRequest(
+                f"ID in URL ({obj_id}) does not match ID in body ({obj.id})"
+            )
+
+    @classmethod
+    def _check_body_type(cls, obj: Any, pointer: str) -> None:
+        if (
+            isinstance(obj, pjst_types.Resource)
+            and "type" in obj.model_fields_set
+            and obj.type != cls.TYPE
+        ):
+            raise pjst_exceptions.Conflict(
+                f"Type in body ({obj.type}) does not match type '{cls.TYPE}'",
+                source={"pointer": pointer},
+            )
 
     @classmethod
     def _postprocess_one(
-        cls, simple_response: pjst_types.Response
-    ) -> pjst_types.Document:
-        serialized_object = cls.serialize(simple_response.data)
-        serialized_object.type = cls.TYPE
-        return pjst_types.Document(data=serialized_object, links=simple_response.links)
+        cls,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+    ) -> bytes:
+        serialized_object = cls._serialize(simple_response.data, context)
+        return render_document(
+            cls._document(
+                serialized_object,
+                with_self_link(simple_response.links, context.self_link),
+                cls._load_included([serialized_object], context),
+            )
+        )
 
     @classmethod
     def _postprocess_many(
-        cls, simple_response: pjst_types.Response
-    ) -> pjst_types.Document:
-        serialized_list = []
-        for obj in simple_response.data:
-            serialized_list.append(cls.serialize(obj))
-            serialized_list[-1].type = cls.TYPE
-        return pjst_types.Document(data=serialized_list, links=simple_response.links)
+        cls,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+    ) -> bytes:
+        serialized_list = cls._serialize_many(simple_response.data, context)
+        return render_document(
+            cls._document(
+                serialized_list,
+                cls._collection_links(simple_response, context),
+                cls._load_included(serialized_list, context),
+            )
+        )
 
     @classmethod
-    def _process_body(cls, body_raw: Any, annotation: type) -> Any:
-        try:
-            if isinstance(body_raw, (str, bytes)):
-                body = pjst_types.Document.model_validate_json(body_raw)
+    async def _apostprocess_one(
+        cls,
+        plan: HandlerPlan,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+        run_sync: RunSync,
+    ) -> bytes:
+        if "serialize" in plan.coroutine_methods:
+            with pjst_timing.phase("serialize"):
+                serialized_object = cls._finish_resource(
+                    await cls.serialize(simple_response.data), context
+                )
+        elif context.include is None:
+            return cls._postprocess_one(simple_response, context)
+        else:
+            serialized_object = await run_sync(
+                cls._serialize, simple_response.data, context
+            )
+        return render_document(
+            cls._document(
+                serialized_object,
+                with_self_link(simple_response.links, context.self_link),
+                await cls._aload_included([serialized_object], context, run_sync),
+            )
+        )
+
+    @classmethod
+    async def _apostprocess_many(
+        cls,
+        plan: HandlerPlan,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+        run_sync: RunSync,
+    ) -> bytes:
+        """Collections can be big, so serializing and rendering them happens
+        in `run_sync`; only coroutine serializers stay on the loop."""
+
+        if plan.async_serialize:
+            serialized_list = await cls._aserialize_many(
+                await alist(simple_response.data, run_sync), context, run_sync
+            )
+        elif context.include is None:
+            return await run_sync(cls._postprocess_many, simple_response, context)
+        else:
+            serialized_list = await run_sync(
+                cls._serialize_many, simple_response.data, context
+            )
+        return await run_sync(
+            render_document,
+            cls._document(
+                serialized_list,
+                cls._collection_links(simple_response, context),
+                await cls._aload_included(serialized_list, context, run_sync),
+            ),
+        )
+
+    @classmethod
+    def _postprocess_created(
+        cls, simple_response: pjst_types.Response, many: bool, context: RenderContext
+    ) -> tuple[bytes, str | None]:
+        """The body and `Location` of a 201 response"""
+
+        objs = simple_response.data if many else [simple_response.data]
+        return cls._render_created(
+            simple_response, many, cls._serialize_many(objs, context), context
+        )
+
+    @classmethod
+    async def _apostprocess_created(
+        cls,
+        plan: HandlerPlan,
+        simple_response: pjst_types.Response,
+        many: bool,
+        context: RenderContext,
+        run_sync: RunSync,
+    ) -> tuple[bytes, str | None]:
+        if not plan.async_serialize:
+            return await run_sync(
+                cls._postprocess_created, simple_response, many, context
+            )
+        objs = simple_response.data if many else [simple_response.data]
+        serialized_list = await cls._aserialize_many(
+            await alist(objs, run_sync), context, run_sync
+        )
+        return cls._render_created(simple_response, many, serialized_list, context)
+
+    @classmethod
+    def _render_created(
+        cls,
+        simple_response: pjst_types.Response,
+        many: bool,
+        serialized_list: list[pjst_types.Resource],
+        context: RenderContext,
+    ) -> tuple[bytes, str | None]:
+        if many:
+            links = with_self_link(simple_response.links, context.self_link)
+            return render_document(cls._document(serialized_list, links, None)), None
+        (serialized_object,) = serialized_list
+        location = context.object_link(serialized_object.id)
+        links = with_self_link(simple_response.links, location or context.self_link)
+        return render_document(cls._document(serialized_object, links, None)), location
+
+    @classmethod
+    def _postprocess_relationship(
+        cls,
+        simple_response: pjst_types.Response,
+        name: str,
+        related: bool,
+        context: RenderContext,
+    ) -> bytes:
+        """The linkage of `/{TYPE}/{id}/relationships/{name}`, or with
+        `related` the related resources of `/{TYPE}/{id}/{name}`"""
+
+        relation = cls.RELATIONSHIPS[name]
+        related_cls = relation.handler
+        ids = cls._relationship_ids(simple_response, relation)
+        if related:
+            resources = related_cls._load_related(ids, context)
+        else:
+            resources = [
+                pjst_types.Resource.model_construct(type=related_cls.TYPE, id=id)
+                for id in ids
+            ]
+        return cls._render_relationship(
+            simple_response, relation, related, resources, context
+        )
+
+    @classmethod
+    async def _apostprocess_relationship(
+        cls,
+        simple_response: pjst_types.Response,
+        name: str,
+        related: bool,
+        context: RenderContext,
+        run_sync: RunSync,
+    ) -> bytes:
+        relation = cls.RELATIONSHIPS[name]
+        related_cls = relation.handler
+        if not related:
+            return cls._postprocess_relationship(
+                simple_response, name, related, context
+            )
+        if not (
+            inspect.iscoroutinefunction(related_cls.load_many)
+            or related_cls._serializes_async()
+        ):
+            return await run_sync(
+                cls._postprocess_relationship, simple_response, name, related, context
+            )
+        resources = await related_cls._aload_related(
+            cls._relationship_ids(simple_response, relation), context, run_sync
+        )
+        return cls._render_relationship(
+            simple_response, relation, related, resources, context
+        )
+
+    @staticmethod
+    def _relationship_ids(
+        simple_response: pjst_types.Response, relation: pjst_types.Relation
+    ) -> list[str]:
+        data = simple_response.data
+        if not relation.many:
+            data = () if data is None else (data,)
+        return [
+            item.id if isinstance(item, pjst_types.ResourceIdentifier) else str(item)
+            for item in data
+        ]
+
+    @classmethod
+    def _render_relationship(
+        cls,
+        simple_response: pjst_types.Response,
+        relation: pjst_types.Relation,
+        related: bool,
+        resources: list[pjst_types.Resource],
+        context: RenderContext,
+    ) -> bytes:
+        if relation.many:
+            data: Any = resources
+            links = cls._collection_links(simple_response, context)
+        else:
+            data = resources[0] if resources else None
+            links = with_self_link(simple_response.links, context.self_link)
+        if not related and "related" not in links:
+            # `/{TYPE}/{id}/relationships/{name}` => `/{TYPE}/{id}/{name}`
+            head, _, name = context.self_link.rpartition("/relationships/")
+            links = {**links, "related": f"{head}/{name}"}
+        return render_document(cls._document(data, links, None))
+
+    @classmethod
+    def _postprocess_many_stream(
+        cls,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+    ) -> Iterator[bytes]:
+        stream = DocumentStream(cls._collection_links(simple_response, context))
+        linkage: list[pjst_types.Resource] = []
+        yield stream.start()
+        for batch in itertools.batched(simple_response.data, SERIALIZE_BATCH_SIZE):
+            yield from cls._stream_batch(
+                stream, cls._serialize_many(batch, context), linkage, context
+            )
+        included = cls._load_included(linkage, context)
+        with pjst_timing.phase("render"):
+            end = stream.end(included)
+        yield end
+
+    @classmethod
+    async def _postprocess_many_astream(
+        cls,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+        run_sync: RunSync,
+    ) -> AsyncIterator[bytes]:
+        stream = DocumentStream(cls._collection_links(simple_response, context))
+        linkage: list[pjst_types.Resource] = []
+        yield stream.start()
+        async for batch in abatched(
+            simple_response.data, SERIALIZE_BATCH_SIZE, run_sync
+        ):
+            for chunk in cls._stream_batch(
+                stream,
+                await cls._aserialize_many(batch, context, run_sync),
+                linkage,
+                context,
+            ):
+                yield chunk
+        included = await cls._aload_included(linkage, context, run_sync)
+        with pjst_timing.phase("render"):
+            end = stream.end(included)
+        yield end
+
+    @classmethod
+    def _stream_batch(
+        cls,
+        stream: DocumentStream,
+        serialized_list: list[pjst_types.Resource],
+        linkage: list[pjst_types.Resource],
+        context: RenderContext,
+    ) -> list[bytes]:
+        """Render a batch of resources into `stream`; returns the chunks that
+        are ready"""
+
+        if context.include is not None:
+            linkage.extend(map(cls._linkage, serialized_list))
+        with pjst_timing.phase("render"):
+            return [
+                chunk
+                for serialized_object in serialized_list
+                if (chunk := stream.add(serialized_object)) is not None
+            ]
+
+    @classmethod
+    def _conditional(
+        cls,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+        render: Callable[[], bytes],
+        store: bool = True,
+    ) -> tuple[int, bytes, str | None]:
+        """Returns the status, body and ETag of a response, honoring
+        `If-None-Match` and HEAD.
+
+        If the handler returned a `version`, the (weak) ETag is known up front
+        and `render` is skipped for 304s and HEAD requests. Otherwise the ETag
+        is a hash of the rendered document. Rendered documents are stored in
+        `CACHE`, if the handler has one and `store` is set."""
+
+        etag = cls._version_etag(simple_response, context)
+        if etag is not None and (result := cls._skip_render(context, etag)):
+            return result
+        content = render()
+        if etag is None:
+            etag = strong_etag(content)
+        if store:
+            cls._store(context, content, etag)
+        return cls._skip_render(context, etag) or (200, content, etag)
+
+    @classmethod
+    async def _aconditional(
+        cls,
+        simple_response: pjst_types.Response,
+        context: RenderContext,
+        render: Callable[[], Awaitable[bytes]],
+        store: bool = True,
+    ) -> tuple[int, bytes, str | None]:
+        etag = cls._version_etag(simple_response, context)
+        if etag is not None and (result := cls._skip_render(context, etag)):
+            return result
+        content = await render()
+        if etag is None:
+            etag = strong_etag(content)
+        if store:
+            cls._store(context, content, etag)
+        return cls._skip_render(context, etag) or (200, content, etag)
+
+    @classmethod
+    def _cached(cls, context: RenderContext) -> tuple[int, bytes, str | None] | None:
+        """The response for a GET/HEAD request from `CACHE`, if it's there"""
+
+        if cls.CACHE is None or context.method not in ("GET", "HEAD"):
+            return None
+        entry = cls.CACHE.get(
+            make_key(cls.TYPE, context.obj_id, context.query_params, context.cache_vary)
+        )
+        if entry is None:
+            return None
+        return cls._skip_render(context, entry.etag) or (
+            200,
+            entry.content,
+            entry.etag,
+        )
+
+    @classmethod
+    def _store(cls, context: RenderContext, content: bytes, etag: str) -> None:
+        if cls.CACHE is None or context.method not in ("GET", "HEAD"):
+            return
+        cls.CACHE.set(
+            make_key(
+                cls.TYPE, context.obj_id, context.query_params, context.cache_vary
+            ),
+            CacheEntry(content=content, etag=etag),
+            context.cache_generation,
+        )
+
+    @classmethod
+    def _cache_vary(cls, request: Any) -> str:
+        if cls.CACHE is None or cls.CACHE.vary is None:
+            return ""
+        return cls.CACHE.vary(request)
+
+    @classmethod
+    def _cache_generation(cls, obj_id: str | None) -> int | None:
+        if cls.CACHE is None:
+            return None
+        return cls.CACHE.generation(cls.TYPE, obj_id)
+
+    @classmethod
+    def _invalidate(cls, obj_id: str | None) -> None:
+        """Drop the cached entries of `obj_id` and of the collections; only
+        the latter if `obj_id` is `None`"""
+
+        if cls.CACHE is not None:
+            cls.CACHE.invalidate(cls.TYPE, obj_id)
+
+    @classmethod
+    def _version_etag(
+        cls, simple_response: pjst_types.Response, context: RenderContext
+    ) -> str | None:
+        if simple_response.version is None:
+            return None
+        return weak_etag(
+            simple_response.version, context.self_link, context.query_params
+        )
+
+    @staticmethod
+    def _skip_render(
+        context: RenderContext, etag: str | None
+    ) -> tuple[int, bytes, str | None] | None:
+        """The bodiless response for a 304 or a HEAD request, if this is one"""
+
+        if context.method not in ("GET", "HEAD"):
+            return None
+        if etag is not None and is_not_modified(context.if_none_match, etag):
+            return 304, b"", etag
+        if context.method == "HEAD":
+            return 200, b"", etag
+        return None
+
+    @classmethod
+    def _collection_links(
+        cls, simple_response: pjst_types.Response, context: RenderContext
+    ) -> dict[str, str]:
+        links = with_self_link(simple_response.links, context.self_link)
+        params = {
+            key: value
+            for key, value in context.query_params.items()
+            if key not in ("page[after]", "page[before]")
+        }
+        for name, key, cursor in (
+            ("next", "page[after]", simple_response.next_cursor),
+            ("prev", "page[before]", simple_response.prev_cursor),
+        ):
+            if cursor is not None and name not in links:
+                query = urlencode({**params, key: cursor}, safe="[]")
+                links = {**links, name: f"{context.self_link}?{query}"}
+        return links
+
+    @classmethod
+    def _serialize(cls, obj: Any, context: RenderContext) -> pjst_types.Resource:
+        with pjst_timing.phase("serialize"):
+            return cls._finish_resource(cls.serialize(obj), context)
+
+    @classmethod
+    def _serialize_many(
+        cls, objs: Iterable[Any], context: RenderContext
+    ) -> list[pjst_types.Resource]:
+        with pjst_timing.phase("serialize"):
+            return [
+                cls._finish_resource(serialized_object, context)
+                for serialized_object in cls.serialize_many(list(objs))
+            ]
+
+    @classmethod
+    async def _aserialize_many(
+        cls, objs: list[Any], context: RenderContext, run_sync: RunSync
+    ) -> list[pjst_types.Resource]:
+        """Coroutine serializers are awaited on the loop; sync ones get the
+        whole batch in one `run_sync` call, so that they don't block it."""
+        if not objs:
+            return []
+        if not cls._serializes_async():
+            return await run_sync(cls._serialize_many, objs, context)
+        with pjst_timing.phase("serialize"):
+            if inspect.iscoroutinefunction(cls.serialize_many):
+                serialized_list = await cls.serialize_many(objs)
             else:
-                body = pjst_types.Document.model_validate(body_raw)
-        except pydantic.ValidationError as exc:
-            raise pjst_exceptions.convert_pydantic_validationerror_to_pjst_badrequest(
-                exc
+                serialized_list = [await cls.serialize(obj) for obj in objs]
+            return [
+                cls._finish_resource(serialized_object, context)
+                for serialized_object in serialized_list
+            ]
+
+    @classmethod
+    def _batch_methods(cls) -> frozenset[str]:
+        return frozenset(
+            method
+            for method in BATCH_METHODS
+            if getattr(cls, method).__func__
+            is not getattr(ResourceHandler, method).__func__
+        )
+
+    @classmethod
+    def _serializes_async(cls) -> bool:
+        """Whether collections have to be serialized on the event loop: either
+        `serialize_many` is a coroutine function, or it is the default one and
+        `serialize` is."""
+
+        if inspect.iscoroutinefunction(cls.serialize_many):
+            return True
+        return (
+            inspect.iscoroutinefunction(cls.serialize)
+            and cls.serialize_many.__func__  # type: ignore[attr-defined]
+            is ResourceHandler.serialize_many.__func__  # type: ignore[attr-defined]
+        )
+
+    @classmethod
+    def _finish_resource(
+        cls, serialized_object: pjst_types.Resource, context: RenderContext
+    ) -> pjst_types.Resource:
+        serialized_object.type = cls.TYPE
+        links = serialized_object.links
+        if (
+            "self" not in links
+            and (self_link := context.object_link(serialized_object.id)) is not None
+        ):
+            # Completed in place; `serialize` returns a fresh `links` dict for
+            # every resource
+            links["self"] = self_link
+            serialized_object.__pydantic_fields_set__.add("links")
+        if context.fields is not None:
+            serialized_object.attributes = restrict_attributes(
+                serialized_object.attributes, context.fields
             )
-        if not isinstance(body.data, pjst_types.Resource):
-            raise pjst_exceptions.BadRequest(
-                "Invalid data field", source={"pointer": "/data"}
+        return serialized_object
+
+    @staticmethod
+    def _document(
+        data: Any, links: dict[str, str], included: list[pjst_types.Resource] | None
+    ) -> pjst_types.Document:
+        if included is None:
+            return pjst_types.Document.model_construct(data=data, links=links)
+        return pjst_types.Document.model_construct(
+            data=data, links=links, included=included
+        )
+
+    @staticmethod
+    def _linkage(resource: pjst_types.Resource) -> pjst_types.Resource:
+        """What `include` needs of a streamed resource once it was rendered"""
+
+        return pjst_types.Resource.model_construct(
+            type=resource.type, id=resource.id, relationships=resource.relationships
+        )
+
+    @classmethod
+    def _related(
+        cls, resources: list[pjst_types.Resource], name: str
+    ) -> tuple[type["ResourceHandler"], list[str]]:
+        """The handler of relationship `name` and the unique IDs that
+        `resources` link to through it, in order of appearance."""
+
+        related_cls = cls.RELATIONSHIPS[name].handler
+        ids: dict[str, None] = {}
+        for resource in resources:
+            relationship = resource.relationships.get(name)
+            if relationship is None or relationship.data is None:
+                continue
+            if isinstance(relationship.data, list):
+                ids.update(dict.fromkeys(item.id for item in relationship.data))
+            else:
+                ids[relationship.data.id] = None
+        return related_cls, list(ids)
+
+    @classmethod
+    def _related_context(cls, context: RenderContext) -> RenderContext:
+        fields = context.query_params.get(f"fields[{cls.TYPE}]")
+        return RenderContext(
+            self_link=context.self_link,
+            object_link=lambda obj_id: (
+                context.included_link(cls.TYPE, obj_id)
+                if context.included_link is not None
+                else None
+            ),
+            query_params=context.query_params,
+            fields=(
+                frozenset(field for field in fields.split(",") if field)
+                if fields is not None
+                else None
+            ),
+        )
+
+    @classmethod
+    def _load_related(
+        cls, ids: list[str], context: RenderContext
+    ) -> list[pjst_types.Resource]:
+        """The resources with `ids`, in that order, for `/{TYPE}/{id}/{name}`
+        of a relationship to this handler; missing ones are left out"""
+
+        if not ids:
+            return []
+        with pjst_timing.phase("handler"):
+            objs = cls.load_many(ids)
+        resources = {
+            resource.id: resource
+            for resource in cls._serialize_many(objs, cls._related_context(context))
+        }
+        return [resources[id] for id in ids if id in resources]
+
+    @classmethod
+    async def _aload_related(
+        cls, ids: list[str], context: RenderContext, run_sync: RunSync
+    ) -> list[pjst_types.Resource]:
+        if not ids:
+            return []
+        with pjst_timing.phase("handler"):
+            if inspect.iscoroutinefunction(cls.load_many):
+                objs = await cls.load_many(ids)
+            else:
+                objs = await run_sync(lambda: list(cls.load_many(ids)))
+        resources = {
+            resource.id: resource
+            for resource in await cls._aserialize_many(
+                await alist(objs, run_sync),
+                cls._related_context(context),
+                run_sync,
             )
-        if issubclass(annotation, pydantic.BaseModel):
-            try:
-                return annotation.model_validate(
-                    body.data.model_dump(exclude_unset=True)
+        }
+        return [resources[id] for id in ids if id in resources]
+
+    @classmethod
+    def _load_included(
+        cls, resources: list[pjst_types.Resource], context: RenderContext
+    ) -> list[pjst_types.Resource] | None:
+        """Resolve `context.include` for `resources`.
+
+        Each relationship path is loaded with a single `load_many` call per
+        level, with the IDs of all resources on that level. Resources already
+        in the document (primary or included) are never loaded twice."""
+
+        if context.include is None:
+            return None
+        pool = {(resource.type, resource.id): resource for resource in resources}
+        primary = set(pool)
+        cls._include_level(resources, context.include, context, pool)
+        return [resource for key, resource in pool.items() if key not in primary]
+
+    @classmethod
+    def _include_level(
+        cls,
+        resources: list[pjst_types.Resource],
+        include: Mapping[str, Any],
+        context: RenderContext,
+        pool: dict[tuple[str, str], pjst_types.Resource],
+    ) -> None:
+        for name, subtree in include.items():
+            related_cls, ids = cls._related(resources, name)
+            if missing := [id for id in ids if (related_cls.TYPE, id) not in pool]:
+                with pjst_timing.phase("handler"):
+                    objs = related_cls.load_many(missing)
+                for resource in related_cls._serialize_many(
+                    objs, related_cls._related_context(context)
+                ):
+                    pool[(resource.type, resource.id)] = resource
+            if subtree:
+                related_cls._include_level(
+                    cls._pooled(related_cls, ids, pool), subtree, context, pool
+                )
+
+    @classmethod
+    async def _aload_included(
+        cls,
+        resources: list[pjst_types.Resource],
+        context: RenderContext,
+        run_sync: RunSync,
+    ) -> list[pjst_types.Resource] | None:
+        """Async counterpart of `_load_included`; independent relationship
+        paths are loaded concurrently."""
+
+        if context.include is None:
+            return None
+        pool = {(resource.type, resource.id): resource for resource in resources}
+        primary = set(pool)
+        await cls._ainclude_level(resources, context.include, context, pool, run_sync)
+        return [resource for key, resource in pool.items() if key not in primary]
+
+    @classmethod
+    async def _ainclude_level(
+        cls,
+        resources: list[pjst_types.Resource],
+        include: Mapping[str, Any],
+        context: RenderContext,
+        pool: dict[tuple[str, str], pjst_types.Resource],
+        run_sync: RunSync,
+    ) -> None:
+        async def _include(name: str, subtree: Mapping[str, Any]) -> None:
+            related_cls, ids = cls._related(resources, name)
+            if missing := [id for id in ids if (related_cls.TYPE, id) not in pool]:
+                with pjst_timing.phase("handler"):
+                    if inspect.iscoroutinefunction(related_cls.load_many):
+                        objs = await related_cls.load_many(missing)
+                    else:
+                        objs = await run_sync(
+                            lambda: list(related_cls.load_many(missing))
+                        )
+                for resource in await related_cls._aserialize_many(
+                    await alist(objs, run_sync),
+                    related_cls._related_context(context),
+                    run_sync,
+                ):
+                    pool[(resource.type, resource.id)] = resource
+            if subtree:
+                await related_cls._ainclude_level(
+                    cls._pooled(related_cls, ids, pool),
+                    subtree,
+                    context,
+                    pool,
+                    run_sync,
                 )
+
+        await asyncio.gather(*(_include(*item) for item in include.items()))
+
+    @staticmethod
+    def _pooled(
+        related_cls: type["ResourceHandler"],
+        ids: list[str],
+        pool: dict[tuple[str, str], pjst_types.Resource],
+    ) -> list[pjst_types.Resource]:
+        return [
+            pool[(related_cls.TYPE, id)] for id in ids if (related_cls.TYPE, id) in pool
+        ]
+
+    @classmethod
+    def _process_body(
+        cls,
+        body_raw: Any,
+        body_document: type[pydantic.BaseModel],
+        tagged: bool = False,
+    ) -> Any:
+        """Validate the request body straight into the handler's resource type.
+
+        `body_document` is a `{"data": <annotation>}` model (see
+        `HandlerPlan.body_document`), so raw bytes go through pydantic-core
+        once instead of being validated into a generic `Document` first. If
+        `data` is a `tagged` union (`HandlerPlan.create_one_or_many`), the tag
+        is left out of error pointers too.
+        """
+
+        with pjst_timing.phase("body"):
+            try:
+                if isinstance(body_raw, (str, bytes)):
+                    body = pjst_codec.CODEC.validate_json(body_document, body_raw)
+                else:
+                    body = body_document.model_validate(body_raw)
             except pydantic.ValidationError as exc:
+                errors = exc.errors(include_url=False)
+                if any(error["loc"] == ("data",) for error in errors):
+                    raise pjst_exceptions.BadRequest(
+                        "Invalid data field", source={"pointer": "/data"}
+                    )
                 raise pjst_exceptions.convert_pydantic_validationerror_to_pjst_badrequest(
-                    exc
+                    exc, strip_prefix=errors[0]["loc"][:2] if tagged else ("data",)
                 )
-        else:  # pragma: no cover
-            return body.data
-
-    @classmethod
-    def _process_filters(cls, query_params: Mapping[str, str]) -> dict[str, str]:
-        signature = inspect.signature(cls.get_many)
-        kwargs = {}
-        for key, value in signature.parameters.items():
-            if (
-                hasattr(value.annotation, "__origin__")
-                and hasattr(value.annotation, "__metadata__")
-                and len(value.annotation.__metadata__) == 1
-                and isinstance(value.annotation.__metadata__[0], pjst_types.Filter)
+            return body.data  # type: ignore[attr-defined]
+
+    @classmethod
+    def _process_create_body(cls, plan: HandlerPlan, body_raw: bytes) -> Any:
+        """The resource to create, or a list of them if `data` is an array and
+        the handler implements `create_many`"""
+
+        if "create_many" not in plan.batch_methods:
+            obj = cls._process_body(body_raw, plan.create_document)
+            cls._check_body_type(obj, "/data/type")
+            return obj
+        obj = cls._process_body(body_raw, plan.create_one_or_many, tagged=True)
+        if isinstance(obj, list):
+            for index, item in enumerate(obj):
+                cls._check_body_type(item, f"/data/{index}/type")
+        else:
+            cls._check_body_type(obj, "/data/type")
+        return obj
+
+    @classmethod
+    def _process_filters(
+        cls, plan: HandlerPlan, query_params: Mapping[str, str]
+    ) -> dict[str, Any]:
+        with pjst_timing.phase("query"):
+            kwargs: dict[str, Any] = {
+                parameter.name: parameter.default for parameter in plan.filters
+            }
+            conditions: dict[str, dict[str, Any]] = {}
+            for key in query_params:
+                if not key.startswith("filter["):
+                    continue
+                if (match := plan.filter_aliases.get(key)) is None:
+                    name = key[len("filter[") :].partition("]")[0]
+                    if any(parameter.name == name for parameter in plan.filters):
+                        raise pjst_exceptions.BadRequest(
+                            f"Unsupported filter '{key}' for type '{cls.TYPE}'",
+                            source={"parameter": key},
+                        )
+                    continue
+                parameter, operator = match
+                value = cls._coerce_filter(parameter, operator, key, query_params[key])
+                if parameter.conditions:
+                    conditions.setdefault(parameter.name, {})[
+                        "in_" if operator == "in" else operator
+                    ] = value
+                else:
+                    kwargs[parameter.name] = value
+            for name, values in conditions.items():
+                kwargs[name] = pjst_types.Conditions.model_construct(**values)
+            kwargs.update(cls._process_page(plan, query_params))
+            kwargs.update(cls._process_sort(plan, query_params))
+            return kwargs
+
+    @staticmethod
+    def _coerce_filter(
+        parameter: FilterParameter, operator: str, key: str, value: str
+    ) -> Any:
+        if operator == "prefix":
+            return value
+        try:
+            if operator == "in":
+                return tuple(
+                    parameter.adapter.validate_strings(item)
+                    for item in value.split(",")
+                )
+            return parameter.adapter.validate_strings(value)
+        except pydantic.ValidationError:
+            raise pjst_exceptions.BadRequest(
+                f"Invalid value for '{key}'", source={"parameter": key}
+            )
+
+    @classmethod
+    def _process_sort(
+        cls, plan: HandlerPlan, query_params: Mapping[str, str]
+    ) -> dict[str, list[pjst_types.SortField] | None]:
+        value = query_params.get("sort")
+        if plan.sort is None:
+            if value is not None:
+                raise pjst_exceptions.BadRequest(
+                    f"Sorting is not supported for type '{cls.TYPE}'",
+                    source={"parameter": "sort"},
+                )
+            return {}
+        if value is None:
+            return {plan.sort.name: None}
+        sort = [
+            pjst_types.SortField(field=item[1:], direction="desc")
+            if item.startswith("-")
+            else pjst_types.SortField(field=item)
+            for item in value.split(",")
+            if item
+        ]
+        if unknown := [
+            item.field for item in sort if item.field not in plan.sort.fields
+        ]:
+            raise pjst_exceptions.BadRequest(
+                f"Unknown sort fields for type '{cls.TYPE}': {', '.join(unknown)}",
+                source={"parameter": "sort"},
+            )
+        return {plan.sort.name: sort}
+
+    @classmethod
+    def _process_include(cls, query_params: Mapping[str, str]) -> dict[str, Any] | None:
+        """Parse `include=author,comments.author` into a tree of relationship
+        names, `{"author": {}, "comments": {"author": {}}}`."""
+
+        with pjst_timing.phase("query"):
+            if (value := query_params.get("include")) is None:
+                return None
+            tree: dict[str, Any] = {}
+            for path in value.split(","):
+                if not path:
+                    continue
+                handler, node = cls, tree
+                for name in path.split("."):
+                    if name not in handler.RELATIONSHIPS:
+                        raise pjst_exceptions.BadRequest(
+                            f"Unknown relationship path '{path}'",
+                            source={"parameter": "include"},
+                        )
+                    handler = handler.RELATIONSHIPS[name].handler
+                    node = node.setdefault(name, {})
+            return tree
+
+    @classmethod
+    def _process_fields(
+        cls, plan: HandlerPlan, query_params: Mapping[str, str]
+    ) -> frozenset[str] | None:
+        with pjst_timing.phase("query"):
+            key = f"fields[{cls.TYPE}]"
+            if (value := query_params.get(key)) is None:
+                return None
+            fields = frozenset(field for field in value.split(",") if field)
+            if plan.attribute_names is not None and (
+                unknown := fields - plan.attribute_names
             ):
-                kwargs[key] = query_params.get(f"filter[{key}]")
-        return kwargs
+                raise pjst_exceptions.BadRequest(
+                    f"Unknown fields for type '{cls.TYPE}': {', '.join(sorted(unknown))}",
+                    source={"parameter": key},
+                )
+            return fields
+
+    @classmethod
+    def _process_page(
+        cls, plan: HandlerPlan, query_params: Mapping[str, str]
+    ) -> dict[str, pjst_types.Cursor]:
+        if plan.page is None:
+            return {}
+        return {plan.page.name: cls._parse_page(plan.page.metadata, query_params)}
+
+    @staticmethod
+    def _parse_page(
+        metadata: pjst_types.Page, query_params: Mapping[str, str]
+    ) -> pjst_types.Cursor:
+        size: Any = query_params.get("page[size]")
+        if size is None:
+            size = metadata.default_size
+        else:
+            try:
+                size = int(size)
+            except ValueError:
+                size = 0
+            if not 1 <= size <= metadata.max_size:
+                raise pjst_exceptions.BadRequest(
+                    f"Page size must be an integer between 1 and {metadata.max_size}",
+                    source={"parameter": "page[size]"},
+                )
+        after = query_params.get("page[after]")
+        before = query_params.get("page[before]")
+        if after is not None and before is not None:
+            raise pjst_exceptions.BadRequest(
+                "Only one of 'page[after]' and 'page[before]' may be set",
+                source={"parameter": "page[before]"},
+            )
+        return pjst_types.Cursor(size=size, after=after, before=before)
+
+    @classmethod
+    def _process_relationship(
+        cls, name: str, query_params: Mapping[str, str]
+    ) -> pjst_types.Cursor | None:
+        """The page of linkage requested of relationship `name`, `None` for
+        to-one relationships"""
+
+        if (relation := cls.RELATIONSHIPS.get(name)) is None:
+            raise pjst_exceptions.NotFound(f"'{cls.TYPE}' has no relationship '{name}'")
+        if not relation.many:
+            return None
+        return cls._parse_page(relation.page, query_params)
@@ -0,0 +1,135 @@
+"""Routing and responses of the adapters that route requests themselves,
+`pjst.asgi` and `pjst.wsgi`; they only add the reading and sending of
+requests and responses, sync or async."""
+
+import dataclasses
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Literal
+
+from . import exceptions as pjst_exceptions
+from .rendering import JSONAPI_CONTENT_TYPE, render_errors
+
+if TYPE_CHECKING:
+    from .operations import Handlers
+    from .plan import HandlerPlan
+    from .resource_handler import ResourceHandler
+    from .timing import Timer
+
+# What werkzeug's default converter leaves unquoted, so that links are the
+# same as `pjst.flask`'s
+SAFE = "!$&'()*+,/:;=@"
+
+
+@dataclasses.dataclass(frozen=True)
+class Route:
+    view: Literal["one", "many", "create", "relationship", "operations"]
+    # `None` for `/operations`
+    resource_cls: "type[ResourceHandler] | None" = None
+    plan: "HandlerPlan | None" = None
+    obj_id: str = ""
+    # The relationship's
+    name: str | None = None
+    related: bool = False
+
+
+class MethodNotAllowed(pjst_exceptions.MethodNotAllowed):
+    def __init__(self, method: str, allowed: Iterable[str]) -> None:
+        super().__init__(f"Method {method} not allowed")
+        # The value of the `Allow` header
+        self.allow = ", ".join(sorted(allowed))
+
+
+_OPERATIONS = Route("operations")
+
+
+def _object_route(path: str) -> tuple[str, str | None, bool] | None:
+    """The object ID, relationship name and whether the related resources are
+    requested, of the part of a path after `/{TYPE}/`: `{id}`,
+    `{id}/relationships/{name}` or `{id}/{name}`"""
+
+    segments = path.split("/")
+    if not all(segments):
+        return None
+    if len(segments) == 1:
+        return segments[0], None, False
+    if len(segments) == 2:
+        return segments[0], segments[1], True
+    if len(segments) == 3 and segments[1] == "relationships":
+        return segments[0], segments[2], False
+    return None
+
+
+def match(handlers: "Handlers", method: str, path: str) -> Route:
+    """The route of a request to `path`, without the prefix the app is
+    mounted at. Raises `NotFound`, or `MethodNotAllowed` with the methods the
+    path allows."""
+
+    type, is_object, rest = path[1:].partition("/")
+    if type == "operations" and not is_object:
+        if method != "POST":
+            raise MethodNotAllowed(method, ("POST",))
+        return _OPERATIONS
+    handler = handlers.get(type)
+    route = _object_route(rest) if is_object else ("", None, False)
+    if (
+        handler is None
+        or route is None
+        or (route[1] is not None and not handler[1].relationship_http_methods)
+    ):
+        raise pjst_exceptions.NotFound(f"No resource at '{path}'")
+    resource_cls, plan = handler
+    obj_id, name, related = route
+    view: Literal["one", "many", "create", "relationship"]
+    if name is not None:
+        methods, view = plan.relationship_http_methods, "relationship"
+    elif is_object:
+        methods, view = plan.object_http_methods, "one"
+    else:
+        methods = plan.collection_http_methods
+        view = "create" if method == "POST" else "many"
+    if method not in methods:
+        raise MethodNotAllowed(method, methods)
+    return Route(view, resource_cls, plan, obj_id, name, related)
+
+
+@dataclasses.dataclass
+class Response:
+    status: int
+    # Or an iterable of them (async for `pjst.asgi`) for `STREAM_MANY`
+    body: Any = b""
+    content_type: str | None = JSONAPI_CONTENT_TYPE
+    headers: list[tuple[str, str]] = dataclasses.field(default_factory=list)
+
+
+def document_response(status: int, content: Any, etag: str | None) -> Response:
+    return Response(
+        status, content, headers=[("ETag", etag)] if etag is not None else []
+    )
+
+
+def error_response(exc: pjst_exceptions.PjstException) -> Response:
+    headers = []
+    if isinstance(exc, MethodNotAllowed):
+        headers.append(("Allow", exc.allow))
+    return Response(exc.status, render_errors(exc), headers=headers)
+
+
+def finish_timer(
+    timer: "Timer",
+    method: str,
+    response: Any,
+    stream: Callable[[Any, str, int], Any],
+) -> Any:
+    """`response` of a view timed by `timer`; `timer` finishes once the body
+    is sent, which `stream` (`Timer.stream` or `Timer.astream`) times for
+    `STREAM_MANY`"""
+
+    if not isinstance(response, Response):
+        timer.finish(method, 200, None)
+        return response
+    if (header := timer.server_timing()) is not None:
+        response.headers.append(("Server-Timing", header))
+    if isinstance(response.body, bytes):
+        timer.finish(method, response.status, len(response.body))
+    else:
+        response.body = stream(response.body, method, response.status)
+    return response
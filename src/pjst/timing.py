@@ -0,0 +1,186 @@
+"""Per-phase timing of requests, see `ResourceHandler.TIMING`.
+
+    class ArticleResourceHandler(ResourceHandler):
+        TYPE = "articles"
+        TIMING = Timing(callback=metrics.record, server_timing=True)
+
+Every request to the handler's routes is then split into phases:
+
+- `body`: parsing and validating the request body
+- `query`: `fields`, `include`, `filter`, `page` and `sort`
+- `handler`: the handler's methods (`get_one`, `get_many`, `edit_one`,
+  `load_many` for `include`, ...)
+- `serialize`: `serialize`/`serialize_many`, and completing the resources
+  (self links, sparse fieldsets)
+- `render`: turning documents into JSON
+
+Once the response is complete `callback` receives a `Measurement`. The time of
+a phase is the sum of all the times it ran, so with `include` on async
+handlers, where relationships are loaded concurrently, phases can add up to
+more than the total. `server_timing` adds the phases to a `Server-Timing`
+header; for streamed collections it only has the phases before the first
+byte.
+
+Handlers without `TIMING` aren't wrapped at all, and the phases cost a
+`ContextVar` lookup each.
+"""
+
+import dataclasses
+import time
+from contextvars import ContextVar
+from types import MappingProxyType
+from typing import (
+    TYPE_CHECKING,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    ContextManager,
+    Iterable,
+    Iterator,
+    Mapping,
+)
+
+if TYPE_CHECKING:
+    from .resource_handler import ResourceHandler
+
+
+@dataclasses.dataclass(frozen=True)
+class Measurement:
+    type: str
+    method: str
+    status: int
+    # Seconds spent in each phase that ran
+    phases: Mapping[str, float]
+    total: float
+    # `None` if the handler returned a framework response of its own
+    response_bytes: int | None
+
+
+class Timing:
+    def __init__(
+        self,
+        callback: Callable[[Measurement], None] | None = None,
+        server_timing: bool = False,
+    ) -> None:
+        self.callback = callback
+        self.server_timing = server_timing
+
+
+class Timer:
+    """The phases of one request. It is the current one (the one `phase`
+    adds to) from its creation until `detach`, and while a streamed response
+    is being produced."""
+
+    def __init__(self, resource_cls: "type[ResourceHandler]") -> None:
+        self.timing: Timing = resource_cls.TIMING  # type: ignore[assignment]
+        self.type = resource_cls.TYPE
+        self.phases: dict[str, float] = {}
+        self.start = time.perf_counter()
+        self._token = _current.set(self)
+
+    def detach(self) -> None:
+        _current.reset(self._token)
+
+    def server_timing(self) -> str | None:
+        if not self.timing.server_timing:
+            return None
+        total = time.perf_counter() - self.start
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.3f}"
+            for name, seconds in (*self.phases.items(), ("total", total))
+        )
+
+    def finish(self, method: str, status: int, response_bytes: int | None) -> None:
+        if self.timing.callback is None:
+            return
+        self.timing.callback(
+            Measurement(
+                type=self.type,
+                method=method,
+                status=status,
+                phases=MappingProxyType(self.phases),
+                total=time.perf_counter() - self.start,
+                response_bytes=response_bytes,
+            )
+        )
+
+    def stream(
+        self, chunks: Iterable[bytes], method: str, status: int
+    ) -> Iterator[bytes]:
+        """Pass `chunks` on, timing their production; finishes once they are
+        exhausted"""
+
+        response_bytes = 0
+        iterator = iter(chunks)
+        try:
+            while True:
+                token = _current.set(self)
+                try:
+                    chunk = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                response_bytes += len(chunk)
+                yield chunk
+        finally:
+            self.finish(method, status, response_bytes)
+
+    async def astream(
+        self, chunks: AsyncIterable[bytes], method: str, status: int
+    ) -> AsyncIterator[bytes]:
+        response_bytes = 0
+        iterator = aiter(chunks)
+        try:
+            while True:
+                token = _current.set(self)
+                try:
+                    chunk = await anext(iterator)
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current.reset(token)
+                response_bytes += len(chunk)
+                yield chunk
+        finally:
+            self.finish(method, status, response_bytes)
+
+
+class _Phase:
+    __slots__ = ("timer", "name", "start")
+
+    def __init__(self, timer: Timer, name: str) -> None:
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        phases = self.timer.phases
+        phases[self.name] = (
+            phases.get(self.name, 0.0) + time.perf_counter() - self.start
+        )
+
+
+class _NoPhase:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_current: ContextVar[Timer | None] = ContextVar("pjst_timer", default=None)
+_NO_PHASE = _NoPhase()
+
+
+def phase(name: str) -> ContextManager[None]:
+    """Add the time spent in the block to `name`, if the current request is
+    timed"""
+
+    if (timer := _current.get()) is None:
+        return _NO_PHASE
+    return _Phase(timer, name)
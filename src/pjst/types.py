@@ -1,7 +1,14 @@
-from typing import Any
+from typing import TYPE_CHECKING, Any, Generic, Iterable, Literal, TypeVar
 
 import pydantic
 
+if TYPE_CHECKING:
+    from .resource_handler import ResourceHandler
+
+T = TypeVar("T")
+
+FilterOperator = Literal["eq", "in", "lt", "lte", "gt", "gte", "prefix"]
+
 
 class ResourceIdentifier(pydantic.BaseModel):
     type: str = pydantic.Field(default="", examples=["type"])
@@ -44,13 +51,130 @@ class Document(pydantic.BaseModel):
     data: Resource | list[Resource] | None = None
     errors: list[Error] | None = None
     links: dict[str, str] = pydantic.Field(default_factory=dict)
+    included: list[Resource] | None = None
 
 
 class Response(pydantic.BaseModel):
     data: Any
     links: dict[str, str] = pydantic.Field(default_factory=dict)
+    next_cursor: str | None = None
+    prev_cursor: str | None = None
+    # Changes whenever the data changes (eg `updated_at`); if set, the ETag is
+    # derived from it instead of from the rendered document
+    version: Any = None
 
 
 class Filter:
-    def __init__(self, **kwargs: Any) -> None:
+    """Marks a `get_many` parameter that receives `filter[NAME]=...`.
+
+    With the default `operators=("eq",)` the parameter receives the value
+    coerced to its annotation. Other operators need the parameter to be
+    annotated with `Conditions[T]`, which collects everything requested for it:
+
+        created_at: Annotated[
+            Conditions[datetime] | None, Filter(operators=("gte", "lt"))
+        ] = None
+
+    `filter[created_at][gte]=2024-01-01` then arrives as
+    `Conditions(gte=datetime(2024, 1, 1))`. `kwargs` are passed on to
+    `fastapi.Query` (eg `description`).
+    """
+
+    def __init__(
+        self, operators: Iterable[FilterOperator] = ("eq",), **kwargs: Any
+    ) -> None:
+        self.operators = tuple(operators)
         self.kwargs = kwargs
+
+
+class Conditions(pydantic.BaseModel, Generic[T]):
+    """What a `Filter(operators=...)` parameter receives. Only the operators
+    the client used are set; `in_` holds the items of the comma-separated
+    `filter[NAME][in]=a,b` list and `prefix` is never coerced."""
+
+    model_config = pydantic.ConfigDict(frozen=True)
+
+    eq: T | None = None
+    in_: tuple[T, ...] | None = None
+    lt: T | None = None
+    lte: T | None = None
+    gt: T | None = None
+    gte: T | None = None
+    prefix: str | None = None
+
+
+class Relation:
+    """Declares a relationship in `ResourceHandler.RELATIONSHIPS`.
+
+    `handler` is the related `ResourceHandler` class, which loads the related
+    objects for `include=...` and `/{TYPE}/{id}/{name}` with its `load_many`
+    method; handlers that refer to each other set `RELATIONSHIPS` once both
+    classes exist. The linkage of to-many relationships at
+    `/{TYPE}/{id}/relationships/{name}` is paginated according to `page`.
+    """
+
+    def __init__(
+        self,
+        handler: "type[ResourceHandler]",
+        many: bool = False,
+        page: "Page | None" = None,
+    ) -> None:
+        if not isinstance(handler, type):
+            raise TypeError(
+                f"Relation takes the related ResourceHandler class, got {handler!r}"
+            )
+        self.handler = handler
+        self.many = many
+        self.page = page if page is not None else Page()
+
+
+class Fields:
+    """Marks a `get_one`/`get_many` parameter that receives the attribute names
+    requested with `fields[TYPE]=...`, or `None` if all attributes were
+    requested."""
+
+
+class Page:
+    def __init__(self, max_size: int = 100, default_size: int = 20) -> None:
+        self.max_size = max_size
+        self.default_size = default_size
+
+
+class Cursor(pydantic.BaseModel):
+    """What a `get_many` parameter annotated with `Page()` receives.
+
+    `after` and `before` are the opaque cursors the handler previously
+    returned as `Response.next_cursor` and `Response.prev_cursor`.
+    """
+
+    model_config = pydantic.ConfigDict(frozen=True)
+
+    size: int
+    after: str | None = None
+    before: str | None = None
+
+
+class Sort:
+    """Marks a `get_many` parameter that receives the requested `sort=...`
+    as a list of `SortField`s, or `None` if no sort was requested. `fields` are
+    the ones clients may sort by; others are rejected with a 400.
+
+        sort: Annotated[list[SortField] | None, Sort("title", "created_at")] = None
+    """
+
+    def __init__(self, *fields: str) -> None:
+        self.fields = fields
+
+
+class SortField(pydantic.BaseModel):
+    """`sort=-created_at,title` => `[SortField(field="created_at",
+    direction="desc"), SortField(field="title", direction="asc")]`"""
+
+    model_config = pydantic.ConfigDict(frozen=True)
+
+    field: str
+    direction: Literal["asc", "desc"] = "asc"
+
+    @property
+    def descending(self) -> bool:
+        return self.direction == "desc"
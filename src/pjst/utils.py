@@ -1,5 +1,15 @@
 import inspect
+import itertools
 import typing
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+)
 
 if typing.TYPE_CHECKING:
     from pjst.resource_handler import ResourceHandler
@@ -15,7 +25,60 @@ def hasdirectattr(cls: "type[ResourceHandler]", method: str) -> bool:
 
 
 def find_annotations(func, cls):
+    """The names of `func`'s parameters annotated with `cls`"""
+
     signature = inspect.signature(func)
     return [
         key for key, value in signature.parameters.items() if value.annotation == cls
     ]
+
+
+def find_metadata(annotation, metadata_cls):
+    """`Annotated[str, Filter()]` => `Filter()`"""
+
+    if (
+        hasattr(annotation, "__origin__")
+        and hasattr(annotation, "__metadata__")
+        and len(annotation.__metadata__) == 1
+        and isinstance(annotation.__metadata__[0], metadata_cls)
+    ):
+        return annotation.__metadata__[0]
+    return None
+
+
+async def alist(
+    iterable: Iterable | AsyncIterable, run_sync: Callable[..., Awaitable[Any]]
+) -> list[Any]:
+    """Sync iterables can be lazy ORM cursors that hit the database as they're
+    consumed, so they are listed in `run_sync` rather than on the event loop"""
+
+    if hasattr(iterable, "__aiter__"):
+        return [item async for item in iterable]
+    return await run_sync(list, iterable)
+
+
+async def abatched(
+    iterable: Iterable | AsyncIterable,
+    size: int,
+    run_sync: Callable[..., Awaitable[Any]],
+) -> AsyncIterator[list[Any]]:
+    """`itertools.batched` for async code; each batch of a sync iterable is
+    pulled in one `run_sync` call"""
+
+    if hasattr(iterable, "__aiter__"):
+        batch = []
+        async for item in iterable:
+            batch.append(item)
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+        return
+    iterator = await run_sync(iter, iterable)
+    while batch := await run_sync(_take, iterator, size):
+        yield batch
+
+
+def _take(iterator: Iterator[Any], size: int) -> list[Any]:
+    return list(itertools.islice(iterator, size))
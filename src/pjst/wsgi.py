@@ -0,0 +1,356 @@
+"""A framework-free WSGI application for pjst handlers.
+
+    application = App([ArticleResourceHandler, PersonResourceHandler])
+
+    $ gunicorn articles.wsgi:application
+
+Serves `/{TYPE}` (GET, HEAD, POST), `/{TYPE}/{id}` (GET, HEAD, PATCH, DELETE),
+`/{TYPE}/{id}/relationships/{name}` and `/{TYPE}/{id}/{name}` (GET, HEAD) and
+`/operations`, with the same status codes, errors and links as
+`pjst.flask`; requests to other paths or methods get JSON:API 404 and 405
+errors. Routes are matched with one dict lookup on `TYPE`, bodies are read
+from `wsgi.input` only when a handler needs them and responses are returned
+as the bytes `ResourceHandler` renders (a generator of them for
+`STREAM_MANY`).
+
+Parameters annotated with `pjst.wsgi.Request` receive the request. Handlers
+may return a WSGI application of their own (eg a werkzeug `Response`)
+instead of a `pjst.types.Response`.
+"""
+
+import dataclasses
+import functools
+import http
+from typing import Any, Callable, Iterable, Mapping
+from urllib.parse import parse_qsl
+
+from . import exceptions as pjst_exceptions
+from . import operations as pjst_operations
+from . import routing as pjst_routing
+from . import timing as pjst_timing
+from . import types as pjst_types
+from .plan import HandlerPlan, compile_plan
+from .rendering import LINK_PLACEHOLDER, LinkTemplates, RenderContext
+from .resource_handler import ResourceHandler
+
+Environ = Mapping[str, Any]
+StartResponse = Callable[..., Any]
+
+
+@dataclasses.dataclass(frozen=True)
+class Request:
+    environ: Environ
+    method: str
+    # Without the `script_root` the app is mounted at
+    path: str
+    # The first value of each parameter, like werkzeug's `args.get`
+    query_params: Mapping[str, str]
+
+    @property
+    def script_root(self) -> str:
+        return self.environ.get("SCRIPT_NAME", "").rstrip("/")
+
+    @functools.cached_property
+    def headers(self) -> Mapping[str, str]:
+        """By lowercase name"""
+
+        headers = {
+            key[5:].replace("_", "-").lower(): value
+            for key, value in self.environ.items()
+            if key.startswith("HTTP_")
+        }
+        for key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            if value := self.environ.get(key):
+                headers[key.replace("_", "-").lower()] = value
+        return headers
+
+    @functools.cached_property
+    def body(self) -> bytes:
+        stream = self.environ["wsgi.input"]
+        try:
+            length = int(self.environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        if length > 0:
+            return stream.read(length)
+        # Chunked requests, if the server says it ends the stream
+        if self.environ.get("wsgi.input_terminated"):
+            return stream.read()
+        return b""
+
+
+@functools.cache
+def _status_line(status: int) -> str:
+    return f"{status} {http.HTTPStatus(status).phrase}"
+
+
+def _query_params(query_string: str) -> dict[str, str]:
+    params: dict[str, str] = {}
+    for key, value in parse_qsl(query_string, keep_blank_values=True):
+        params.setdefault(key, value)
+    return params
+
+
+class App:
+    def __init__(self, resource_classes: Iterable[type[ResourceHandler]]) -> None:
+        self._handlers: dict[str, tuple[type[ResourceHandler], HandlerPlan]] = {}
+        for resource_cls in resource_classes:
+            pjst_operations.add_handler(
+                self._handlers, compile_plan(resource_cls, Request)
+            )
+        self._links = LinkTemplates(self._resolve, safe=pjst_routing.SAFE)
+
+    def _resolve(self, type: str) -> str | None:
+        if (handler := self._handlers.get(type)) is None:
+            return None
+        if not handler[1].object_http_methods:
+            return None
+        return f"/{type}/{LINK_PLACEHOLDER}"
+
+    def __call__(
+        self, environ: Environ, start_response: StartResponse
+    ) -> Iterable[bytes]:
+        request = Request(
+            environ=environ,
+            method=environ["REQUEST_METHOD"].upper(),
+            # WSGI strings are latin-1 decoded bytes
+            path=environ.get("PATH_INFO", "")
+            .encode("latin-1")
+            .decode("utf-8", "replace")
+            or "/",
+            query_params=_query_params(environ.get("QUERY_STRING", "")),
+        )
+        response = self._dispatch(request)
+        if not isinstance(response, pjst_routing.Response):
+            return response(environ, start_response)
+
+        headers = response.headers
+        if response.content_type is not None:
+            headers.append(("Content-Type", response.content_type))
+        if isinstance(response.body, bytes):
+            headers.append(("Content-Length", str(len(response.body))))
+        start_response(_status_line(response.status), headers)
+        if request.method == "HEAD":
+            if (close := getattr(response.body, "close", None)) is not None:
+                close()
+            return [b""]
+        if isinstance(response.body, bytes):
+            return [response.body]
+        return response.body
+
+    def _dispatch(self, request: Request) -> Any:
+        try:
+            route = pjst_routing.match(self._handlers, request.method, request.path)
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if route.view == "operations":
+            return self._operations(request)
+        resource_cls, plan = route.resource_cls, route.plan
+        if route.view == "relationship":
+            view = functools.partial(
+                self._relationship,
+                resource_cls,
+                plan,
+                request,
+                route.obj_id,
+                route.name,
+                route.related,
+            )
+        elif route.view == "one":
+            view = functools.partial(
+                self._one, resource_cls, plan, request, route.obj_id
+            )
+        elif route.view == "create":
+            view = functools.partial(self._create, resource_cls, plan, request)
+        else:
+            view = functools.partial(self._many, resource_cls, plan, request)
+        if resource_cls.TIMING is None:
+            return view()
+        return self._timed(resource_cls, request.method, view)
+
+    def _timed(
+        self, resource_cls: type[ResourceHandler], method: str, view: Callable[[], Any]
+    ) -> Any:
+        """`view`'s response, reporting the phases of the request"""
+
+        timer = pjst_timing.Timer(resource_cls)
+        try:
+            response = view()
+        except BaseException:
+            timer.finish(method, 500, None)
+            raise
+        finally:
+            timer.detach()
+        return pjst_routing.finish_timer(timer, method, response, timer.stream)
+
+    def _context(
+        self,
+        resource_cls: type[ResourceHandler],
+        request: Request,
+        fields: frozenset[str] | None = None,
+        include: dict | None = None,
+        obj_id: str | None = None,
+    ) -> RenderContext:
+        prefix = request.script_root
+        return RenderContext(
+            self_link=request.path,
+            object_link=self._links.object_link(resource_cls.TYPE, prefix),
+            query_params=request.query_params,
+            fields=fields,
+            include=include,
+            included_link=self._links.included_link(prefix),
+            method=request.method,
+            if_none_match=request.environ.get("HTTP_IF_NONE_MATCH"),
+            obj_id=obj_id,
+            cache_vary=resource_cls._cache_vary(request),
+            cache_generation=resource_cls._cache_generation(obj_id),
+        )
+
+    def _one(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+        obj_id: str,
+    ) -> Any:
+        try:
+            fields = resource_cls._process_fields(plan, request.query_params)
+            include = resource_cls._process_include(request.query_params)
+            context = self._context(resource_cls, request, fields, include, obj_id)
+            if (cached := resource_cls._cached(context)) is not None:
+                return pjst_routing.document_response(*cached)
+            simple_response = resource_cls._handle_one(
+                plan,
+                request,
+                request.body if request.method == "PATCH" else b"",
+                obj_id,
+                fields,
+            )
+            if request.method == "DELETE" and simple_response is None:
+                return pjst_routing.Response(204, content_type=None)
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        return pjst_routing.document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_one(simple_response, context),
+            )
+        )
+
+    def _many(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+    ) -> Any:
+        try:
+            fields = resource_cls._process_fields(plan, request.query_params)
+            include = resource_cls._process_include(request.query_params)
+            context = self._context(resource_cls, request, fields, include)
+            if (cached := resource_cls._cached(context)) is not None:
+                return pjst_routing.document_response(*cached)
+            kwargs = resource_cls._process_filters(plan, request.query_params)
+            with pjst_timing.phase("handler"):
+                simple_response = resource_cls.get_many(
+                    **kwargs,
+                    **plan.inject_request("get_many", request),
+                    **plan.inject_fields("get_many", fields),
+                )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        if resource_cls.STREAM_MANY:
+            etag = resource_cls._version_etag(simple_response, context)
+            if result := resource_cls._skip_render(context, etag):
+                return pjst_routing.document_response(*result)
+            return pjst_routing.Response(
+                200,
+                resource_cls._postprocess_many_stream(simple_response, context),
+                headers=[("ETag", etag)] if etag is not None else [],
+            )
+        return pjst_routing.document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_many(simple_response, context),
+            )
+        )
+
+    def _create(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+    ) -> Any:
+        try:
+            simple_response, many = resource_cls._handle_create(
+                plan, request, request.body
+            )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if simple_response is None:
+            return pjst_routing.Response(204, content_type=None)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        content, location = resource_cls._postprocess_created(
+            simple_response, many, self._context(resource_cls, request)
+        )
+        return pjst_routing.Response(
+            201,
+            content,
+            headers=[("Location", location)] if location is not None else [],
+        )
+
+    def _relationship(
+        self,
+        resource_cls: type[ResourceHandler],
+        plan: HandlerPlan,
+        request: Request,
+        obj_id: str,
+        name: str,
+        related: bool,
+    ) -> Any:
+        try:
+            page = resource_cls._process_relationship(name, request.query_params)
+            simple_response = resource_cls._handle_relationship(
+                plan, request, obj_id, name, page
+            )
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        if not isinstance(simple_response, pjst_types.Response):
+            return simple_response
+        context = self._context(resource_cls, request)
+        return pjst_routing.document_response(
+            *resource_cls._conditional(
+                simple_response,
+                context,
+                lambda: resource_cls._postprocess_relationship(
+                    simple_response, name, related, context
+                ),
+                store=False,
+            )
+        )
+
+    def _operations(self, request: Request) -> pjst_routing.Response:
+        def _context(resource_cls: type[ResourceHandler]) -> RenderContext:
+            return RenderContext(
+                self_link=request.path,
+                object_link=self._links.object_link(
+                    resource_cls.TYPE, request.script_root
+                ),
+                method=request.method,
+            )
+
+        try:
+            operations = pjst_operations.prepare(request.body, self._handlers)
+            results = pjst_operations.execute(operations, request, _context)
+        except pjst_exceptions.PjstException as exc:
+            return pjst_routing.error_response(exc)
+        status, content = pjst_operations.render_results(results)
+        return pjst_routing.Response(
+            status, content, content_type=pjst_operations.ATOMIC_CONTENT_TYPE
+        )
@@ -0,0 +1,81 @@
+import datetime
+import decimal
+import json
+import uuid
+
+import pytest
+
+from pjst import codec as pjst_codec
+from pjst import exceptions as pjst_exceptions
+from pjst.rendering import DocumentStream, render_errors
+
+
+@pytest.fixture(
+    params=[pjst_codec.PydanticCodec, pjst_codec.OrjsonCodec, pjst_codec.MsgspecCodec]
+)
+def codec(
+    request: pytest.FixtureRequest, monkeypatch: pytest.MonkeyPatch
+) -> pjst_codec.PydanticCodec:
+    try:
+        codec = request.param()
+    except ImportError:
+        pytest.skip(f"{request.param.name} is not installed")
+    monkeypatch.setattr(pjst_codec, "CODEC", codec)
+    return codec
+
+
+def test_dumps(codec: pjst_codec.PydanticCodec):
+    # Encoded the way pydantic-core encodes them, whatever the codec
+    assert codec.dumps(
+        {
+            "utc": datetime.datetime(
+                2024, 1, 2, 3, 4, 5, 678000, tzinfo=datetime.timezone.utc
+            ),
+            "naive": datetime.datetime(2024, 1, 2),
+            "date": datetime.date(2024, 1, 2),
+            "uuid": uuid.UUID(int=1),
+            "decimal": decimal.Decimal("1.50"),
+            "text": "Título",
+        }
+    ) == (
+        b'{"utc":"2024-01-02T03:04:05.678000Z","naive":"2024-01-02T00:00:00",'
+        b'"date":"2024-01-02","uuid":"00000000-0000-0000-0000-000000000001",'
+        b'"decimal":"1.50","text":"T\xc3\xadtulo"}'
+    )
+
+
+def test_render_errors(codec: pjst_codec.PydanticCodec):
+    exc = pjst_exceptions.BadRequest(
+        "Invalid título", source={"pointer": "/data/attributes/title"}
+    )
+    assert json.loads(render_errors(exc)) == {
+        "errors": [
+            {
+                "status": "400",
+                "code": "bad_request",
+                "title": "Bad request",
+                "detail": "Invalid título",
+                "source": {"pointer": "/data/attributes/title"},
+            }
+        ]
+    }
+
+
+def test_document_stream_links(codec: pjst_codec.PydanticCodec):
+    stream = DocumentStream(
+        {"self": "/articles?page[size]=2", "next": "/articles?page[cursor]=é"}
+    )
+    content = stream.start() + stream.end()
+    assert json.loads(content) == {
+        "data": [],
+        "links": {"self": "/articles?page[size]=2", "next": "/articles?page[cursor]=é"},
+    }
+
+
+def test_loads(codec: pjst_codec.PydanticCodec):
+    body = (
+        '{"data": [{"type": "articles", "attributes": {"title": "Título", "n": 1.5}}]}'
+    )
+    assert codec.loads(body.encode()) == codec.loads(body) == json.loads(body)
+    with pytest.raises(ValueError):
+        codec.loads(b"{")